@@ -11,5 +11,15 @@ python manage.py collectstatic
 echo "Performing migrations"
 python manage.py migrate
 
+# Background jobs die with the server processes that ran them
+python manage.py fail_interrupted_jobs
+
+if [ "${SERVER_MODE:-wsgi}" = "asgi" ]; then
+  # Replace the WSGI application with the ASGI one, served by uvicorn workers
+  [ "${1:-}" = "house_inventory.wsgi:application" ] && shift
+  echo "Starting gunicorn with uvicorn workers"
+  exec gunicorn -k uvicorn_worker.UvicornWorker house_inventory.asgi:application "${@}"
+fi
+
 echo "Starting gunicorn"
 exec gunicorn "${@}"
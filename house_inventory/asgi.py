@@ -12,5 +12,7 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'house_inventory.settings')
+# Serve the API from async views, so that Django's single thread for sync code isn't held by them
+os.environ.setdefault('INVENTORY_ASYNC_VIEWS', '1')
 
 application = get_asgi_application()
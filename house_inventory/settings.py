@@ -9,6 +9,7 @@ https://docs.djangoproject.com/en/3.2/topics/settings/
 For the full list of settings and their values, see
 https://docs.djangoproject.com/en/3.2/ref/settings/
 """
+import os
 import sys
 from pathlib import Path
 
@@ -38,7 +39,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    'inventory.middleware.StaticFilesMiddleware',
+    'inventory.middleware.PerformanceMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -76,9 +78,22 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Keep connections open between requests, instead of paying for the connection setup every time
+        'CONN_MAX_AGE': 600,
     }
 }
 
+# PRAGMAs set on every new SQLite connection. In WAL mode readers are not blocked by a writer, like a batch action
+# moving many items, and concurrent writers wait for up to busy_timeout milliseconds instead of failing.
+INVENTORY_SQLITE_PRAGMAS = {
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+    'busy_timeout': 5000,
+    'mmap_size': 128 * 1024 * 1024,
+    # In KiB when negative
+    'cache_size': -16000,
+}
+
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
 
@@ -93,6 +108,43 @@ AUTH_PASSWORD_VALIDATORS = [
 SITE_TITLE = ''
 SITE_HEADER = ''
 
+# Batch actions on more items than this run in the background, with their progress shown in the admin
+INVENTORY_ASYNC_ACTION_THRESHOLD = 1000
+# Number of items processed per transaction by batch actions
+INVENTORY_JOB_CHUNK_SIZE = 500
+# Number of background threads running batch actions, per server process
+INVENTORY_JOB_WORKERS = 1
+# Number of admin history entries written per INSERT by batch actions
+INVENTORY_LOG_BATCH_SIZE = 500
+# Items expiring within this many days are reported by the expiration digest and on the admin dashboard
+INVENTORY_EXPIRATION_DUE_DAYS = 7
+# Where `manage.py expiration_digest` sends reminders: email (through EMAIL_HOST), FileSink or WebhookSink
+INVENTORY_REMINDER_SINKS = [
+    {'BACKEND': 'inventory.reminders.EmailSink'},
+]
+# Measure queries and time of every request, reported in Server-Timing headers and on the admin performance page
+INVENTORY_PERFORMANCE_MONITOR = True
+# Seconds between writes of the collected request timings to the database
+INVENTORY_PERFORMANCE_FLUSH_INTERVAL = 30
+# Maximum number of views and sets of filters recorded on the admin performance page
+INVENTORY_PERFORMANCE_MAX_PROFILES = 1000
+# Default and maximum number of objects per page of the JSON API, chosen with `?limit=`
+INVENTORY_API_PAGE_SIZE = 100
+INVENTORY_API_MAX_PAGE_SIZE = 1000
+# Maximum number of operations per request to the batch API
+INVENTORY_API_MAX_BATCH_SIZE = 500
+# Seconds for which the batch API remembers idempotency keys
+INVENTORY_IDEMPOTENCY_KEY_TTL = 24 * 60 * 60
+# How subtrees and ancestors of locations and categories are read: from the primary keys denormalized by treenode
+# (inventory.trees.TreenodeBackend), or from the closure tables (inventory.trees.ClosureTableBackend), which scale to
+# deep trees with many nodes. Both are kept up to date, so this can be changed at any time
+INVENTORY_TREE_BACKEND = 'inventory.trees.TreenodeBackend'
+# Cache in CACHES holding snapshots of the location and category trees, checked against the table versions once per
+# request. Only worth it with a file based or memcached cache shared by the server processes, so disabled by default
+INVENTORY_TREE_CACHE = None
+# Serve the API from async views running in a thread pool, which only pays off under an ASGI server: set by asgi.py
+INVENTORY_ASYNC_VIEWS = os.environ.get('INVENTORY_ASYNC_VIEWS') == '1'
+
 # Internationalization
 # https://docs.djangoproject.com/en/3.2/topics/i18n/
 
@@ -13,10 +13,11 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
-from django.urls import path
+from django.urls import include, path
 
 import inventory.admin
 
 urlpatterns = [
+    path('api/', include('inventory.urls')),
     path('', inventory.admin.admin_site.urls),
 ]
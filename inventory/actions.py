@@ -1,12 +1,58 @@
+from typing import Iterator, List, Union
+
+from django.conf import settings
 from django.contrib import admin, messages
 from django.contrib.admin import ModelAdmin, helpers
 from django.contrib.admin.utils import model_ngettext
+from django.db import transaction
 from django.db.models import QuerySet
-from django.http import HttpRequest
+from django.http import HttpRequest, HttpResponseRedirect
 from django.template.response import TemplateResponse
+from django.urls import reverse
 from django.utils.translation import gettext_lazy as _
 
-from inventory.models import Location, Category
+from inventory import jobs
+from inventory.audit import LogEntryBatch
+from inventory.export import streaming_export_response
+from inventory.forms import NewLocationForm, NewCategoryForm
+from inventory.models import Location, Category, Item, Job
+
+
+def change_items_in_chunks(user_id: int, items: Union[QuerySet, List[int]], **fields) -> Iterator[int]:
+    """Update the given fields of the items, logging the change for each one, a chunk at a time.
+
+    Yields the number of processed items after each chunk.
+    """
+    if isinstance(items, QuerySet):
+        items = list(items.values_list('pk', flat=True))
+    chunk_size = settings.INVENTORY_JOB_CHUNK_SIZE
+
+    for start in range(0, len(items), chunk_size):
+        chunk = items[start:start + chunk_size]
+        with transaction.atomic(), LogEntryBatch(user_id) as log:
+            for obj in Item.objects.filter(pk__in=chunk).select_related('category'):
+                log.log_change(obj, str(obj))
+            Item.objects.filter(pk__in=chunk).update(**fields)
+        yield start + len(chunk)
+
+
+@jobs.job_handler("move_to_other_location")
+def move_to_other_location_job(job: Job) -> Iterator[int]:
+    location = Location.objects.get(pk=job.arguments["location"])
+    return change_items_in_chunks(job.user_id, job.arguments["pks"], location=location)
+
+
+@jobs.job_handler("change_category")
+def change_category_job(job: Job) -> Iterator[int]:
+    category_pk = job.arguments["category"]
+    category = Category.objects.get(pk=category_pk) if category_pk else None
+    return change_items_in_chunks(job.user_id, job.arguments["pks"], category=category)
+
+
+def redirect_to_job(modeladmin: ModelAdmin, request: HttpRequest, job: Job) -> HttpResponseRedirect:
+    modeladmin.message_user(request, _("The operation has been started in the background."), messages.INFO)
+    return HttpResponseRedirect(
+        reverse("admin:inventory_job_change", args=(job.pk,), current_app=modeladmin.admin_site.name))
 
 
 @admin.action(description=_("Move items to another location"), permissions=['change'])
@@ -26,10 +72,17 @@ def move_to_other_location(modeladmin: ModelAdmin, request: HttpRequest, queryse
                 }, messages.ERROR)
                 return None
             location = Location.objects.get(pk=int(loc_id))
-            for obj in queryset:
-                obj_display = str(obj)
-                modeladmin.log_change(request, obj, obj_display)
-            queryset.update(location=location)
+            if n > settings.INVENTORY_ASYNC_ACTION_THRESHOLD:
+                job = jobs.enqueue(
+                    "move_to_other_location",
+                    _("Moving %(count)d %(items)s to %(location)s") % {
+                        "count": n, "items": model_ngettext(modeladmin.opts, n), "location": str(location)
+                    },
+                    request.user, {"pks": list(queryset.values_list('pk', flat=True)), "location": location.pk}, n)
+                return redirect_to_job(modeladmin, request, job)
+
+            for _done in change_items_in_chunks(request.user.pk, queryset, location=location):
+                pass
             modeladmin.message_user(request, _("Successfully moved %(count)d %(items)s.") % {
                 "count": n, "items": model_ngettext(modeladmin.opts, n)
             }, messages.SUCCESS)
@@ -41,17 +94,18 @@ def move_to_other_location(modeladmin: ModelAdmin, request: HttpRequest, queryse
         objects_name = str(queryset.first())
 
     title = _("Moving %(name)s to new location") % {"name": objects_name}
+    form = NewLocationForm(admin_site=modeladmin.admin_site)
 
     context = {
         **modeladmin.admin_site.each_context(request),
         'action_checkbox_name': helpers.ACTION_CHECKBOX_NAME,
         'title': title,
         'objects_name': str(objects_name),
-        'locations': Location.objects.all(),
+        'form': form,
         'queryset': queryset,
         'model_count': queryset.count(),
         'opts': opts,
-        'media': modeladmin.media,
+        'media': modeladmin.media + form.media,
     }
 
     request.current_app = modeladmin.admin_site.name
@@ -75,10 +129,19 @@ def change_category(modeladmin: ModelAdmin, request: HttpRequest, queryset: Quer
             else:
                 category = Category.objects.get(pk=int(cat_id))
 
-            for obj in queryset:
-                obj_display = str(obj)
-                modeladmin.log_change(request, obj, obj_display)
-            queryset.update(category=category)
+            if n > settings.INVENTORY_ASYNC_ACTION_THRESHOLD:
+                job = jobs.enqueue(
+                    "change_category",
+                    _("Changing %(count)d %(items)s category to %(category)s") % {
+                        "count": n, "items": model_ngettext(modeladmin.opts, n),
+                        "category": category.bcrumb_name if category else "-"
+                    },
+                    request.user, {"pks": list(queryset.values_list('pk', flat=True)),
+                                   "category": category.pk if category else None}, n)
+                return redirect_to_job(modeladmin, request, job)
+
+            for _done in change_items_in_chunks(request.user.pk, queryset, category=category):
+                pass
             modeladmin.message_user(request, _("Successfully updated %(count)d %(items)s.") % {
                 "count": n, "items": model_ngettext(modeladmin.opts, n)
             }, messages.SUCCESS)
@@ -87,17 +150,18 @@ def change_category(modeladmin: ModelAdmin, request: HttpRequest, queryset: Quer
     objects_name = model_ngettext(queryset)
 
     title = _("Changing %(name)s categories") % {"name": objects_name}
+    form = NewCategoryForm(admin_site=modeladmin.admin_site)
 
     context = {
         **modeladmin.admin_site.each_context(request),
         'action_checkbox_name': helpers.ACTION_CHECKBOX_NAME,
         'title': title,
         'objects_name': str(objects_name),
-        'categories': Category.objects.all(),
+        'form': form,
         'queryset': queryset,
         'model_count': queryset.count(),
         'opts': opts,
-        'media': modeladmin.media,
+        'media': modeladmin.media + form.media,
     }
 
     request.current_app = modeladmin.admin_site.name
@@ -129,7 +193,9 @@ def create_sections(modeladmin: ModelAdmin, request: HttpRequest, queryset: Quer
             modeladmin.message_user(request, _("This is not Microsoft Excel, stop it."), messages.ERROR)
             return None
 
-        count = 0
+        # Sections that already exist are left alone, so that the action can be run again to extend a grid
+        existing = set(location.get_children_queryset().values_list("locator", flat=True))
+        sections = []
         for col_num in range(cols):
             col = chr(ord('A') + col_num) if cols > 1 else ""
 
@@ -138,13 +204,18 @@ def create_sections(modeladmin: ModelAdmin, request: HttpRequest, queryset: Quer
                 row = str(row_num) if rows > 1 or rows == cols == 1 else ""
 
                 newloc = f"{prefix}{row}{col}"
+                if newloc in existing:
+                    continue
                 newname = f"{name_prefix} {newloc}"
-                newobj = Location.objects.create(tn_parent=location, name=newname, locator=newloc)
-                modeladmin.log_addition(request, newobj, str(newobj))
-                count += 1
+                sections.append(Location(tn_parent=location, name=newname, locator=newloc))
+
+        with transaction.atomic(), LogEntryBatch(request.user.pk) as log:
+            for newobj in Location.bulk_create_nodes(sections):
+                log.log_addition(newobj, str(newobj))
+        count = len(sections)
 
         modeladmin.message_user(request, _("Successfully created %(count)d %(items)s.") % {
-            "count": count, "items": model_ngettext(modeladmin.opts, n)
+            "count": count, "items": model_ngettext(modeladmin.opts, count)
         }, messages.SUCCESS)
         return None
 
@@ -166,3 +237,13 @@ def create_sections(modeladmin: ModelAdmin, request: HttpRequest, queryset: Quer
     request.current_app = modeladmin.admin_site.name
 
     return TemplateResponse(request, ["create_sections.html"], context)
+
+
+@admin.action(description=_("Export selected items as CSV"), permissions=['view'])
+def export_csv(modeladmin: ModelAdmin, request: HttpRequest, queryset: QuerySet):
+    return streaming_export_response(queryset, "csv")
+
+
+@admin.action(description=_("Export selected items as NDJSON"), permissions=['view'])
+def export_ndjson(modeladmin: ModelAdmin, request: HttpRequest, queryset: QuerySet):
+    return streaming_export_response(queryset, "ndjson")
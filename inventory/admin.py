@@ -1,21 +1,38 @@
+import datetime
+import io
+
 from django import urls
 from django.conf import settings
-from django.contrib import admin
+from django.contrib import admin, messages
 from django.contrib.admin.utils import model_ngettext
-from django.contrib.admin.views.main import ChangeList
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.views.main import ChangeList, ORDER_VAR
 from django.contrib.auth.models import User, Group
+from django.db.models import F, FloatField
+from django.db.models.functions import Cast
+from django.core.exceptions import PermissionDenied
+from django.http import HttpResponseBadRequest, HttpResponseRedirect
+from django.template.response import TemplateResponse
 from django.templatetags.static import static
+from django.utils import timezone
 from django.utils.html import format_html
 from django.utils.safestring import mark_safe
 from django.utils.text import format_lazy
+from django.urls import path
 from django.utils.translation import gettext_lazy as _, ngettext
 from treenode.admin import TreeNodeModelAdmin
 from treenode.forms import TreeNodeForm
 
-from .actions import move_to_other_location, change_category, create_sections
+from .actions import move_to_other_location, change_category, create_sections, export_csv, export_ndjson
+from .export import FORMATS, streaming_export_response
+from .forms import ImportForm
+from .importer import FORMATS as IMPORT_FORMATS, import_items
 from .list_filters import ItemsByLocation, LocationsByLocation, ExpirationFieldListFilter, ItemsByCategory, \
-    CategoriesByCategory
-from .models import Location, Item, Category
+    CategoriesByCategory, LazySimpleListFilter
+from .models import Location, Item, Category, Job, RequestProfile, ApiToken
+from .pagination import keyset_ordering, keyset_page
+from .reminders import due_items
+from .search import fts_available, search_items
 
 
 # Custom admin site definition
@@ -27,6 +44,14 @@ class InventoryAdminSite(admin.AdminSite):
         extra_context.update({
             'title': _("Inventory management")
         })
+        if request.user.has_perm('inventory.view_item'):
+            today = timezone.localdate()
+            due = due_items(today)
+            extra_context.update({
+                'expiring_items': due[:10],
+                'expiring_count': due.count(),
+                'expiring_until': today + datetime.timedelta(days=settings.INVENTORY_EXPIRATION_DUE_DAYS),
+            })
         return super().index(request, extra_context)
 
     site_title = settings.SITE_TITLE or _("House inventory")
@@ -48,10 +73,93 @@ class ShortTitleChangeList(ChangeList):
         self.title = self.opts.verbose_name_plural.capitalize()
 
 
+class KeysetChangeList(ShortTitleChangeList):
+    """Changelist paginated on the `keyset_fields` of the model admin instead of with page numbers and OFFSETs.
+
+    Used in the default ordering only; the rows are then not counted past the `count_limit` of the model admin.
+    Column sorting, searches and "show all" fall back to the standard pagination.
+    """
+    cursor_var = "cursor"
+
+    def get_filters_params(self, params=None):
+        lookup_params = super().get_filters_params(params)
+        lookup_params.pop(self.cursor_var, None)
+        return lookup_params
+
+    def get_queryset(self, request):
+        self.keyset_pagination = bool(self.model_admin.keyset_fields) and not (
+                self.show_all or self.query or ORDER_VAR in self.params)
+        return super().get_queryset(request)
+
+    def get_ordering(self, request, queryset):
+        if self.keyset_pagination:
+            return keyset_ordering(self.model, self.model_admin.keyset_fields)
+        return super().get_ordering(request, queryset)
+
+    def get_results(self, request):
+        # Links built from the changelist parameters must not keep the current position
+        cursor = self.params.pop(self.cursor_var, None)
+        if not self.keyset_pagination:
+            return super().get_results(request)
+
+        try:
+            rows, previous_cursor, next_cursor = keyset_page(
+                self.queryset, self.model_admin.keyset_fields, cursor, self.list_per_page)
+        except ValueError:
+            raise IncorrectLookupParameters
+
+        count_limit = self.model_admin.count_limit
+        if count_limit is None:
+            self.result_count = self.queryset.count()
+            self.result_count_is_estimate = False
+        else:
+            count = self.queryset.order_by()[:count_limit + 1].count()
+            self.result_count = min(count, count_limit)
+            self.result_count_is_estimate = count > count_limit
+
+        self.result_list = rows
+        self.previous_url = previous_cursor and self.get_query_string({self.cursor_var: previous_cursor})
+        self.next_url = next_cursor and self.get_query_string({self.cursor_var: next_cursor})
+        self.show_full_result_count = self.model_admin.show_full_result_count
+        self.full_result_count = self.root_queryset.count() if self.show_full_result_count else None
+        self.show_admin_actions = not self.show_full_result_count or bool(self.full_result_count)
+        self.can_show_all = not self.result_count_is_estimate and self.result_count <= self.list_max_show_all
+        self.multi_page = bool(previous_cursor or next_cursor)
+        # Only for the "show all" link, page numbers are not shown
+        self.paginator = self.model_admin.get_paginator(request, self.queryset, self.list_per_page)
+        self.paginator.count = self.result_count
+
+
+class ItemChangeList(KeysetChangeList):
+    def get_ordering(self, request, queryset):
+        # Full-text search results are sorted by relevance, unless another order is picked
+        if ORDER_VAR not in self.params and "search_rank" in queryset.query.annotations:
+            return ["search_rank", "-pk"]
+        return super().get_ordering(request, queryset)
+
+
+class ItemExportChangeList(ItemChangeList):
+    """Changelist only filtering and ordering the items to export, which are neither fetched nor counted."""
+
+    def __init__(self, request, model, list_display, list_display_links, list_filter, *args):
+        # The filters are not displayed, the ones without a selected choice would not filter anything
+        list_filter = [f for f in list_filter if not (
+                isinstance(f, type) and issubclass(f, LazySimpleListFilter) and f.parameter_name not in request.GET)]
+        super().__init__(request, model, list_display, list_display_links, list_filter, *args)
+
+    def get_results(self, request):
+        pass
+
+
 class CustomChangeListModelAdmin(admin.ModelAdmin):
-    # noinspection PyMethodMayBeStatic
+    changelist_class = ShortTitleChangeList
+
+    # Options of `KeysetChangeList`: fields of the keyset ordering, and maximum number of rows counted (None for all)
+    keyset_fields = None
+    count_limit = None
+
     def get_changelist(self, request, **kwargs):
-        return ShortTitleChangeList
+        return self.changelist_class
 
 
 # App models
@@ -67,16 +175,87 @@ edit_icon.short_description = ""
 
 @admin.register(Item, site=admin_site)
 class ItemAdmin(CustomChangeListModelAdmin):
+    changelist_class = ItemChangeList
     ordering = ('location', 'name')
+    keyset_fields = ('location', 'name', 'pk')
+    count_limit = 10000
+    show_full_result_count = False
+    list_select_related = ('location', 'category')
     fields = (('name', 'location'), ('amount', 'unit'), 'category', 'expiration', 'description')
     search_fields = ('name',)
+    autocomplete_fields = ('location', 'category')
     list_display = (
         'link_to_name_search', 'link_to_category', 'link_to_location', 'short_amount', 'expiration', 'edit_icon')
     list_display_links = ('edit_icon',)
     list_filter = (ItemsByLocation, ItemsByCategory, 'amount', ExpirationFieldListFilter)
-    actions = (move_to_other_location, change_category)
+    actions = (move_to_other_location, change_category, export_csv, export_ndjson)
     edit_icon = edit_icon
 
+    # Query string parameter selecting the format of the export view
+    export_format_var = "_format"
+
+    def get_urls(self):
+        return [
+            path('export/', self.admin_site.admin_view(self.export_view), name='inventory_item_export'),
+            path('import/', self.admin_site.admin_view(self.import_view), name='inventory_item_import'),
+            *super().get_urls(),
+        ]
+
+    def get_search_results(self, request, queryset, search_term):
+        # Name, description, location and category are all searched when the full-text index is available
+        if not search_term.strip() or not fts_available(queryset.db):
+            return super().get_search_results(request, queryset, search_term)
+        return search_items(queryset, search_term), False
+
+    def get_export_queryset(self, request):
+        """Items matching the changelist filters and search terms of the request."""
+        # Same arguments as `get_changelist_instance`, column sorting refers to the changelist columns
+        list_display = self.get_list_display(request)
+        list_display_links = self.get_list_display_links(request, list_display)
+        if self.get_actions(request):
+            list_display = ['action_checkbox', *list_display]
+        changelist = ItemExportChangeList(
+            request, self.model, list_display, list_display_links, self.get_list_filter(request),
+            self.date_hierarchy, self.get_search_fields(request), self.get_list_select_related(request),
+            self.list_per_page, self.list_max_show_all, self.list_editable, self, self.get_sortable_by(request))
+        return changelist.queryset
+
+    def export_view(self, request):
+        if not self.has_view_permission(request):
+            raise PermissionDenied
+
+        request.GET = request.GET.copy()
+        export_format = request.GET.pop(self.export_format_var, ["csv"])[-1]
+        if export_format not in FORMATS:
+            return HttpResponseBadRequest(_("Unsupported export format"))
+
+        return streaming_export_response(self.get_export_queryset(request), export_format)
+
+    def import_view(self, request):
+        if not self.has_add_permission(request):
+            raise PermissionDenied
+
+        result = None
+        form = ImportForm(request.POST or None, request.FILES or None)
+        if form.is_valid():
+            upload = form.cleaned_data['file']
+            import_format = form.cleaned_data['format'] or upload.name.rpartition('.')[2].lower()
+            if import_format not in IMPORT_FORMATS:
+                form.add_error('format', _("Unable to guess the file format, please select it"))
+            else:
+                with io.TextIOWrapper(upload.file, encoding='utf-8', newline='') as stream:
+                    result = import_items(stream, import_format, dry_run=form.cleaned_data['dry_run'])
+
+        context = {
+            **self.admin_site.each_context(request),
+            'title': _("Import items"),
+            'form': form,
+            'result': result,
+            'opts': self.model._meta,
+        }
+        request.current_app = self.admin_site.name
+        return TemplateResponse(request, "admin/inventory/item/import.html", context)
+
     def link_to_name_search(self, obj: Item):
         link = urls.reverse("admin:inventory_item_changelist") + f"?q={obj.name}"
         return format_html('<a href="{}" title="{}">{}</a>', link, _("Search all %(model_name)s named \"%(name)s\"") % {
@@ -119,12 +298,14 @@ class ItemInlineForLocation(admin.TabularInline):
     model = Item
     extra = 0
     fields = ('name', 'amount', 'unit', 'category', 'expiration')
+    autocomplete_fields = ('category',)
 
 
 class ItemInlineForCategory(admin.TabularInline):
     model = Item
     extra = 0
     fields = ('name', 'amount', 'unit', 'location', 'expiration')
+    autocomplete_fields = ('location',)
 
 
 class LocationInline(admin.TabularInline):
@@ -143,7 +324,7 @@ class LocationAdmin(CustomChangeListModelAdmin, TreeNodeModelAdmin):
     fields = ('name', 'locator', 'tn_parent', 'description')
     actions = (create_sections,)
     list_display_links = ('edit_icon',)
-    search_fields = ('name', 'locator')
+    search_fields = ('name', 'locator', 'full_locator')
     edit_icon = edit_icon
 
     def name_link_to_items(self, obj: Location):
@@ -154,6 +335,28 @@ class LocationAdmin(CustomChangeListModelAdmin, TreeNodeModelAdmin):
 
     name_link_to_items.short_description = _("items")
 
+    def get_urls(self):
+        return [
+            path('jump/', self.admin_site.admin_view(self.jump_view), name='inventory_location_jump'),
+            *super().get_urls(),
+        ]
+
+    def jump_view(self, request):
+        """Go to the location with the typed or scanned full locator, or to its items with `?to=items`."""
+        if not self.has_view_or_change_permission(request):
+            raise PermissionDenied
+
+        locator = request.GET.get('locator', '')
+        try:
+            location = Location.get_by_path(locator)
+        except Location.DoesNotExist:
+            self.message_user(request, _("No location at \"%(locator)s\".") % {"locator": locator}, messages.WARNING)
+            return HttpResponseRedirect(urls.reverse('admin:inventory_location_changelist'))
+
+        if request.GET.get('to') == 'items':
+            return HttpResponseRedirect(urls.reverse('admin:inventory_item_changelist') + f"?location={location.pk}")
+        return HttpResponseRedirect(urls.reverse('admin:inventory_location_change', args=(location.pk,)))
+
 
 @admin.register(Category, site=admin_site)
 class CategoryAdmin(CustomChangeListModelAdmin, TreeNodeModelAdmin):
@@ -164,7 +367,7 @@ class CategoryAdmin(CustomChangeListModelAdmin, TreeNodeModelAdmin):
     list_display = ('name_link_to_items', 'edit_icon')
     list_display_links = ('edit_icon',)
     list_filter = (CategoriesByCategory,)
-    search_fields = ('name',)
+    search_fields = ('name', 'full_name')
     edit_icon = edit_icon
 
     def name_link_to_items(self, obj: Category):
@@ -174,3 +377,100 @@ class CategoryAdmin(CustomChangeListModelAdmin, TreeNodeModelAdmin):
         }, _("Items in %(name)s (%(count)d)") % {"name": obj.name, "count": obj.objects_count})
 
     name_link_to_items.short_description = _("items")
+
+
+@admin.register(Job, site=admin_site)
+class JobAdmin(admin.ModelAdmin):
+    change_form_template = "admin/inventory/job/change_form.html"
+    list_display = ('description', 'user', 'status', 'progress_bar', 'created', 'finished')
+    list_filter = ('status',)
+    fields = ('description', 'user', 'status', 'progress_bar', 'created', 'finished', 'error')
+    readonly_fields = fields
+    list_select_related = ('user',)
+
+    def progress_bar(self, obj: Job):
+        return format_html('<progress value="{}" max="{}" title="{}"></progress> {}/{}',
+                           obj.done, obj.total or 1, f"{obj.progress}%", obj.done, obj.total)
+
+    progress_bar.short_description = _("progress")
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_view_permission(self, request, obj=None):
+        # Users starting background jobs are sent to their page to follow the progress
+        if obj is not None and obj.user_id == request.user.pk:
+            return True
+        return super().has_view_permission(request, obj)
+
+
+@admin.register(ApiToken, site=admin_site)
+class ApiTokenAdmin(admin.ModelAdmin):
+    """Tokens are created with `python manage.py create_api_token`, their keys are only shown then."""
+
+    list_display = ('name', 'user', 'created')
+    list_select_related = ('user',)
+    fields = ('name', 'user', 'created')
+    readonly_fields = fields
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(RequestProfile, site=admin_site)
+class RequestProfileAdmin(admin.ModelAdmin):
+    """Request timings collected by `PerformanceMiddleware`, slowest views first."""
+
+    list_display = ('view', 'filters', 'requests', 'average_time', 'average_db_time', 'max_time_ms',
+                    'average_queries', 'duplicate_queries', 'last_seen')
+    search_fields = ('view', 'filters')
+    readonly_fields = ('view', 'filters', 'requests', 'queries', 'duplicate_queries', 'total_time', 'db_time',
+                       'max_time', 'last_seen')
+
+    def get_queryset(self, request):
+        requests = Cast('requests', FloatField())
+        return super().get_queryset(request).annotate(
+            average_time=F('total_time') / requests,
+            average_db_time=F('db_time') / requests,
+            average_queries=Cast('queries', FloatField()) / requests,
+        ).order_by('-average_time')
+
+    @staticmethod
+    def _ms(seconds: float) -> str:
+        return f"{seconds * 1000:.1f} ms"
+
+    def average_time(self, obj: RequestProfile):
+        return self._ms(obj.average_time)
+
+    average_time.short_description = _("average time")
+    average_time.admin_order_field = 'average_time'
+
+    def average_db_time(self, obj: RequestProfile):
+        return self._ms(obj.average_db_time)
+
+    average_db_time.short_description = _("average database time")
+    average_db_time.admin_order_field = 'average_db_time'
+
+    def max_time_ms(self, obj: RequestProfile):
+        return self._ms(obj.max_time)
+
+    max_time_ms.short_description = _("maximum time")
+    max_time_ms.admin_order_field = 'max_time'
+
+    def average_queries(self, obj: RequestProfile):
+        return f"{obj.average_queries:.1f}"
+
+    average_queries.short_description = _("average queries")
+    average_queries.admin_order_field = 'average_queries'
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
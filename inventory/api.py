@@ -0,0 +1,409 @@
+import datetime
+import hashlib
+import json
+from functools import wraps
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Type
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db import close_old_connections, models, transaction, IntegrityError
+from django.db.models import QuerySet
+from django.http import HttpRequest, JsonResponse
+from django.middleware.csrf import CsrfViewMiddleware
+from django.utils import timezone
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import condition, require_safe, require_POST
+
+from inventory.batch import Batch, BatchError
+from inventory.models import Item, Location, Category, InventoryTreeNodeModel, IdempotencyKey, ApiToken
+from inventory.pagination import keyset_page
+from inventory.search import fts_available, search_items
+from inventory.trees import tree_backend
+from inventory.versions import table_versions
+
+# Field name in the API -> model field lookup, by model
+ITEM_FIELDS = {
+    "id": "pk",
+    "name": "name",
+    "description": "description",
+    "amount": "amount",
+    "unit": "unit",
+    "location": "location_id",
+    "location_path": "location__full_locator",
+    "category": "category_id",
+    "category_path": "category__full_name",
+    "expiration": "expiration",
+}
+
+# Tree data is read from the fields denormalized by treenode, without walking the tree
+TREE_NODE_FIELDS = {
+    "id": "pk",
+    "parent": "tn_parent_id",
+    "level": "tn_level",
+    "children_count": "tn_children_count",
+    "items_count": "items_count",
+    "subtree_items_count": "subtree_items_count",
+}
+
+LOCATION_FIELDS = {
+    **TREE_NODE_FIELDS,
+    "name": "name",
+    "locator": "locator",
+    "full_locator": "full_locator",
+    "description": "description",
+}
+
+CATEGORY_FIELDS = {
+    **TREE_NODE_FIELDS,
+    "name": "name",
+    "full_name": "full_name",
+}
+
+FIELDS = {
+    Item: ITEM_FIELDS,
+    Location: LOCATION_FIELDS,
+    Category: CATEGORY_FIELDS,
+}
+
+# Tables each model's representations are built from: items embed the location and category paths
+DEPENDENCIES = {
+    Item: (Item, Location, Category),
+    Location: (Location,),
+    Category: (Category,),
+}
+
+FIELDS_VAR = "fields"
+CURSOR_VAR = "cursor"
+LIMIT_VAR = "limit"
+
+IDEMPOTENCY_KEY_HEADER = "Idempotency-Key"
+
+
+class ApiError(Exception):
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.status = status
+
+
+def error_response(message: str, status: int) -> JsonResponse:
+    return JsonResponse({"error": message}, status=status)
+
+
+class _CsrfCheck(CsrfViewMiddleware):
+    def _reject(self, request, reason):
+        return error_response(f"CSRF check failed: {reason}", 403)
+
+
+def authenticate(request: HttpRequest) -> Optional[JsonResponse]:
+    """Authenticate the request with its `Authorization: Bearer <token>` header, or else with its session.
+
+    Returns the error response of a request with an invalid token, or of a session request failing the CSRF check:
+    write views are exempt from the CSRF middleware since browsers never send the header on their own, but requests
+    authenticated by the session cookie still need a CSRF token.
+    """
+    header = request.headers.get("Authorization")
+    if header is None:
+        if request.user.is_authenticated:
+            return _CsrfCheck(lambda r: None).process_view(request, None, (), {})
+        return None
+
+    scheme, _, key = header.partition(" ")
+    token = ApiToken.authenticate(key.strip()) if scheme.lower() == "bearer" else None
+    if token is None:
+        return error_response("Invalid token", 401)
+    request.user = token.user
+    return None
+
+
+def _versions(request: HttpRequest, model: Type[models.Model]):
+    # Computed once for both the ETag and the Last-Modified header
+    if not hasattr(request, "_inventory_table_versions"):
+        request._inventory_table_versions = table_versions(DEPENDENCIES[model])
+    return request._inventory_table_versions
+
+
+def _call_in_worker_thread(func: Callable, *args, **kwargs):
+    # Connections are per thread: those of the worker threads are recycled here, as Django does at the start and end
+    # of requests for the connections of the thread running sync code
+    close_old_connections()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        close_old_connections()
+
+
+async def run_view(view: Callable, request: HttpRequest, *args, **kwargs):
+    """Run a sync view from an async one.
+
+    Under ASGI, Django runs all sync code of a process in a single thread, so that slow views would be served one at a
+    time: read-only views are run in the thread pool of the event loop instead, each with its own database connection.
+    Under WSGI they stay in the thread of the request.
+    """
+    if isinstance(request, ASGIRequest):
+        return await sync_to_async(_call_in_worker_thread, thread_sensitive=False)(view, request, *args, **kwargs)
+    return await sync_to_async(view)(request, *args, **kwargs)
+
+
+def api_view(model: Type[models.Model]):
+    """Read-only JSON view of the model, for users allowed to view it.
+
+    Responses carry an ETag and a Last-Modified header derived from the change counters of the tables they are built
+    from, so that polling clients get a `304 Not Modified` after a single query, without the view being run. With
+    `INVENTORY_ASYNC_VIEWS` the view is async, see `run_view`.
+    """
+
+    def etag(request, *args, **kwargs) -> Optional[str]:
+        versions = _versions(request, model)
+        return f'"{versions[0]}"' if versions else None
+
+    def last_modified(request, *args, **kwargs):
+        versions = _versions(request, model)
+        return versions[1] if versions else None
+
+    def decorator(view):
+        conditional_view = condition(etag_func=etag, last_modified_func=last_modified)(view)
+
+        @require_safe
+        def sync_view(request: HttpRequest, *args, **kwargs):
+            error = authenticate(request)
+            if error is not None:
+                return error
+            if not request.user.is_authenticated:
+                return error_response("Authentication required", 401)
+            if not request.user.has_perm(f"{model._meta.app_label}.view_{model._meta.model_name}"):
+                return error_response("Permission denied", 403)
+            try:
+                return conditional_view(request, *args, **kwargs)
+            except ApiError as e:
+                return error_response(str(e), e.status)
+
+        if not settings.INVENTORY_ASYNC_VIEWS:
+            return wraps(view)(sync_view)
+
+        @wraps(view)
+        async def async_view(request: HttpRequest, *args, **kwargs):
+            return await run_view(sync_view, request, *args, **kwargs)
+
+        return async_view
+
+    return decorator
+
+
+def selected_fields(request: HttpRequest, model: Type[models.Model]) -> Dict[str, str]:
+    """API fields requested with `?fields=a,b`, all of them by default."""
+    fields = FIELDS[model]
+    names = [name for name in request.GET.get(FIELDS_VAR, "").split(",") if name]
+    if not names:
+        return fields
+    unknown = [name for name in names if name not in fields]
+    if unknown:
+        raise ApiError(f"Unknown fields: {', '.join(unknown)}")
+    return {name: fields[name] for name in names}
+
+
+def lookups(*names: str) -> List[str]:
+    """Lookups for `values()`, without the repeated ones."""
+    return list(dict.fromkeys(names))
+
+
+def serialize(rows: Sequence[Dict[str, Any]], fields: Dict[str, str]) -> List[Dict[str, Any]]:
+    return [{name: row[lookup] for name, lookup in fields.items()} for row in rows]
+
+
+def list_response(request: HttpRequest, queryset: QuerySet) -> JsonResponse:
+    """One page of the queryset in primary key order, with the URLs of the adjacent pages."""
+    fields = selected_fields(request, queryset.model)
+    try:
+        limit = int(request.GET.get(LIMIT_VAR, settings.INVENTORY_API_PAGE_SIZE))
+    except ValueError:
+        raise ApiError("Invalid limit")
+    limit = max(1, min(limit, settings.INVENTORY_API_MAX_PAGE_SIZE))
+
+    try:
+        rows, previous_cursor, next_cursor = keyset_page(
+            queryset.values(*lookups("pk", *fields.values())), ("pk",), request.GET.get(CURSOR_VAR) or None, limit)
+    except ValueError as e:
+        raise ApiError(str(e))
+
+    def page_url(cursor: Optional[str]) -> Optional[str]:
+        if cursor is None:
+            return None
+        params = request.GET.copy()
+        params[CURSOR_VAR] = cursor
+        return request.build_absolute_uri(f"{request.path}?{params.urlencode()}")
+
+    return JsonResponse({
+        "results": serialize(rows, fields),
+        "previous": page_url(previous_cursor),
+        "next": page_url(next_cursor),
+    })
+
+
+def detail_row(queryset: QuerySet, pk: int, *names: str) -> Dict[str, Any]:
+    row = queryset.filter(pk=pk).values(*lookups("pk", *names)).first()
+    if row is None:
+        raise ApiError(f"No {queryset.model._meta.verbose_name} with id {pk}", 404)
+    return row
+
+
+def subtree_filter(model: Type[InventoryTreeNodeModel], request: HttpRequest, param: str) -> Optional[Iterable[int]]:
+    """Primary keys of the subtree of the node given in the query string parameter, if any."""
+    value = request.GET.get(param)
+    if not value:
+        return None
+    try:
+        node = model.objects.only("pk", *tree_backend().node_fields).get(pk=int(value))
+    except (ValueError, model.DoesNotExist):
+        raise ApiError(f"Invalid {param}: {value!r}")
+    return node.subtree_pks
+
+
+def nest(node: Dict[str, Any], descendants: Sequence[Dict[str, Any]], fields: Dict[str, str]) -> Dict[str, Any]:
+    """Serialize a node with its descendants nested under `children`, from rows sorted in tree order."""
+    serialized = {row["pk"]: {**serialize([row], fields)[0], "children": []} for row in descendants}
+    root = {**serialize([node], fields)[0], "children": []}
+    serialized[node["pk"]] = root
+    for row in descendants:
+        serialized[row["tn_parent_id"]]["children"].append(serialized[row["pk"]])
+    return root
+
+
+def tree_node_detail(request: HttpRequest, model: Type[InventoryTreeNodeModel], pk: int) -> JsonResponse:
+    """A node, with all of its descendants nested below it with `?subtree=1`, read in two queries."""
+    fields = selected_fields(request, model)
+    if request.GET.get("subtree") not in ("1", "true"):
+        return JsonResponse(serialize([detail_row(model.objects, pk, *fields.values())], fields)[0])
+
+    backend = tree_backend()
+    node = detail_row(model.objects, pk, *backend.node_fields, *fields.values())
+    descendants = list(model.objects.filter(pk__in=backend.subtree(model, node, include_self=False))
+                       .order_by("tn_order")
+                       .values(*lookups("pk", "tn_parent_id", *fields.values())))
+    return JsonResponse(nest(node, descendants, fields))
+
+
+def tree_node_list(request: HttpRequest, model: Type[InventoryTreeNodeModel]) -> JsonResponse:
+    """Nodes, only the children of `?parent=` or the subtree of `?descendants=` when given."""
+    queryset = model.objects.all()
+    parent = request.GET.get("parent")
+    if parent == "":
+        queryset = queryset.filter(tn_parent=None)
+    elif parent is not None:
+        try:
+            queryset = queryset.filter(tn_parent_id=int(parent))
+        except ValueError:
+            raise ApiError(f"Invalid parent: {parent!r}")
+    descendants = subtree_filter(model, request, "descendants")
+    if descendants is not None:
+        queryset = queryset.filter(pk__in=descendants)
+    return list_response(request, queryset)
+
+
+# Views
+
+@api_view(Item)
+def item_list(request: HttpRequest) -> JsonResponse:
+    """Items, filtered by location and category subtrees and by a search term with `?q=`."""
+    queryset = Item.objects.all()
+    for param, model in (("location", Location), ("category", Category)):
+        pks = subtree_filter(model, request, param)
+        if pks is not None:
+            queryset = queryset.filter(**{f"{param}__in": pks})
+
+    search_term = request.GET.get("q", "").strip()
+    if search_term:
+        if fts_available(queryset.db):
+            queryset = search_items(queryset, search_term)
+        else:
+            queryset = queryset.filter(name__icontains=search_term)
+    return list_response(request, queryset)
+
+
+@api_view(Item)
+def item_detail(request: HttpRequest, pk: int) -> JsonResponse:
+    fields = selected_fields(request, Item)
+    return JsonResponse(serialize([detail_row(Item.objects, pk, *fields.values())], fields)[0])
+
+
+@api_view(Location)
+def location_list(request: HttpRequest) -> JsonResponse:
+    return tree_node_list(request, Location)
+
+
+@api_view(Location)
+def location_detail(request: HttpRequest, pk: int) -> JsonResponse:
+    return tree_node_detail(request, Location, pk)
+
+
+@api_view(Category)
+def category_list(request: HttpRequest) -> JsonResponse:
+    return tree_node_list(request, Category)
+
+
+@api_view(Category)
+def category_detail(request: HttpRequest, pk: int) -> JsonResponse:
+    return tree_node_detail(request, Category, pk)
+
+
+@csrf_exempt
+@require_POST
+def item_batch(request: HttpRequest) -> JsonResponse:
+    """Apply a list of item operations atomically: relative amount adjustments, moves and creations.
+
+    The body is `{"operations": [...]}`, with operations like `{"op": "adjust", "item": 1, "delta": -2}`,
+    `{"op": "move", "item": 1, "location": 3}` and `{"op": "create", "name": "Screws", "location": 3}`. With an
+    `Idempotency-Key` header, the response is stored and a retried request returns it again instead of being applied
+    twice. Stations authenticate with an API token, see `authenticate`.
+    """
+    error = authenticate(request)
+    if error is not None:
+        return error
+    if not request.user.is_authenticated:
+        return error_response("Authentication required", 401)
+
+    try:
+        operations = json.loads(request.body)["operations"]
+    except (ValueError, TypeError, KeyError):
+        return error_response("The body must be a JSON object with a list of \"operations\"", 400)
+    if not isinstance(operations, list):
+        return error_response("The body must be a JSON object with a list of \"operations\"", 400)
+    if len(operations) > settings.INVENTORY_API_MAX_BATCH_SIZE:
+        return error_response(f"At most {settings.INVENTORY_API_MAX_BATCH_SIZE} operations per request", 400)
+
+    ops = {operation.get("op") for operation in operations if isinstance(operation, dict)}
+    if ({"adjust", "move"} & ops and not request.user.has_perm("inventory.change_item")) or \
+            ("create" in ops and not request.user.has_perm("inventory.add_item")):
+        return error_response("Permission denied", 403)
+
+    key = request.headers.get(IDEMPOTENCY_KEY_HEADER, "")
+    if len(key) > IdempotencyKey._meta.get_field("key").max_length:
+        return error_response(f"{IDEMPOTENCY_KEY_HEADER} is too long", 400)
+    request_hash = hashlib.sha256(request.body).hexdigest()
+
+    try:
+        with transaction.atomic():
+            record = None
+            if key:
+                IdempotencyKey.objects.filter(created__lt=timezone.now() - datetime.timedelta(
+                    seconds=settings.INVENTORY_IDEMPOTENCY_KEY_TTL)).delete()
+                try:
+                    with transaction.atomic():
+                        record = IdempotencyKey.objects.create(user=request.user, key=key, request_hash=request_hash)
+                except IntegrityError:
+                    # Applied already, or being applied by a concurrent request which held the database until done
+                    previous = IdempotencyKey.objects.get(user=request.user, key=key)
+                    if previous.request_hash != request_hash:
+                        return error_response(f"{IDEMPOTENCY_KEY_HEADER} already used for a different request", 422)
+                    response = JsonResponse(previous.response)
+                    response["Idempotent-Replayed"] = "true"
+                    return response
+
+            result = Batch(operations).apply(request.user.pk).as_dict()
+            if record is not None:
+                record.response = result
+                record.save(update_fields=["response"])
+    except BatchError as e:
+        return JsonResponse({"error": str(e), "operations": e.errors}, status=400)
+
+    return JsonResponse(result)
@@ -8,6 +8,10 @@ class InventoryConfig(AppConfig):
     name = 'inventory'
     verbose_name = _("inventory")
 
+    def ready(self):
+        # noinspection PyUnresolvedReferences
+        from . import signals
+
 
 class InventoryAdminConfig(AdminConfig):
     default_site = 'inventory.admin.InventoryAdminSite'
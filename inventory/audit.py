@@ -0,0 +1,51 @@
+from typing import List, Optional
+
+from django.conf import settings
+from django.contrib.admin.models import LogEntry, ADDITION, CHANGE
+from django.contrib.contenttypes.models import ContentType
+from django.db import models
+
+
+class LogEntryBatch:
+    """Collects admin history entries and writes them with a few bulk INSERTs instead of one per object.
+
+    Entries are the same `ModelAdmin.log_addition` / `log_change` would write. They are flushed every
+    `INVENTORY_LOG_BATCH_SIZE` entries and when leaving the `with` block without errors.
+    """
+
+    def __init__(self, user_id: int, batch_size: Optional[int] = None):
+        self.user_id = user_id
+        self.batch_size = batch_size or settings.INVENTORY_LOG_BATCH_SIZE
+        self.entries: List[LogEntry] = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.flush()
+        else:
+            self.entries.clear()
+
+    def log(self, obj: models.Model, action_flag: int, message: str = "", object_repr: Optional[str] = None):
+        self.entries.append(LogEntry(
+            user_id=self.user_id,
+            content_type_id=ContentType.objects.get_for_model(obj, for_concrete_model=False).pk,
+            object_id=str(obj.pk),
+            object_repr=(str(obj) if object_repr is None else object_repr)[:200],
+            action_flag=action_flag,
+            change_message=message,
+        ))
+        if len(self.entries) >= self.batch_size:
+            self.flush()
+
+    def log_addition(self, obj: models.Model, message: str = ""):
+        self.log(obj, ADDITION, message)
+
+    def log_change(self, obj: models.Model, message: str = ""):
+        self.log(obj, CHANGE, message)
+
+    def flush(self):
+        if self.entries:
+            LogEntry.objects.bulk_create(self.entries, batch_size=self.batch_size)
+            self.entries.clear()
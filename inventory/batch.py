@@ -0,0 +1,153 @@
+import json
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Optional
+
+from django.db import transaction
+from django.db.models import F, Max
+
+from inventory.audit import LogEntryBatch
+from inventory.importer import parse_item
+from inventory.models import Item, Location, Category
+
+OPERATIONS = ("adjust", "move", "create")
+
+# Keys of each operation referring to an item, location or category
+REFERENCES = {
+    "adjust": ("item",),
+    "move": ("item", "location"),
+    "create": ("location", "category"),
+}
+
+
+class BatchError(Exception):
+    """Invalid batch, with the error of each invalid operation by index."""
+
+    def __init__(self, message: str, errors: Optional[Dict[int, str]] = None):
+        super().__init__(message)
+        self.errors = errors or {}
+
+
+class BatchResult:
+    def __init__(self):
+        self.adjusted = 0
+        self.moved = 0
+        self.created: List[int] = []
+
+    def as_dict(self) -> dict:
+        return {"adjusted": self.adjusted, "moved": self.moved, "created": self.created}
+
+
+def _pk(value: Any, name: str, nullable: bool = False) -> Optional[int]:
+    if value is None and nullable:
+        return None
+    if isinstance(value, bool) or not isinstance(value, int):
+        raise ValueError(f"Invalid {name}: {value!r}")
+    return value
+
+
+class Batch:
+    """Operations of a batch request, validated and grouped so that they can be applied with a few queries."""
+
+    def __init__(self, operations: Any):
+        if not isinstance(operations, list):
+            raise BatchError("Operations must be a list")
+
+        # Summed up by item, then applied with one UPDATE per distinct delta
+        self.deltas: Dict[int, int] = defaultdict(int)
+        # Last destination of each moved item
+        self.moves: Dict[int, Optional[int]] = {}
+        self.creates: List[Item] = []
+        errors = {}
+
+        for index, operation in enumerate(operations):
+            try:
+                self.add(operation)
+            except ValueError as e:
+                errors[index] = str(e)
+
+        errors.update(self.check_references(operations, skip=errors.keys()))
+        if errors:
+            raise BatchError("Invalid operations", errors)
+
+    def add(self, operation: Any):
+        if not isinstance(operation, dict) or operation.get("op") not in OPERATIONS:
+            raise ValueError(f"Operation must be an object with \"op\" one of {', '.join(OPERATIONS)}")
+        op = operation["op"]
+
+        if op == "adjust":
+            delta = operation.get("delta")
+            if isinstance(delta, bool) or not isinstance(delta, int):
+                raise ValueError(f"Invalid delta: {delta!r}")
+            self.deltas[_pk(operation.get("item"), "item")] += delta
+        elif op == "move":
+            self.moves[_pk(operation.get("item"), "item")] = _pk(operation.get("location"), "location", True)
+        else:
+            item = parse_item(operation)
+            item.location_id = _pk(operation.get("location"), "location", True)
+            item.category_id = _pk(operation.get("category"), "category", True)
+            self.creates.append(item)
+
+    def check_references(self, operations: list, skip: Iterable[int] = ()) -> Dict[int, str]:
+        """Errors of the operations referring to items, locations or categories that don't exist."""
+        item_pks = set(self.deltas) | set(self.moves)
+        location_pks = {pk for pk in self.moves.values() if pk is not None} | \
+                       {item.location_id for item in self.creates if item.location_id is not None}
+        category_pks = {item.category_id for item in self.creates if item.category_id is not None}
+        missing = {
+            "item": item_pks - set(Item.objects.filter(pk__in=item_pks).values_list("pk", flat=True)),
+            "location": location_pks - set(Location.objects.filter(pk__in=location_pks).values_list("pk", flat=True)),
+            "category": category_pks - set(Category.objects.filter(pk__in=category_pks).values_list("pk", flat=True)),
+        }
+
+        errors = {}
+        skip = set(skip)
+        for index, operation in enumerate(operations):
+            if index in skip:
+                continue
+            # Other keys are ignored, whatever their value
+            for name in REFERENCES[operation["op"]]:
+                if isinstance(operation.get(name), int) and operation[name] in missing[name]:
+                    errors[index] = f"No {name} with id {operation[name]}"
+        return errors
+
+    def apply(self, user_id: int) -> BatchResult:
+        """Apply all the operations in one transaction, logging them in the admin history."""
+        result = BatchResult()
+        with transaction.atomic(), LogEntryBatch(user_id) as log:
+            if self.creates:
+                last_pk = Item.objects.aggregate(last_pk=Max("pk"))["last_pk"] or 0
+                Item.objects.bulk_create(self.creates)
+                if self.creates[0].pk is None:
+                    # The database could not return the new primary keys, they are however assigned in insertion order
+                    pks = Item.objects.filter(pk__gt=last_pk).order_by("pk").values_list("pk", flat=True)
+                    for item, pk in zip(self.creates, pks):
+                        item.pk = pk
+                result.created = [item.pk for item in self.creates]
+                # Their representation in the history shows the category name
+                categories = Category.objects.in_bulk({item.category_id for item in self.creates} - {None})
+                for item in self.creates:
+                    item.category = categories.get(item.category_id)
+                    log.log_addition(item, json.dumps([{"added": {}}]))
+
+            # Items counters are kept up to date by the queryset, for each group of items moved to the same location
+            pks_by_location = defaultdict(list)
+            for pk, location_pk in self.moves.items():
+                pks_by_location[location_pk].append(pk)
+            for location_pk, pks in pks_by_location.items():
+                result.moved += Item.objects.filter(pk__in=pks).update(location_id=location_pk)
+
+            pks_by_delta = defaultdict(list)
+            for pk, delta in self.deltas.items():
+                if delta:
+                    pks_by_delta[delta].append(pk)
+            for delta, pks in pks_by_delta.items():
+                result.adjusted += Item.objects.filter(pk__in=pks).update(amount=F("amount") + delta)
+
+            changed = set(self.moves) | {pk for pks in pks_by_delta.values() for pk in pks}
+            items = Item.objects.filter(pk__in=changed).select_related("category").only(
+                "name", "amount", "unit", "category__name")
+            for item in items:
+                pk = item.pk
+                fields = (["location"] if pk in self.moves else []) + (["amount"] if self.deltas.get(pk) else [])
+                log.log_change(item, json.dumps([{"changed": {"fields": fields}}]))
+        return result
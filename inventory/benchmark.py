@@ -0,0 +1,489 @@
+import csv
+import io
+import os
+import platform
+import statistics
+import tempfile
+import threading
+import time
+from collections import Counter
+from contextlib import nullcontext
+from typing import Any, Callable, Dict, Iterator, List, Optional
+from urllib.error import HTTPError, URLError
+from urllib.request import Request, urlopen
+
+import django
+from django.conf import settings
+from django.contrib.admin.helpers import ACTION_CHECKBOX_NAME
+from django.contrib.admin.models import LogEntry, CHANGE
+from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType
+from django.db import connection, transaction
+from django.db.models import Max
+from django.test import Client, RequestFactory, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from treenode.cache import clear_cache
+
+from inventory.actions import change_items_in_chunks
+from inventory.admin import admin_site
+from inventory.importer import FORMATS, import_items, parse_item
+from inventory.list_filters import ItemsByLocation, ItemsByCategory
+from inventory.middleware import QueryRecorder
+from inventory.models import Item, Location, Category, InventoryTreeNodeModel
+from inventory.tree_cache import forget_snapshots, tree_snapshot
+
+
+class Case:
+    """One request to time: a GET of an admin page, or a POST running an action."""
+
+    def __init__(self, name: str, url: str, data: Optional[dict] = None, method: str = "get"):
+        self.name = name
+        self.url = url
+        self.data = data or {}
+        self.method = method
+
+    def run(self, client: Client) -> Dict[str, Any]:
+        recorder = QueryRecorder()
+        start = time.perf_counter()
+        with connection.execute_wrapper(recorder):
+            response = getattr(client, self.method)(self.url, self.data)
+            # Exports are streamed, produce the whole file
+            if response.streaming:
+                for _chunk in response.streaming_content:
+                    pass
+        elapsed = time.perf_counter() - start
+        return {"time": elapsed, "queries": recorder.count, "status": response.status_code}
+
+
+def default_cases(action_size: int = 100) -> List[Case]:
+    """Admin pages and batch actions to time, with filters on the first nodes of the existing trees."""
+    root_location = Location.objects.filter(tn_parent=None).order_by("pk").first()
+    leaf_location = Location.objects.filter(tn_children_count=0).order_by("pk").first()
+    root_category = Category.objects.filter(tn_parent=None).order_by("pk").first()
+    today = str(timezone.localdate())
+    selected = list(Item.objects.order_by("pk").values_list("pk", flat=True)[:action_size])
+
+    items = reverse("admin:inventory_item_changelist")
+    locations = reverse("admin:inventory_location_changelist")
+    categories = reverse("admin:inventory_category_changelist")
+    cases = [
+        Case("index", reverse("admin:index")),
+        Case("item_changelist", items),
+        Case("item_changelist_amount", items, {"amount": 1}),
+        Case("item_changelist_expired", items, {"expiration__lt": today}),
+        Case("item_changelist_no_expiration", items, {"expiration__isnull": "True"}),
+        Case("item_changelist_search", items, {"q": "screw"}),
+        Case("location_changelist", locations),
+        Case("location_changelist_search", locations, {"q": "A1"}),
+        Case("category_changelist", categories),
+        Case("item_export_csv", items, {"action": "export_csv", ACTION_CHECKBOX_NAME: selected}, "post"),
+        Case("item_export_ndjson", items, {"action": "export_ndjson", ACTION_CHECKBOX_NAME: selected}, "post"),
+    ]
+    if root_location:
+        cases += [
+            Case("item_changelist_location", items, {"location": root_location.pk}),
+            Case("item_changelist_leaf_location", items, {"location": leaf_location.pk}),
+            Case("location_changelist_descendants", locations, {"descendants": root_location.pk}),
+            Case("item_move_form", items, {"action": "move_to_other_location", ACTION_CHECKBOX_NAME: selected},
+                 "post"),
+            Case("item_move", items, {"action": "move_to_other_location", ACTION_CHECKBOX_NAME: selected,
+                                      "post": "yes", "new_location": leaf_location.pk}, "post"),
+            Case("location_create_sections", locations, {
+                "action": "create_sections", ACTION_CHECKBOX_NAME: [root_location.pk], "post": "yes",
+                "rows": 5, "columns": 5, "locator_prefix": "BENCH", "name_prefix": "Benchmark",
+            }, "post"),
+        ]
+    if root_category:
+        cases += [
+            Case("item_changelist_category", items, {"category": root_category.pk}),
+            Case("category_changelist_descendants", categories, {"descendants": root_category.pk}),
+            Case("item_change_category_form", items, {"action": "change_category", ACTION_CHECKBOX_NAME: selected},
+                 "post"),
+            Case("item_change_category", items, {"action": "change_category", ACTION_CHECKBOX_NAME: selected,
+                                                 "post": "yes", "new_category": root_category.pk}, "post"),
+        ]
+    return cases
+
+
+def run_benchmarks(cases: List[Case], repeat: int = 5, warmup: int = 1) -> Dict[str, Any]:
+    """Time each case `repeat` times after `warmup` runs, as a superuser, returning a JSON-serializable report.
+
+    Every request runs in a savepoint that is rolled back, and the whole run in a transaction rolled back at the end,
+    so that actions always apply to the same data and the database is left unchanged. Actions run inline rather than
+    as background jobs, whatever the number of selected items.
+    """
+    results = []
+    # The test client uses the "testserver" host name
+    with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "testserver"],
+                           INVENTORY_ASYNC_ACTION_THRESHOLD=Item.objects.count()), transaction.atomic():
+        user = User(username="benchmark", is_staff=True, is_superuser=True)
+        User.objects.filter(username=user.username).delete()
+        user.save()
+        client = Client()
+        client.force_login(user)
+
+        for case in cases:
+            runs = []
+            for i in range(warmup + repeat):
+                with transaction.atomic():
+                    run = case.run(client)
+                    transaction.set_rollback(True)
+                if i >= warmup:
+                    runs.append(run)
+            times = [run["time"] * 1000 for run in runs]
+            results.append({
+                "name": case.name,
+                "method": case.method.upper(),
+                "url": case.url,
+                "status": runs[-1]["status"],
+                "queries": runs[-1]["queries"],
+                "runs": len(runs),
+                "min_ms": round(min(times), 3),
+                "median_ms": round(statistics.median(times), 3),
+                "mean_ms": round(statistics.mean(times), 3),
+                "max_ms": round(max(times), 3),
+            })
+
+        transaction.set_rollback(True)
+
+    return {
+        "environment": {
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "database": connection.vendor,
+            "timestamp": timezone.now().isoformat(),
+        },
+        "dataset": {
+            "items": Item.objects.count(),
+            "locations": Location.objects.count(),
+            "categories": Category.objects.count(),
+        },
+        "results": results,
+    }
+
+
+def compare_reports(baseline: Dict[str, Any], current: Dict[str, Any], threshold: float = 1.2) -> List[Dict[str, Any]]:
+    """Median time and query count of the cases present in both reports, flagging the ones slower by `threshold`."""
+    before = {result["name"]: result for result in baseline["results"]}
+    rows = []
+    for result in current["results"]:
+        old = before.get(result["name"])
+        if old is None:
+            continue
+        ratio = result["median_ms"] / old["median_ms"] if old["median_ms"] else 1
+        rows.append({
+            "name": result["name"],
+            "before_ms": old["median_ms"],
+            "after_ms": result["median_ms"],
+            "ratio": round(ratio, 3),
+            "before_queries": old["queries"],
+            "after_queries": result["queries"],
+            "regression": ratio > threshold or result["queries"] > old["queries"],
+        })
+    return rows
+
+
+class Comparison:
+    """A task timed with its current implementation and with the legacy one it replaced.
+
+    `prepare` is called with the benchmark user before each run, outside of the timing, and returns the argument
+    given to the implementation. Runs are rolled back, unless `restore` is set: it is then called with the argument
+    after each run to undo the changes, so that implementations committing their own transactions are timed with their
+    commits, like in production.
+    """
+
+    def __init__(self, name: str, current: Callable[[Any], Any], legacy: Callable[[Any], Any],
+                 prepare: Optional[Callable[[User], Any]] = None, restore: Optional[Callable[[Any], None]] = None):
+        self.name = name
+        self.current = current
+        self.legacy = legacy
+        self.prepare = prepare
+        self.restore = restore
+
+    def run(self, implementation: Callable[[Any], Any], user: User) -> Dict[str, Any]:
+        argument = self.prepare(user) if self.prepare else None
+        queries = 0
+
+        def count_queries(execute, sql, params, many, context):
+            nonlocal queries
+            queries += 1
+            return execute(sql, params, many, context)
+
+        try:
+            with transaction.atomic() if self.restore is None else nullcontext():
+                start = time.perf_counter()
+                with connection.execute_wrapper(count_queries):
+                    implementation(argument)
+                elapsed = time.perf_counter() - start
+                if self.restore is None:
+                    transaction.set_rollback(True)
+        finally:
+            if self.restore is not None:
+                self.restore(argument)
+        return {"time": elapsed, "queries": queries}
+
+
+def legacy_item_location_lookups(_argument=None) -> list:
+    """Choices of the item location filter as built before the distinct query: one lazy load per item and parent."""
+
+    def label(location):
+        parent = location.tn_parent
+        return f"{label(parent)}/{location.locator}" if parent is not None else location.locator
+
+    return sorted(((i.location.id, label(i.location)) for i in Item.objects.all() if i.location),
+                  key=lambda l: l[1])
+
+
+def legacy_item_category_lookups(_argument=None) -> list:
+    """Choices of the item category filter as built before the bulk node fetch."""
+    result = set()
+    for i in Item.objects.all():
+        if not i.category:
+            continue
+        for category in [i.category, *i.category.ancestors]:
+            result.add((category.pk, "/".join(c.name if c else "<404>" for c in category.breadcrumbs)))
+    return sorted(result, key=lambda c: c[1])
+
+
+def item_filter_lookups(_argument=None) -> list:
+    request = RequestFactory().get(reverse("admin:inventory_item_changelist"))
+    model_admin = admin_site._registry[Item]
+    return [ItemsByLocation(request, {}, Item, model_admin).lookup_choices,
+            ItemsByCategory(request, {}, Item, model_admin).lookup_choices]
+
+
+def legacy_item_filter_lookups(_argument=None) -> list:
+    return [legacy_item_location_lookups(), legacy_item_category_lookups()]
+
+
+def legacy_change_items_in_chunks(user_id: int, items: List[int], **fields) -> Iterator[int]:
+    """`change_items_in_chunks` as it was before `LogEntryBatch`: one admin history INSERT per item."""
+    chunk_size = settings.INVENTORY_JOB_CHUNK_SIZE
+    content_type_id = ContentType.objects.get_for_model(Item).pk
+    for start in range(0, len(items), chunk_size):
+        chunk = items[start:start + chunk_size]
+        with transaction.atomic():
+            for obj in Item.objects.filter(pk__in=chunk).select_related('category'):
+                obj_display = str(obj)
+                LogEntry.objects.log_action(user_id, content_type_id, obj.pk, obj_display, CHANGE, obj_display)
+            Item.objects.filter(pk__in=chunk).update(**fields)
+        yield start + len(chunk)
+
+
+def item_move_comparison(size: int) -> Comparison:
+    """Move `size` items to a leaf location like the background job does, a committed chunk at a time."""
+
+    def prepare(user):
+        target = Location.objects.filter(tn_children_count=0).order_by("pk").first()
+        locations = dict(Item.objects.exclude(location=target).order_by("pk").values_list("pk", "location")[:size])
+        return {"user": user, "target": target, "locations": locations,
+                "last_log_pk": LogEntry.objects.aggregate(last=Max("pk"))["last"] or 0}
+
+    def move(implementation):
+        def run(argument):
+            for _done in implementation(argument["user"].pk, list(argument["locations"]),
+                                        location=argument["target"]):
+                pass
+        return run
+
+    def restore(argument):
+        pks_by_location = {}
+        for pk, location_pk in argument["locations"].items():
+            pks_by_location.setdefault(location_pk, []).append(pk)
+        with transaction.atomic():
+            for location_pk, pks in pks_by_location.items():
+                Item.objects.filter(pk__in=pks).update(location_id=location_pk)
+            LogEntry.objects.filter(pk__gt=argument["last_log_pk"]).delete()
+
+    return Comparison(f"item_move_{size}", move(change_items_in_chunks), move(legacy_change_items_in_chunks),
+                      prepare, restore)
+
+
+def legacy_node_by_path(model, path: str) -> Optional[InventoryTreeNodeModel]:
+    if not path:
+        return None
+    node = model.objects.filter(**{model.path_cache_field: path}).first()
+    if node is None:
+        parent_path, _, label = path.rpartition(model.path_separator)
+        node = model(tn_parent=legacy_node_by_path(model, parent_path), name=label)
+        setattr(node, model.path_label_field, label)
+        node.save()
+    return node
+
+
+def legacy_import_items(stream: io.StringIO, import_format: str):
+    """Import as items were added before the bulk importer: one row at a time, saving each item and missing node."""
+    with transaction.atomic():
+        for _line_num, row in FORMATS[import_format](stream):
+            item = parse_item(row)
+            item.location = legacy_node_by_path(Location, row.get("location"))
+            item.category = legacy_node_by_path(Category, row.get("category"))
+            item.save()
+
+
+def item_import_comparison(rows: int) -> Comparison:
+    """Import a CSV file of `rows` items in existing locations and categories, and in 10 new locations."""
+
+    def prepare(_user):
+        locations = list(Location.objects.order_by("pk").values_list(Location.path_cache_field, flat=True))
+        categories = list(Category.objects.order_by("pk").values_list(Category.path_cache_field, flat=True))
+        new_locations = [f"IMPORT/BENCH{i}" for i in range(10)]
+        output = io.StringIO()
+        writer = csv.writer(output)
+        writer.writerow(["name", "amount", "unit", "location", "category"])
+        for i in range(rows):
+            location = new_locations[i // 1000 % 10] if i % 1000 == 0 else locations[i % len(locations)]
+            category = categories[i % len(categories)] if categories and i % 3 else ""
+            writer.writerow([f"Imported item {i}", i % 10 + 1, "pieces", location, category])
+        return output.getvalue()
+
+    def run(implementation):
+        return lambda data: implementation(io.StringIO(data), "csv")
+
+    return Comparison(f"item_import_{rows}", run(import_items), run(legacy_import_items), prepare)
+
+
+def tree_cache_comparison() -> Comparison:
+    """Load the location and category changelists in a server process that has not read the trees yet.
+
+    The current implementation takes them from the snapshots in `INVENTORY_TREE_CACHE`, or in a file based cache in
+    the temporary directory if it is not set, the legacy one from the database. Snapshots are not used inside
+    transactions, so runs are not rolled back: they change nothing anyway.
+    """
+    urls = [reverse("admin:inventory_location_changelist"), reverse("admin:inventory_category_changelist")]
+    cache_settings = {"INVENTORY_TREE_CACHE": settings.INVENTORY_TREE_CACHE}
+    if not settings.INVENTORY_TREE_CACHE:
+        cache_settings = {"INVENTORY_TREE_CACHE": "benchmark_trees", "CACHES": {**settings.CACHES, "benchmark_trees": {
+            "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+            "LOCATION": os.path.join(tempfile.gettempdir(), "inventory_benchmark_trees"),
+        }}}
+    clients = {}
+
+    def prepare(user):
+        if user.pk not in clients:
+            clients[user.pk] = Client()
+            clients[user.pk].force_login(user)
+        # Published by the first process reading the trees after a change, then loaded by the other ones
+        with override_settings(**cache_settings):
+            tree_snapshot(Location)
+            tree_snapshot(Category)
+        forget_snapshots()
+        for model in (Location, Category):
+            clear_cache(model)
+        return clients[user.pk]
+
+    def load(**overrides):
+        def run(client):
+            # The test client uses the "testserver" host name
+            with override_settings(ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "testserver"], **overrides):
+                for url in urls:
+                    client.get(url)
+        return run
+
+    return Comparison("tree_changelists_cold", load(**cache_settings), load(INVENTORY_TREE_CACHE=None), prepare,
+                      restore=lambda _client: None)
+
+
+def default_comparisons(move_size: int = 10000, import_rows: int = 100000) -> List[Comparison]:
+    return [
+        Comparison("item_filter_lookups", item_filter_lookups, legacy_item_filter_lookups),
+        item_move_comparison(move_size),
+        item_import_comparison(import_rows),
+        tree_cache_comparison(),
+    ]
+
+
+def run_comparisons(comparisons: List[Comparison], repeat: int = 1, warmup: int = 0) -> List[Dict[str, Any]]:
+    """Time the current and legacy implementations of each comparison `repeat` times after `warmup` runs.
+
+    Unlike `run_benchmarks`, this runs outside of any transaction: a benchmark user is created and deleted at the end.
+    """
+    user = User(username="benchmark", is_staff=True, is_superuser=True)
+    User.objects.filter(username=user.username).delete()
+    user.save()
+    results = []
+    try:
+        for comparison in comparisons:
+            result = {"name": comparison.name}
+            for implementation_name, implementation in (("current", comparison.current),
+                                                        ("legacy", comparison.legacy)):
+                runs = [comparison.run(implementation, user) for _i in range(warmup + repeat)][warmup:]
+                result[f"{implementation_name}_ms"] = round(statistics.median(run["time"] for run in runs) * 1000, 3)
+                result[f"{implementation_name}_queries"] = runs[-1]["queries"]
+            result["runs"] = repeat
+            result["speedup"] = round(result["legacy_ms"] / result["current_ms"], 2) if result["current_ms"] else None
+            results.append(result)
+    finally:
+        user.delete()
+    return results
+
+
+def percentiles(values: List[float], points=(50, 90, 95, 99)) -> Dict[str, float]:
+    cuts = statistics.quantiles(values, n=100, method="inclusive") if len(values) > 1 else values * 99
+    return {f"p{point}": round(cuts[point - 1], 3) for point in points}
+
+
+def load_test(url: str, concurrency: int = 200, requests: int = 1000, headers: Optional[Dict[str, str]] = None,
+              timeout: float = 60) -> Dict[str, Any]:
+    """Send `requests` GETs to a running server from `concurrency` clients at once, returning latency percentiles.
+
+    Each client is a thread sending its requests one after the other, on a new connection each.
+    """
+    latencies: List[float] = []
+    statuses: Counter = Counter()
+    errors: Counter = Counter()
+    remaining = requests
+    lock = threading.Lock()
+    start_barrier = threading.Barrier(concurrency + 1)
+
+    def client():
+        nonlocal remaining
+        start_barrier.wait()
+        while True:
+            with lock:
+                if remaining <= 0:
+                    return
+                remaining -= 1
+            start = time.perf_counter()
+            try:
+                with urlopen(Request(url, headers=headers or {}), timeout=timeout) as response:
+                    response.read()
+                    status = response.status
+            except HTTPError as e:
+                e.read()
+                status = e.code
+            except (URLError, OSError) as e:
+                with lock:
+                    errors[type(e).__name__] += 1
+                continue
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed * 1000)
+                statuses[status] += 1
+
+    threads = [threading.Thread(target=client, daemon=True) for _i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    start_barrier.wait()
+    start = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    duration = time.perf_counter() - start
+
+    result = {
+        "url": url,
+        "concurrency": concurrency,
+        "requests": requests,
+        "statuses": {str(status): count for status, count in sorted(statuses.items())},
+        "errors": dict(errors),
+        "duration_s": round(duration, 3),
+        "throughput_rps": round(len(latencies) / duration, 1) if duration else None,
+    }
+    if latencies:
+        result.update({
+            "min_ms": round(min(latencies), 3),
+            **{f"{name}_ms": value for name, value in percentiles(latencies).items()},
+            "max_ms": round(max(latencies), 3),
+        })
+    return result
@@ -0,0 +1,65 @@
+import csv
+import json
+from typing import Iterable, Iterator, Dict, Any
+
+from django.db.models import QuerySet
+from django.http import StreamingHttpResponse
+
+# Exported column name -> Item field lookup
+EXPORT_FIELDS = {
+    "id": "pk",
+    "name": "name",
+    "description": "description",
+    "amount": "amount",
+    "unit": "unit",
+    "location": "location__full_locator",
+    "category": "category__full_name",
+    "expiration": "expiration",
+}
+
+DEFAULT_CHUNK_SIZE = 2000
+
+
+def export_rows(queryset: QuerySet, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[Dict[str, Any]]:
+    """Stream the items of the queryset as plain dicts, with the full location and category paths."""
+    names = list(EXPORT_FIELDS)
+    for values in queryset.values_list(*EXPORT_FIELDS.values()).iterator(chunk_size=chunk_size):
+        yield dict(zip(names, values))
+
+
+class _Echo:
+    """File-like object returning what is written to it, so that `csv.writer` can produce lines one at a time."""
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(rows: Iterable[Dict[str, Any]]) -> Iterator[str]:
+    writer = csv.writer(_Echo())
+    yield writer.writerow(EXPORT_FIELDS.keys())
+    for row in rows:
+        yield writer.writerow("" if v is None else v for v in row.values())
+
+
+def ndjson_lines(rows: Iterable[Dict[str, Any]]) -> Iterator[str]:
+    for row in rows:
+        yield json.dumps(row, default=str, ensure_ascii=False) + "\n"
+
+
+# Format name -> (line generator, content type, file extension)
+FORMATS = {
+    "csv": (csv_lines, "text/csv", "csv"),
+    "ndjson": (ndjson_lines, "application/x-ndjson", "ndjson"),
+}
+
+
+def export_lines(queryset: QuerySet, export_format: str, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[str]:
+    lines, _, _ = FORMATS[export_format]
+    return lines(export_rows(queryset, chunk_size))
+
+
+def streaming_export_response(queryset: QuerySet, export_format: str, filename: str = "inventory"):
+    _, content_type, extension = FORMATS[export_format]
+    response = StreamingHttpResponse(export_lines(queryset, export_format), content_type=content_type)
+    response["Content-Disposition"] = f'attachment; filename="{filename}.{extension}"'
+    return response
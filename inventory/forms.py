@@ -0,0 +1,42 @@
+from django import forms
+from django.contrib.admin.widgets import AutocompleteSelect
+from django.utils.translation import gettext_lazy as _
+
+from inventory.importer import FORMATS
+from inventory.models import Item
+
+
+class ImportForm(forms.Form):
+    file = forms.FileField(label=_("file"))
+    format = forms.ChoiceField(label=_("format"), required=False,
+                               choices=[("", _("From file extension"))] + [(f, f.upper()) for f in FORMATS])
+    dry_run = forms.BooleanField(label=_("dry run"), required=False, initial=True,
+                                 help_text=_("Only check the file, without saving anything"))
+
+
+class AutocompleteTreeNodeForm(forms.Form):
+    """Picker of the new location or category of items, loading matching choices from the admin autocomplete view.
+
+    Rendering a plain select would build the full path of every node in the tree.
+    """
+    field_name = None
+    item_field = None
+    required = True
+
+    def __init__(self, *args, admin_site, **kwargs):
+        super().__init__(*args, **kwargs)
+        field = Item._meta.get_field(self.item_field)
+        self.fields[self.field_name] = forms.ModelChoiceField(
+            field.related_model.objects.all(), required=self.required, label=field.verbose_name,
+            widget=AutocompleteSelect(field, admin_site))
+
+
+class NewLocationForm(AutocompleteTreeNodeForm):
+    field_name = "new_location"
+    item_field = "location"
+
+
+class NewCategoryForm(AutocompleteTreeNodeForm):
+    field_name = "new_category"
+    item_field = "category"
+    required = False
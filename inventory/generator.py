@@ -0,0 +1,81 @@
+import datetime
+import random
+import string
+from typing import Iterator, List, Type
+
+from django.db import transaction
+from django.utils import timezone
+
+from inventory.models import Item, Location, Category, InventoryTreeNodeModel
+
+DEFAULT_BATCH_SIZE = 5000
+
+LOCATION_NAMES = ("Room", "Cabinet", "Shelf", "Drawer", "Box", "Bag")
+ITEM_ADJECTIVES = ("Small", "Large", "Red", "Blue", "Spare", "Old", "New", "Broken", "Metal", "Plastic", "Wooden")
+ITEM_NOUNS = ("screwdriver", "battery", "cable", "screw", "nail", "resistor", "capacitor", "tape", "glue", "lamp",
+              "charger", "adapter", "brush", "candle", "fuse", "hinge", "washer", "spring", "marker", "sponge")
+
+
+def generate_tree(model: Type[InventoryTreeNodeModel], depth: int, fanout: int) -> List[List[int]]:
+    """Create `fanout` root nodes, each with `fanout` children down to `depth` levels, one bulk insert per level.
+
+    Returns the primary keys of the nodes of each level, from the roots down.
+    """
+    levels = []
+    parents = [None]
+    for level in range(depth):
+        nodes = []
+        for parent_pk in parents:
+            for i in range(fanout):
+                if model is Location:
+                    locator = f"{string.ascii_uppercase[level % 26]}{i}"
+                    node = Location(tn_parent_id=parent_pk, locator=locator,
+                                    name=f"{LOCATION_NAMES[level % len(LOCATION_NAMES)]} {locator}")
+                else:
+                    node = model(tn_parent_id=parent_pk, name=f"Category {level}.{i}")
+                nodes.append(node)
+        parents = [node.pk for node in model.bulk_create_nodes(nodes)]
+        levels.append(parents)
+    return levels
+
+
+def generate_items(count: int, location_pks: List[int], category_pks: List[int], rng: random.Random,
+                   batch_size: int = DEFAULT_BATCH_SIZE) -> Iterator[int]:
+    """Insert `count` random items in the given locations and categories, a batch at a time.
+
+    About one item in ten has no category and one in three expires, between two months ago and a year from now.
+    Yields the number of created items after each batch.
+    """
+    today = timezone.localdate()
+    units = Item.Unit.values
+    for start in range(0, count, batch_size):
+        items = []
+        for _i in range(min(batch_size, count - start)):
+            expires = rng.random() < 0.3
+            items.append(Item(
+                name=f"{rng.choice(ITEM_ADJECTIVES)} {rng.choice(ITEM_NOUNS)}",
+                amount=rng.randint(0, 100),
+                unit=rng.choice(units),
+                location_id=rng.choice(location_pks) if location_pks else None,
+                category_id=rng.choice(category_pks) if category_pks and rng.random() >= 0.1 else None,
+                expiration=today + datetime.timedelta(days=rng.randint(-60, 365)) if expires else None,
+            ))
+        Item.objects.bulk_create(items, batch_size=batch_size)
+        yield start + len(items)
+
+
+def generate_inventory(items: int, location_depth: int = 3, location_fanout: int = 10, category_depth: int = 2,
+                       category_fanout: int = 10, seed: int = 0,
+                       batch_size: int = DEFAULT_BATCH_SIZE) -> Iterator[int]:
+    """Fill an empty inventory with a synthetic dataset, for benchmarks.
+
+    Items are spread over the locations of the deepest level and over all categories. The same arguments and seed
+    always produce the same dataset, except for expiration dates which are relative to the current day. Everything is
+    inserted in a single transaction; yields the number of created items after each batch.
+    """
+    rng = random.Random(seed)
+    with transaction.atomic():
+        locations = generate_tree(Location, location_depth, location_fanout)
+        categories = generate_tree(Category, category_depth, category_fanout)
+        yield from generate_items(items, locations[-1] if locations else [],
+                                  [pk for level in categories for pk in level], rng, batch_size)
@@ -0,0 +1,178 @@
+import csv
+import datetime
+import json
+from typing import Iterable, Iterator, Dict, Any, List, Tuple, Type, Optional, TextIO
+
+from django.db import transaction
+
+from inventory.models import Item, Location, Category, InventoryTreeNodeModel
+
+DEFAULT_BATCH_SIZE = 1000
+
+
+def csv_rows(stream: TextIO) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    reader = csv.DictReader(stream)
+    for row in reader:
+        yield reader.line_num, row
+
+
+def ndjson_rows(stream: TextIO) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    for line_num, line in enumerate(stream, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            row = {"_error": f"Invalid JSON: {e}"}
+        yield line_num, row if isinstance(row, dict) else {"_error": "Not a JSON object"}
+
+
+FORMATS = {
+    "csv": csv_rows,
+    "ndjson": ndjson_rows,
+}
+
+
+class ImportResult:
+    def __init__(self, dry_run: bool):
+        self.dry_run = dry_run
+        self.rows = 0
+        self.created_items = 0
+        self.created_locations = 0
+        self.created_categories = 0
+        self.errors: List[Tuple[int, str]] = []
+
+    def __str__(self):
+        return (f"{'Would import' if self.dry_run else 'Imported'} {self.created_items} of {self.rows} items, "
+                f"creating {self.created_locations} locations and {self.created_categories} categories, "
+                f"{len(self.errors)} errors")
+
+
+class PathResolver:
+    """Maps full paths to tree nodes, creating the missing ones in bulk one tree level at a time."""
+
+    def __init__(self, model: Type[InventoryTreeNodeModel]):
+        self.model = model
+        self.pks = {path: pk for pk, path in model.objects.values_list("pk", model.path_cache_field)}
+        self.created = 0
+
+    def normalize(self, path: str) -> str:
+        """Canonical form of a path, raising ValueError if it can't be used to create nodes."""
+        normalized = self.model.normalize_path(path)
+        max_length = self.model._meta.get_field(self.model.path_label_field).max_length
+        for part in normalized.split(self.model.path_separator):
+            if not part or len(part) > max_length:
+                raise ValueError(f"Invalid {self.model._meta.verbose_name} path: {path!r}")
+        return normalized
+
+    def resolve(self, paths: Iterable[str]) -> Dict[str, int]:
+        """Primary keys of the given normalized paths."""
+        missing_by_depth: Dict[int, set] = {}
+        for path in paths:
+            parts = path.split(self.model.path_separator)
+            for depth in range(1, len(parts) + 1):
+                prefix = self.model.path_separator.join(parts[:depth])
+                if prefix not in self.pks:
+                    missing_by_depth.setdefault(depth, set()).add(prefix)
+
+        for depth in sorted(missing_by_depth):
+            paths = sorted(missing_by_depth[depth])
+            nodes = []
+            for path in paths:
+                parent_path, _, label = path.rpartition(self.model.path_separator)
+                node = self.model(tn_parent_id=self.pks[parent_path] if parent_path else None, name=label)
+                setattr(node, self.model.path_label_field, label)
+                nodes.append(node)
+            for path, node in zip(paths, self.model.bulk_create_nodes(nodes)):
+                self.pks[path] = node.pk
+            self.created += len(nodes)
+
+        return self.pks
+
+
+def parse_item(row: Dict[str, Any]) -> Item:
+    """Build an unsaved item from an imported row, raising ValueError on invalid data."""
+    if "_error" in row:
+        raise ValueError(row["_error"])
+
+    name = str(row.get("name") or "").strip()
+    if not name:
+        raise ValueError("Missing name")
+
+    item = Item(name=name, description=str(row.get("description") or ""))
+
+    amount = row.get("amount")
+    if amount not in (None, ""):
+        try:
+            item.amount = int(amount)
+        except (TypeError, ValueError):
+            raise ValueError(f"Invalid amount: {amount!r}")
+
+    unit = row.get("unit")
+    if unit:
+        if unit not in Item.Unit.values:
+            raise ValueError(f"Invalid unit: {unit!r}")
+        item.unit = unit
+
+    expiration = row.get("expiration")
+    if expiration:
+        try:
+            item.expiration = datetime.date.fromisoformat(str(expiration))
+        except ValueError:
+            raise ValueError(f"Invalid expiration date: {expiration!r}")
+
+    return item
+
+
+def import_items(stream: TextIO, import_format: str, dry_run: bool = False,
+                 batch_size: int = DEFAULT_BATCH_SIZE) -> ImportResult:
+    """Import items from a CSV or NDJSON stream, in the format produced by the export.
+
+    Locations and categories are given by their full path (i.e. `LR/CAB/D3`); missing ones are created. Rows are
+    read and inserted in batches inside a single transaction, which is rolled back at the end in dry-run mode.
+    Invalid rows are skipped and reported in the result.
+    """
+    result = ImportResult(dry_run)
+
+    with transaction.atomic():
+        locations = PathResolver(Location)
+        categories = PathResolver(Category)
+
+        batch: List[Tuple[Item, Optional[str], Optional[str]]] = []
+
+        def flush():
+            location_pks = locations.resolve(path for _, path, _ in batch if path)
+            category_pks = categories.resolve(path for _, _, path in batch if path)
+            for item, location_path, category_path in batch:
+                item.location_id = location_pks[location_path] if location_path else None
+                item.category_id = category_pks[category_path] if category_path else None
+            Item.objects.bulk_create([item for item, _, _ in batch], batch_size=batch_size)
+            result.created_items += len(batch)
+            batch.clear()
+
+        for line_num, row in FORMATS[import_format](stream):
+            result.rows += 1
+            try:
+                item = parse_item(row)
+                location_path = str(row.get("location") or "").strip()
+                location_path = locations.normalize(location_path) if location_path else None
+                category_path = str(row.get("category") or "").strip()
+                category_path = categories.normalize(category_path) if category_path else None
+            except ValueError as e:
+                result.errors.append((line_num, str(e)))
+                continue
+
+            batch.append((item, location_path, category_path))
+            if len(batch) >= batch_size:
+                flush()
+
+        if batch:
+            flush()
+
+        result.created_locations = locations.created
+        result.created_categories = categories.created
+
+        if dry_run:
+            transaction.set_rollback(True)
+
+    return result
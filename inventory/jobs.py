@@ -0,0 +1,75 @@
+import logging
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterator, Optional
+
+from django.conf import settings
+from django.db import transaction, close_old_connections, connection
+from django.utils import timezone
+
+from inventory.models import Job
+
+logger = logging.getLogger(__name__)
+
+# Job handlers receive the job and yield the number of processed objects after each chunk
+JobHandler = Callable[[Job], Iterator[int]]
+
+_handlers: Dict[str, JobHandler] = {}
+_executor: Optional[ThreadPoolExecutor] = None
+
+
+def job_handler(action: str):
+    """Register the decorated generator function as the handler for jobs of the given action."""
+
+    def decorator(func: JobHandler) -> JobHandler:
+        _handlers[action] = func
+        return func
+
+    return decorator
+
+
+def get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=settings.INVENTORY_JOB_WORKERS, thread_name_prefix="inventory-job")
+    return _executor
+
+
+def enqueue(action: str, description: str, user, arguments: dict, total: int) -> Job:
+    """Store a new job and run it in the background once the current transaction is committed."""
+    if action not in _handlers:
+        raise ValueError(f"No handler registered for job action '{action}'")
+    job = Job.objects.create(action=action, description=description[:200], user=user, arguments=arguments, total=total)
+    transaction.on_commit(lambda: get_executor().submit(run_job, job.pk))
+    return job
+
+
+def run_job(job_pk: int):
+    """Run a job to completion, recording its progress after every chunk."""
+    # Worker threads own their connection, but jobs may also be run inline from within a transaction
+    owns_connection = not connection.in_atomic_block
+    if owns_connection:
+        close_old_connections()
+    try:
+        job = Job.objects.get(pk=job_pk)
+        Job.objects.filter(pk=job.pk).update(status=Job.Status.RUNNING)
+        for done in _handlers[job.action](job):
+            Job.objects.filter(pk=job.pk).update(done=done)
+        Job.objects.filter(pk=job.pk).update(status=Job.Status.DONE, finished=timezone.now())
+    except Exception:
+        logger.exception("Job %d failed", job_pk)
+        Job.objects.filter(pk=job_pk).update(status=Job.Status.FAILED, error=traceback.format_exc(),
+                                             finished=timezone.now())
+    finally:
+        if owns_connection:
+            connection.close()
+
+
+def fail_interrupted_jobs() -> int:
+    """Mark the jobs left pending or running by server processes that are gone as failed, returning their number.
+
+    Jobs only live in the thread pool of the process that started them: call this when starting the server, before
+    any process can start new ones.
+    """
+    return Job.objects.filter(status__in=(Job.Status.PENDING, Job.Status.RUNNING)).update(
+        status=Job.Status.FAILED, error="Interrupted by a server restart", finished=timezone.now())
@@ -4,117 +4,122 @@ from django.contrib import admin
 from django.contrib.admin import ListFilter
 from django.contrib.admin.options import IncorrectLookupParameters, ModelAdmin
 from django.contrib.admin.utils import prepare_lookup_value
-from django.core.exceptions import ValidationError
+from django.core.exceptions import ImproperlyConfigured, ValidationError
 from django.http import HttpRequest
 from django.utils import timezone
+from django.utils.functional import cached_property
 from django.utils.translation import gettext_lazy as _
 
 from inventory.models import Location, Category
 
 
-class ItemsByLocation(admin.SimpleListFilter):
+class LazySimpleListFilter(admin.SimpleListFilter):
+    """Simple list filter only looking up its choices when they are displayed.
+
+    Exports apply the changelist filters without showing them, and then skip the queries of the lookups.
+    """
+
+    def __init__(self, request, params, model, model_admin):
+        ListFilter.__init__(self, request, params, model, model_admin)
+        if self.parameter_name is None:
+            raise ImproperlyConfigured(
+                "The list filter '%s' does not specify a 'parameter_name'." % self.__class__.__name__)
+        if self.parameter_name in params:
+            self.used_parameters[self.parameter_name] = params.pop(self.parameter_name)
+        self.request = request
+        self.model_admin = model_admin
+
+    @cached_property
+    def lookup_choices(self):
+        return list(self.lookups(self.request, self.model_admin) or ())
+
+    def has_output(self):
+        # The selected choice is displayed in any case
+        return bool(self.used_parameters) or super().has_output()
+
+
+class ItemsByLocation(LazySimpleListFilter):
     title = _("location")
     parameter_name = "location"
 
     def lookups(self, request: HttpRequest, model_admin: ModelAdmin):
         # noinspection PyTypeChecker
         maybe_id = request.GET.get(self.parameter_name, None)
-        if maybe_id:
-            maybe_id = int(maybe_id)
-            loc = Location.objects.get(pk=maybe_id)
-            yield loc.id, str(loc)
-
-        for i in sorted(((i.location.id, str(i.location)) for i in model_admin.model.objects.all() if
-                         i.location and i.location.pk != maybe_id),
-                        key=lambda l: l[1]):
+        maybe_id = int(maybe_id) if maybe_id else None
+
+        used_pks = set(model_admin.model.objects
+                       .exclude(location=None)
+                       .order_by()
+                       .values_list('location', flat=True)
+                       .distinct())
+        labels = Location.path_labels(used_pks | {maybe_id} if maybe_id else used_pks)
+
+        if maybe_id in labels:
+            yield maybe_id, labels.pop(maybe_id)
+
+        for i in sorted(labels.items(), key=lambda l: l[1]):
             yield i
 
     def queryset(self, request, queryset):
         if not self.value():
             return queryset
         location = Location.objects.get(pk=self.value())
-        result = queryset.filter(location=location)
-        for i in location.descendants:
-            result |= queryset.filter(location=i)
-        return result
+        return queryset.filter(location__in=location.subtree_pks)
 
 
-class ItemsByCategory(admin.SimpleListFilter):
+class ItemsByCategory(LazySimpleListFilter):
     title = _("category")
     parameter_name = "category"
 
     def lookups(self, request, model_admin):
-        result = set()
-        returned_ids = set()
-
-        def add_item(categ: Category):
-            result.add((categ.pk, categ.bcrumb_name))
-            returned_ids.add(categ.pk)
-
-        for i in model_admin.model.objects.all():
-            if not i.category:
-                continue
-            add_item(i.category)
-            list(map(add_item, i.category.ancestors))
+        used_pks = set(model_admin.model.objects
+                       .exclude(category=None)
+                       .order_by()
+                       .values_list('category', flat=True)
+                       .distinct())
+        labels = Category.path_labels(used_pks, with_ancestors=True)
 
         maybe_id = request.GET.get(self.parameter_name, None)
-        if maybe_id and int(maybe_id) not in returned_ids:
+        if maybe_id and int(maybe_id) not in labels:
             cat = Category.objects.get(pk=int(maybe_id))
             yield cat.id, cat.bcrumb_name
 
-        for i in sorted(result, key=lambda c: c[1]):
+        for i in sorted(labels.items(), key=lambda c: c[1]):
             yield i
 
     def queryset(self, request, queryset):
         if not self.value():
             return queryset
         category = Category.objects.get(pk=self.value())
-        result = queryset.filter(category=category)
-        for i in category.descendants:
-            if i:
-                result |= queryset.filter(category=i)
-        return result
+        return queryset.filter(category__in=category.subtree_pks)
 
 
-class LocationsByLocation(admin.SimpleListFilter):
+class LocationsByLocation(LazySimpleListFilter):
     title = _("container")
     parameter_name = "descendants"
 
     def lookups(self, request, model_admin):
-        return sorted(
-            ((i.id, str(i)) for i in model_admin.model.objects.all()),
-            key=lambda i: i[1]
-        )
+        return sorted(Location.path_labels().items(), key=lambda i: i[1])
 
     def queryset(self, request, queryset):
         if not self.value():
             return queryset
         location = Location.objects.get(pk=self.value())
-        result = queryset.filter(pk=location.pk)
-        for i in location.descendants:
-            if i:
-                result |= queryset.filter(pk=i.pk)
-        return result
+        return queryset.filter(pk__in=location.subtree_pks)
 
 
-class CategoriesByCategory(admin.SimpleListFilter):
+class CategoriesByCategory(LazySimpleListFilter):
     title = _("parent")
     parameter_name = "descendants"
 
     def lookups(self, request, model_admin):
-        return sorted(
-            ((i.id, i.bcrumb_name) for i in model_admin.model.objects.all()),
-            key=lambda i: i[1]
-        )
+        return sorted(Category.path_labels().items(), key=lambda i: i[1])
 
     def queryset(self, request, queryset):
         if not self.value():
             return queryset
         category = Category.objects.get(pk=self.value())
-        result = queryset.filter(pk=category.pk)
-        for i in category.descendants:
-            result |= queryset.filter(pk=i.pk)
-        return result
+        return queryset.filter(pk__in=category.subtree_pks)
 
 
 class ExpirationFieldListFilter(ListFilter):
@@ -0,0 +1,61 @@
+import json
+
+from django.core.management import BaseCommand, CommandError
+
+from inventory.benchmark import compare_reports, default_cases, default_comparisons, run_benchmarks, run_comparisons
+
+
+class Command(BaseCommand):
+    help = "Time the main admin pages and batch actions on the current database, with a JSON report"
+
+    def add_arguments(self, parser):
+        parser.add_argument("-o", "--output", help="JSON report file, defaults to the standard output")
+        parser.add_argument("--repeat", type=int, default=5, help="Number of timed runs of each page")
+        parser.add_argument("--warmup", type=int, default=1, help="Number of untimed runs of each page")
+        parser.add_argument("--action-size", type=int, default=100, help="Number of items selected for actions")
+        parser.add_argument("--only", nargs="+", metavar="NAME", help="Run only the cases with these names")
+        parser.add_argument("--comparisons", action="store_true",
+                            help="Also time the current implementations of some tasks against the ones they replaced, "
+                                 "outside of transactions")
+        parser.add_argument("--move-size", type=int, default=10000, help="Number of items moved by the comparisons")
+        parser.add_argument("--import-rows", type=int, default=100000,
+                            help="Number of rows of the file imported by the comparisons")
+        parser.add_argument("--comparison-repeat", type=int, default=1,
+                            help="Number of timed runs of each implementation of the comparisons")
+        parser.add_argument("--compare", metavar="REPORT",
+                            help="Previous JSON report to compare with, failing if any case got slower")
+        parser.add_argument("--threshold", type=float, default=1.2,
+                            help="Ratio of the median times above which a case is considered slower")
+
+    def handle(self, *args, **options):
+        if options["repeat"] < 1 or options["comparison_repeat"] < 1:
+            raise CommandError("--repeat and --comparison-repeat must be at least 1")
+
+        cases = default_cases(options["action_size"])
+        if options["only"]:
+            cases = [case for case in cases if case.name in options["only"]]
+
+        report = run_benchmarks(cases, options["repeat"], options["warmup"])
+        if options["comparisons"]:
+            comparisons = default_comparisons(options["move_size"], options["import_rows"])
+            if options["only"]:
+                comparisons = [comparison for comparison in comparisons if comparison.name in options["only"]]
+            report["comparisons"] = run_comparisons(comparisons, options["comparison_repeat"])
+        output = json.dumps(report, indent=2)
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as f:
+                f.write(output + "\n")
+        elif not options["compare"]:
+            self.stdout.write(output)
+
+        if options["compare"]:
+            with open(options["compare"], encoding="utf-8") as f:
+                baseline = json.load(f)
+            rows = compare_reports(baseline, report, options["threshold"])
+            for row in rows:
+                self.stdout.write(f"{row['name']:40} {row['before_ms']:10.1f} ms {row['after_ms']:10.1f} ms "
+                                  f"{row['ratio']:6.2f}x {row['before_queries']:5} -> {row['after_queries']:<5}"
+                                  f"{' REGRESSION' if row['regression'] else ''}")
+            regressions = [row["name"] for row in rows if row["regression"]]
+            if regressions:
+                raise CommandError(f"Slower than {options['compare']}: {', '.join(regressions)}")
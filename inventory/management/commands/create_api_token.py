@@ -0,0 +1,23 @@
+from django.contrib.auth import get_user_model
+from django.core.management import BaseCommand, CommandError
+
+from inventory.models import ApiToken
+
+
+class Command(BaseCommand):
+    help = "Create a token authenticating API requests as the user, sent in an 'Authorization: Bearer' header"
+
+    def add_arguments(self, parser):
+        parser.add_argument("username", help="User the requests are made as")
+        parser.add_argument("--name", default="", help="Name of the token, i.e. of the station using it")
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        try:
+            user = User.objects.get(**{User.USERNAME_FIELD: options["username"]})
+        except User.DoesNotExist:
+            raise CommandError(f"No user {options['username']!r}")
+
+        token, key = ApiToken.create_token(user, options["name"] or options["username"])
+        # The key is not stored, it can't be shown again
+        self.stdout.write(key)
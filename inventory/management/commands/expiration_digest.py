@@ -0,0 +1,16 @@
+from django.core.management import BaseCommand, CommandError
+
+from inventory.reminders import send_expiration_digest
+
+
+class Command(BaseCommand):
+    help = "Send reminders of items expired or expiring soon, only for the ones that changed since the last run"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true", help="Report the changes without sending or saving them")
+
+    def handle(self, *args, **options):
+        result = send_expiration_digest(dry_run=options["dry_run"])
+        if result.failed_sinks:
+            raise CommandError(str(result))
+        self.stdout.write(str(result))
@@ -0,0 +1,35 @@
+from django.contrib.auth.models import AnonymousUser
+from django.core.management import BaseCommand
+from django.http import QueryDict
+from django.test import RequestFactory
+
+from inventory.admin import admin_site
+from inventory.export import FORMATS, DEFAULT_CHUNK_SIZE, export_lines
+from inventory.models import Item
+
+
+class Command(BaseCommand):
+    help = "Export items with their full location and category paths"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--format", choices=FORMATS.keys(), default="csv", help="Output format")
+        parser.add_argument("-o", "--output", help="Output file, defaults to the standard output")
+        parser.add_argument("--filter", default="",
+                            help="Item changelist query string to export only matching items, "
+                                 "i.e. 'location=3&q=screws'")
+        parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE,
+                            help="Number of items fetched from the database at once")
+
+    def handle(self, *args, **options):
+        # Apply the same filters as the admin changelist would for this query string
+        request = RequestFactory().get("/", QueryDict(options["filter"]))
+        request.user = AnonymousUser()
+        queryset = admin_site._registry[Item].get_export_queryset(request)
+
+        lines = export_lines(queryset, options["format"], options["chunk_size"])
+        if options["output"]:
+            with open(options["output"], "w", newline="", encoding="utf-8") as f:
+                f.writelines(lines)
+        else:
+            for line in lines:
+                self.stdout.write(line, ending="")
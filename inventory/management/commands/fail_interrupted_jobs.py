@@ -0,0 +1,11 @@
+from django.core.management import BaseCommand
+
+from inventory.jobs import fail_interrupted_jobs
+
+
+class Command(BaseCommand):
+    help = "Mark the background jobs interrupted by a server restart as failed, to run before starting the server"
+
+    def handle(self, *args, **options):
+        failed = fail_interrupted_jobs()
+        self.stdout.write(f"Marked {failed} interrupted jobs as failed")
@@ -0,0 +1,33 @@
+from django.core.management import BaseCommand, CommandError
+
+from inventory.generator import DEFAULT_BATCH_SIZE, generate_inventory
+from inventory.models import Item, Location, Category
+
+
+class Command(BaseCommand):
+    help = "Fill an empty database with a reproducible synthetic inventory, for benchmarks"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--items", type=int, default=100000, help="Number of items")
+        parser.add_argument("--location-depth", type=int, default=3, help="Number of levels of the locations tree")
+        parser.add_argument("--location-fanout", type=int, default=10,
+                            help="Number of root locations and of sections of each location")
+        parser.add_argument("--category-depth", type=int, default=2, help="Number of levels of the categories tree")
+        parser.add_argument("--category-fanout", type=int, default=10,
+                            help="Number of root categories and of subcategories of each category")
+        parser.add_argument("--seed", type=int, default=0, help="Random seed, the same seed gives the same dataset")
+        parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE,
+                            help="Number of items inserted at once")
+
+    def handle(self, *args, **options):
+        if Item.objects.exists() or Location.objects.exists() or Category.objects.exists():
+            raise CommandError("The inventory is not empty, generate the dataset in a new database")
+
+        created = 0
+        for created in generate_inventory(options["items"], options["location_depth"], options["location_fanout"],
+                                          options["category_depth"], options["category_fanout"], options["seed"],
+                                          options["batch_size"]):
+            if options["verbosity"] > 1:
+                self.stdout.write(f"{created} items")
+        self.stdout.write(f"Created {Location.objects.count()} locations, {Category.objects.count()} categories "
+                          f"and {created} items")
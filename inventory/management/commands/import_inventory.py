@@ -0,0 +1,35 @@
+import io
+import sys
+
+from django.core.management import BaseCommand, CommandError
+
+from inventory.importer import FORMATS, DEFAULT_BATCH_SIZE, import_items
+
+
+class Command(BaseCommand):
+    help = "Import items from a CSV or NDJSON file, creating the missing locations and categories"
+
+    def add_arguments(self, parser):
+        parser.add_argument("file", help="File to import, or - for the standard input")
+        parser.add_argument("--format", choices=FORMATS.keys(),
+                            help="Input format, guessed from the file extension by default")
+        parser.add_argument("--dry-run", action="store_true", help="Validate the file without saving anything")
+        parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE,
+                            help="Number of rows inserted at once")
+
+    def handle(self, *args, **options):
+        import_format = options["format"] or options["file"].rpartition(".")[2].lower()
+        if import_format not in FORMATS:
+            raise CommandError("Unable to guess the input format, please specify --format")
+
+        if options["file"] == "-":
+            stream = io.TextIOWrapper(sys.stdin.buffer, encoding="utf-8", newline="")
+        else:
+            stream = open(options["file"], encoding="utf-8", newline="")
+
+        with stream:
+            result = import_items(stream, import_format, options["dry_run"], options["batch_size"])
+
+        for line_num, error in result.errors:
+            self.stderr.write(f"Line {line_num}: {error}")
+        self.stdout.write(str(result))
@@ -0,0 +1,63 @@
+import json
+import platform
+from importlib import import_module
+
+import django
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import BaseCommand, CommandError
+from django.test import Client
+from django.utils import timezone
+
+from inventory.benchmark import load_test
+
+
+class Command(BaseCommand):
+    help = "Measure the latency of a running server under many concurrent clients, with a JSON report"
+
+    def add_arguments(self, parser):
+        parser.add_argument("urls", nargs="+", metavar="URL", help="Absolute URLs to request, one after the other")
+        parser.add_argument("-o", "--output", help="JSON report file, defaults to the standard output")
+        parser.add_argument("--concurrency", type=int, default=200, help="Number of concurrent clients")
+        parser.add_argument("--requests", type=int, default=1000, help="Number of requests to each URL")
+        parser.add_argument("--user", help="Send the requests logged in as this user, with a temporary session")
+        parser.add_argument("--label", default="", help="Name of the server setup, copied to the report")
+
+    def handle(self, *args, **options):
+        if options["concurrency"] < 1 or options["requests"] < 1:
+            raise CommandError("--concurrency and --requests must be at least 1")
+
+        headers = {}
+        session_key = None
+        if options["user"]:
+            try:
+                user = User.objects.get(username=options["user"])
+            except User.DoesNotExist:
+                raise CommandError(f"No user named {options['user']!r}")
+            client = Client()
+            client.force_login(user)
+            session_key = client.cookies[settings.SESSION_COOKIE_NAME].value
+            headers["Cookie"] = f"{settings.SESSION_COOKIE_NAME}={session_key}"
+
+        try:
+            results = [load_test(url, options["concurrency"], options["requests"], headers)
+                       for url in options["urls"]]
+        finally:
+            if session_key:
+                import_module(settings.SESSION_ENGINE).SessionStore(session_key).delete()
+
+        report = {
+            "environment": {
+                "python": platform.python_version(),
+                "django": django.get_version(),
+                "label": options["label"],
+                "timestamp": timezone.now().isoformat(),
+            },
+            "results": results,
+        }
+        output = json.dumps(report, indent=2)
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as f:
+                f.write(output + "\n")
+        else:
+            self.stdout.write(output)
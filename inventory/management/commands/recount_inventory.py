@@ -0,0 +1,17 @@
+from django.core.management import BaseCommand
+from django.db import transaction
+
+from inventory.models import Location, Category
+from inventory.trees import rebuild_closure
+
+
+class Command(BaseCommand):
+    help = "Rebuild the item counters and the closure tables of all locations and categories"
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            for model in (Location, Category):
+                updated = model.update_items_count(recount=True)
+                self.stdout.write(f"Updated {updated} {model._meta.verbose_name_plural}")
+                rows = rebuild_closure(model)
+                self.stdout.write(f"Rebuilt {model._meta.verbose_name} closure table with {rows} rows")
@@ -0,0 +1,238 @@
+import asyncio
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional, Tuple
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.admin.views.main import SEARCH_VAR
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import transaction, IntegrityError
+from django.db.models import F
+from django.db.models.constants import LOOKUP_SEP
+from django.db.models.functions import Greatest
+from django.utils import timezone
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+from inventory.models import RequestProfile
+
+Pending = Dict[Tuple[str, str], Dict[str, float]]
+
+# Query string parameters that don't change which queries a page runs
+IGNORED_PARAMS = {"p", "o", "cursor", "e", "_changelist_filters", "_popup", "_to_field"}
+
+
+class QueryRecorder:
+    """Database execute wrapper counting the queries of a request, their time and the repeated ones."""
+
+    def __init__(self):
+        self.count = 0
+        self.duplicates = 0
+        self.time = 0.0
+        self.seen = set()
+
+    def __call__(self, execute, sql, params, many, context):
+        key = (sql, repr(params))
+        if key in self.seen:
+            self.duplicates += 1
+        else:
+            self.seen.add(key)
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.time += time.perf_counter() - start
+            self.count += 1
+
+
+# Recorder of the request being served, followed by `sync_to_async` into whichever thread runs its queries
+current_recorder: ContextVar[Optional[QueryRecorder]] = ContextVar("inventory_query_recorder", default=None)
+
+
+def record_queries(execute, sql, params, many, context):
+    """Execute wrapper installed on every connection, passing the queries to the recorder of the current request."""
+    recorder = current_recorder.get()
+    if recorder is None:
+        return execute(sql, params, many, context)
+    return recorder(execute, sql, params, many, context)
+
+
+@contextmanager
+def recording(recorder: QueryRecorder):
+    token = current_recorder.set(recorder)
+    try:
+        yield recorder
+    finally:
+        current_recorder.reset(token)
+
+
+class AsyncCapableMiddleware:
+    """Base for middleware running natively in both sync and async chains.
+
+    Sync-only middleware is run by Django in the single thread reserved to sync code when serving ASGI, blocking it
+    for the whole request, so that requests to async views would be handled one at a time.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            # Tells Django that instances are coroutine functions, like `MiddlewareMixin` does
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        return self.call(request)
+
+    def call(self, request):
+        raise NotImplementedError
+
+    async def __acall__(self, request):
+        raise NotImplementedError
+
+
+class StaticFilesMiddleware(AsyncCapableMiddleware, WhiteNoiseMiddleware):
+    """WhiteNoise, running natively under ASGI too."""
+
+    def __init__(self, get_response):
+        WhiteNoiseMiddleware.__init__(self, get_response)
+        AsyncCapableMiddleware.__init__(self, get_response)
+
+    def call(self, request):
+        return WhiteNoiseMiddleware.__call__(self, request)
+
+    async def __acall__(self, request):
+        # Static files are looked up in memory, and served from the file
+        response = self.process_request(request)
+        if response is None:
+            response = await self.get_response(request)
+        return response
+
+
+class PerformanceMiddleware(AsyncCapableMiddleware):
+    """Record query count, database and Python time of every request, without needing DEBUG.
+
+    Timings are sent in a `Server-Timing` header. Those of staff users are also aggregated in memory per view and set
+    of changelist filters, and written to `RequestProfile` at most every `INVENTORY_PERFORMANCE_FLUSH_INTERVAL`
+    seconds, where the admin performance page reads them; new sets stop being recorded once there are
+    `INVENTORY_PERFORMANCE_MAX_PROFILES`. The body of streaming responses is not measured.
+    """
+
+    def __init__(self, get_response):
+        if not settings.INVENTORY_PERFORMANCE_MONITOR:
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+        self.lock = threading.Lock()
+        self.pending: Pending = defaultdict(lambda: defaultdict(float))
+        self.last_flush = time.monotonic()
+
+    def call(self, request):
+        recorder = QueryRecorder()
+        start = time.perf_counter()
+        with recording(recorder):
+            response = self.get_response(request)
+        total = time.perf_counter() - start
+        self.add_timings(response, recorder, total)
+        key = self.profile_key(request)
+        pending = self.record(key, total, recorder) if key else None
+        if pending:
+            self.flush(pending)
+        return response
+
+    async def __acall__(self, request):
+        recorder = QueryRecorder()
+        start = time.perf_counter()
+        with recording(recorder):
+            response = await self.get_response(request)
+        total = time.perf_counter() - start
+        self.add_timings(response, recorder, total)
+        # Reading the user may query the session
+        key = await sync_to_async(self.profile_key)(request)
+        pending = self.record(key, total, recorder) if key else None
+        if pending:
+            await sync_to_async(self.flush)(pending)
+        return response
+
+    @staticmethod
+    def add_timings(response, recorder: QueryRecorder, total: float):
+        response["Server-Timing"] = ", ".join([
+            f'db;dur={recorder.time * 1000:.1f};desc="{recorder.count} queries, {recorder.duplicates} duplicate"',
+            f"app;dur={(total - recorder.time) * 1000:.1f}",
+            f"total;dur={total * 1000:.1f}",
+        ])
+
+    @classmethod
+    def profile_key(cls, request) -> Optional[Tuple[str, str]]:
+        """View name and filters to record the request under, or None if it is not profiled.
+
+        Only requests of staff users are, so that anyone else cannot fill the profiles table with made up parameters.
+        """
+        match = request.resolver_match
+        user = getattr(request, "user", None)
+        if match is None or user is None or not (user.is_authenticated and user.is_staff):
+            return None
+        return match.view_name, cls.filters(request, getattr(match.func, "model_admin", None))
+
+    @staticmethod
+    def filters(request, model_admin=None) -> str:
+        """Names of the changelist filters and search used by the request, or nothing outside of the admin."""
+        if model_admin is None:
+            return ""
+        # Field filters take parameters made of the field name and a lookup
+        names = {field.name for field in model_admin.model._meta.get_fields()}
+        names.update(getattr(list_filter, "parameter_name", None) for list_filter in model_admin.list_filter)
+        if model_admin.search_fields:
+            names.add(SEARCH_VAR)
+        return ",".join(sorted({param for param in set(request.GET) - IGNORED_PARAMS
+                                if param.split(LOOKUP_SEP, 1)[0] in names}))
+
+    def record(self, key: Tuple[str, str], total: float, recorder: QueryRecorder) -> Optional[Pending]:
+        with self.lock:
+            if key in self.pending or len(self.pending) < settings.INVENTORY_PERFORMANCE_MAX_PROFILES:
+                stats = self.pending[key]
+                stats["requests"] += 1
+                stats["queries"] += recorder.count
+                stats["duplicate_queries"] += recorder.duplicates
+                stats["total_time"] += total
+                stats["db_time"] += recorder.time
+                stats["max_time"] = max(stats["max_time"], total)
+
+            if time.monotonic() - self.last_flush < settings.INVENTORY_PERFORMANCE_FLUSH_INTERVAL:
+                return None
+            pending, self.pending = self.pending, defaultdict(lambda: defaultdict(float))
+            self.last_flush = time.monotonic()
+        return pending
+
+    @staticmethod
+    def flush(pending: Pending):
+        now = timezone.now()
+        with transaction.atomic():
+            for (view, filters), stats in pending.items():
+                profiles = RequestProfile.objects.filter(view=view[:200], filters=filters[:200])
+                updates = {
+                    "requests": F("requests") + int(stats["requests"]),
+                    "queries": F("queries") + int(stats["queries"]),
+                    "duplicate_queries": F("duplicate_queries") + int(stats["duplicate_queries"]),
+                    "total_time": F("total_time") + stats["total_time"],
+                    "db_time": F("db_time") + stats["db_time"],
+                    "max_time": Greatest("max_time", stats["max_time"]),
+                    "last_seen": now,
+                }
+                if not profiles.update(**updates):
+                    if RequestProfile.objects.count() >= settings.INVENTORY_PERFORMANCE_MAX_PROFILES:
+                        continue
+                    try:
+                        with transaction.atomic():
+                            RequestProfile.objects.create(
+                                view=view[:200], filters=filters[:200], last_seen=now,
+                                **{field: stats[field] for field in ("requests", "queries", "duplicate_queries",
+                                                                     "total_time", "db_time", "max_time")})
+                    except IntegrityError:
+                        # Created by another process in the meantime
+                        profiles.update(**updates)
@@ -0,0 +1,58 @@
+from collections import defaultdict
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def count_items(apps, schema_editor):
+    Item = apps.get_model('inventory', 'Item')
+    for model_name, field_name in (('Location', 'location'), ('Category', 'category')):
+        model = apps.get_model('inventory', model_name)
+        parents = dict(model.objects.values_list('pk', 'tn_parent_id'))
+        counts = dict(Item.objects.exclude(**{field_name: None}).order_by()
+                      .values_list(field_name).annotate(Count('pk')))
+
+        subtree_counts = defaultdict(int)
+        for pk, count in counts.items():
+            node_pk = pk
+            while node_pk is not None:
+                subtree_counts[node_pk] += count
+                node_pk = parents[node_pk]
+
+        model.objects.bulk_update(
+            [model(pk=pk, items_count=counts.get(pk, 0), subtree_items_count=count)
+             for pk, count in subtree_counts.items()],
+            fields=['items_count', 'subtree_items_count'],
+            batch_size=500,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='items_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='items'),
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='subtree_items_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='items in subtree'),
+        ),
+        migrations.AddField(
+            model_name='location',
+            name='items_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='items'),
+        ),
+        migrations.AddField(
+            model_name='location',
+            name='subtree_items_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='items in subtree'),
+        ),
+        migrations.RunPython(count_items, migrations.RunPython.noop),
+    ]
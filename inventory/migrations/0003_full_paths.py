@@ -0,0 +1,42 @@
+from django.db import migrations, models
+
+
+def compute_paths(apps, schema_editor):
+    for model_name, label_field, path_field in (('Location', 'locator', 'full_locator'),
+                                                ('Category', 'name', 'full_name')):
+        model = apps.get_model('inventory', model_name)
+        nodes = {pk: (parent_pk, label) for pk, parent_pk, label in
+                 model.objects.values_list('pk', 'tn_parent_id', label_field)}
+
+        def path(pk, seen=()):
+            parent_pk, label = nodes[pk]
+            if parent_pk is None or parent_pk in seen:
+                return label
+            return f"{path(parent_pk, seen + (pk,))}/{label}"
+
+        model.objects.bulk_update(
+            [model(pk=pk, **{path_field: path(pk)}) for pk in nodes],
+            fields=[path_field],
+            batch_size=500,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0002_items_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='full_name',
+            field=models.TextField(blank=True, default='', editable=False, verbose_name='full name'),
+        ),
+        migrations.AddField(
+            model_name='location',
+            name='full_locator',
+            field=models.TextField(blank=True, default='', editable=False, verbose_name='full locator'),
+        ),
+        migrations.RunPython(compute_paths, migrations.RunPython.noop),
+    ]
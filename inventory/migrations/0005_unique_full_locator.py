@@ -0,0 +1,72 @@
+from collections import defaultdict
+
+from django.db import migrations, models
+
+
+def rename_duplicate_locations(apps, schema_editor):
+    """Make paths unique by appending the primary key to the locator of locations sharing a path with another one.
+
+    Only the shallowest duplicates are renamed at each round, since that can make the paths below them unique, and
+    the paths are computed again until there are no duplicates left.
+    """
+    Location = apps.get_model('inventory', 'Location')
+    max_length = Location._meta.get_field('locator').max_length
+
+    nodes = {pk: [parent_pk, label] for pk, parent_pk, label in
+             Location.objects.values_list('pk', 'tn_parent_id', 'locator')}
+    stored = dict(Location.objects.values_list('pk', 'full_locator'))
+
+    def compute_paths():
+        paths = {}
+
+        def path(pk, seen=()):
+            if pk not in paths:
+                parent_pk, label = nodes[pk]
+                if parent_pk is None or parent_pk not in nodes or parent_pk in seen:
+                    paths[pk] = label
+                else:
+                    paths[pk] = f"{path(parent_pk, seen + (pk,))}/{label}"
+            return paths[pk]
+
+        for pk in nodes:
+            path(pk)
+        return paths
+
+    renamed = set()
+    while True:
+        paths = compute_paths()
+        pks_by_path = defaultdict(list)
+        for pk, path in paths.items():
+            pks_by_path[path].append(pk)
+        duplicates = [pks for pks in pks_by_path.values() if len(pks) > 1]
+        if not duplicates:
+            break
+        depth = min(paths[pks[0]].count('/') for pks in duplicates)
+        for pks in duplicates:
+            if paths[pks[0]].count('/') != depth:
+                continue
+            for pk in sorted(pks)[1:]:
+                suffix = f"-{pk}"
+                nodes[pk][1] = nodes[pk][1][:max_length - len(suffix)] + suffix
+                renamed.add(pk)
+
+    Location.objects.bulk_update([Location(pk=pk, locator=nodes[pk][1]) for pk in renamed],
+                                 fields=['locator'], batch_size=500)
+    Location.objects.bulk_update([Location(pk=pk, full_locator=path) for pk, path in paths.items()
+                                  if stored[pk] != path], fields=['full_locator'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0004_jobs'),
+    ]
+
+    operations = [
+        migrations.RunPython(rename_duplicate_locations, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='location',
+            name='full_locator',
+            field=models.TextField(blank=True, default='', editable=False, unique=True, verbose_name='full locator'),
+        ),
+    ]
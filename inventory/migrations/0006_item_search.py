@@ -0,0 +1,94 @@
+from django.db import migrations, OperationalError
+
+# Full-text index of items, with the full location and category paths, kept in sync by triggers so that bulk
+# updates and path changes are covered too. Only created on SQLite builds with FTS5, search falls back to LIKE
+# queries otherwise.
+CREATE_SQL = [
+    """
+    CREATE VIRTUAL TABLE inventory_item_fts USING fts5(name, description, location, category)
+    """,
+    """
+    INSERT INTO inventory_item_fts(rowid, name, description, location, category)
+    SELECT i.id, i.name, i.description, l.full_locator, c.full_name
+    FROM inventory_item i
+    LEFT JOIN inventory_location l ON l.id = i.location_id
+    LEFT JOIN inventory_category c ON c.id = i.category_id
+    """,
+    """
+    CREATE TRIGGER inventory_item_fts_insert AFTER INSERT ON inventory_item BEGIN
+        INSERT INTO inventory_item_fts(rowid, name, description, location, category)
+        VALUES (new.id, new.name, new.description,
+                (SELECT full_locator FROM inventory_location WHERE id = new.location_id),
+                (SELECT full_name FROM inventory_category WHERE id = new.category_id));
+    END
+    """,
+    """
+    CREATE TRIGGER inventory_item_fts_update AFTER UPDATE OF name, description, location_id, category_id
+    ON inventory_item BEGIN
+        UPDATE inventory_item_fts SET
+            name = new.name,
+            description = new.description,
+            location = (SELECT full_locator FROM inventory_location WHERE id = new.location_id),
+            category = (SELECT full_name FROM inventory_category WHERE id = new.category_id)
+        WHERE rowid = new.id;
+    END
+    """,
+    """
+    CREATE TRIGGER inventory_item_fts_delete AFTER DELETE ON inventory_item BEGIN
+        DELETE FROM inventory_item_fts WHERE rowid = old.id;
+    END
+    """,
+    """
+    CREATE TRIGGER inventory_location_fts_update AFTER UPDATE OF full_locator ON inventory_location BEGIN
+        UPDATE inventory_item_fts SET location = new.full_locator
+        WHERE rowid IN (SELECT id FROM inventory_item WHERE location_id = new.id);
+    END
+    """,
+    """
+    CREATE TRIGGER inventory_category_fts_update AFTER UPDATE OF full_name ON inventory_category BEGIN
+        UPDATE inventory_item_fts SET category = new.full_name
+        WHERE rowid IN (SELECT id FROM inventory_item WHERE category_id = new.id);
+    END
+    """,
+]
+
+DROP_SQL = [
+    "DROP TRIGGER IF EXISTS inventory_category_fts_update",
+    "DROP TRIGGER IF EXISTS inventory_location_fts_update",
+    "DROP TRIGGER IF EXISTS inventory_item_fts_delete",
+    "DROP TRIGGER IF EXISTS inventory_item_fts_update",
+    "DROP TRIGGER IF EXISTS inventory_item_fts_insert",
+    "DROP TABLE IF EXISTS inventory_item_fts",
+]
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        try:
+            cursor.execute("CREATE VIRTUAL TABLE temp.inventory_fts5_check USING fts5(content)")
+        except OperationalError:
+            # SQLite built without FTS5
+            return
+        cursor.execute("DROP TABLE temp.inventory_fts5_check")
+    for sql in CREATE_SQL:
+        schema_editor.execute(sql)
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for sql in DROP_SQL:
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0005_unique_full_locator'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
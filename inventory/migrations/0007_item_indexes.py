@@ -0,0 +1,25 @@
+# Generated by Django 3.2.25 on 2026-10-18 16:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0006_item_search'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(fields=['location', 'name'], name='inventory_item_loc_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(fields=['expiration'], name='inventory_item_expiration_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(fields=['amount'], name='inventory_item_amount_idx'),
+        ),
+    ]
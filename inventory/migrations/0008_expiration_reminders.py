@@ -0,0 +1,27 @@
+# Generated by Django 3.2.25 on 2026-10-18 16:52
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0007_item_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExpirationReminder',
+            fields=[
+                ('item', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='reminder', serialize=False, to='inventory.item', verbose_name='item')),
+                ('status', models.CharField(choices=[('due', 'expiring soon'), ('expired', 'expired')], max_length=10, verbose_name='status')),
+                ('expiration', models.DateField(verbose_name='expiration')),
+                ('notified', models.DateTimeField(auto_now=True, verbose_name='notified')),
+            ],
+            options={
+                'verbose_name': 'expiration reminder',
+                'verbose_name_plural': 'expiration reminders',
+            },
+        ),
+    ]
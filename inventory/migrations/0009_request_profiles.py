@@ -0,0 +1,36 @@
+# Generated by Django 3.2.25 on 2026-10-18 17:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0008_expiration_reminders'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RequestProfile',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('view', models.CharField(max_length=200, verbose_name='view')),
+                ('filters', models.CharField(blank=True, max_length=200, verbose_name='filters')),
+                ('requests', models.PositiveIntegerField(default=0, verbose_name='requests')),
+                ('queries', models.PositiveIntegerField(default=0, verbose_name='queries')),
+                ('duplicate_queries', models.PositiveIntegerField(default=0, verbose_name='duplicate queries')),
+                ('total_time', models.FloatField(default=0, verbose_name='total time')),
+                ('db_time', models.FloatField(default=0, verbose_name='database time')),
+                ('max_time', models.FloatField(default=0, verbose_name='maximum time')),
+                ('last_seen', models.DateTimeField(verbose_name='last seen')),
+            ],
+            options={
+                'verbose_name': 'request profile',
+                'verbose_name_plural': 'performance',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='requestprofile',
+            constraint=models.UniqueConstraint(fields=('view', 'filters'), name='inventory_requestprofile_view_filters_uniq'),
+        ),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 3.2.25 on 2026-10-18 18:25
+
+from django.db import migrations, models
+from django.utils import timezone
+
+# Tables whose changes are counted, kept up to date by triggers so that bulk updates, tree updates and raw SQL are
+# covered too. Only created on SQLite, the API doesn't send validators otherwise.
+VERSIONED_TABLES = ('inventory_item', 'inventory_location', 'inventory_category')
+
+TRIGGER_SQL = """
+    CREATE TRIGGER {table}_version_{operation} AFTER {operation} ON {table} BEGIN
+        UPDATE inventory_tableversion SET version = version + 1, modified = strftime('%Y-%m-%d %H:%M:%f', 'now')
+        WHERE table_name = '{table}';
+    END
+"""
+
+OPERATIONS = ('insert', 'update', 'delete')
+
+
+def create_version_triggers(apps, schema_editor):
+    TableVersion = apps.get_model('inventory', 'TableVersion')
+    TableVersion.objects.using(schema_editor.connection.alias).bulk_create(
+        TableVersion(table_name=table, modified=timezone.now()) for table in VERSIONED_TABLES)
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for table in VERSIONED_TABLES:
+        for operation in OPERATIONS:
+            schema_editor.execute(TRIGGER_SQL.format(table=table, operation=operation))
+
+
+def drop_version_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for table in VERSIONED_TABLES:
+        for operation in OPERATIONS:
+            schema_editor.execute(f"DROP TRIGGER IF EXISTS {table}_version_{operation}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0009_request_profiles'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TableVersion',
+            fields=[
+                ('table_name', models.CharField(max_length=100, primary_key=True, serialize=False, verbose_name='table')),
+                ('version', models.PositiveBigIntegerField(default=0, verbose_name='version')),
+                ('modified', models.DateTimeField(verbose_name='modified')),
+            ],
+            options={
+                'verbose_name': 'table version',
+                'verbose_name_plural': 'table versions',
+            },
+        ),
+        migrations.RunPython(create_version_triggers, drop_version_triggers),
+    ]
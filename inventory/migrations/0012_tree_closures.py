@@ -0,0 +1,77 @@
+# Generated by Django 3.2.25 on 2026-10-18 19:40
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def closure_rows(parents):
+    for pk in parents:
+        ancestor_pk, depth = pk, 0
+        while ancestor_pk is not None and depth <= len(parents):
+            yield ancestor_pk, pk, depth
+            ancestor_pk, depth = parents.get(ancestor_pk), depth + 1
+
+
+def populate_closures(apps, schema_editor):
+    # From the parent of each node, which treenode keeps and the denormalized fields are derived from
+    db_alias = schema_editor.connection.alias
+    for model_name in ('Location', 'Category'):
+        model = apps.get_model('inventory', model_name)
+        closure = apps.get_model('inventory', f'{model_name}Closure')
+        parents = dict(model.objects.using(db_alias).values_list('pk', 'tn_parent_id'))
+        closure.objects.using(db_alias).bulk_create(
+            (closure(ancestor_id=ancestor_pk, descendant_id=descendant_pk, depth=depth)
+             for ancestor_pk, descendant_pk, depth in closure_rows(parents)), batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0011_idempotency_keys'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LocationClosure',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('depth', models.PositiveIntegerField(verbose_name='depth')),
+                ('ancestor', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='closure_descendants', to='inventory.location', verbose_name='ancestor')),
+                ('descendant', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='closure_ancestors', to='inventory.location', verbose_name='descendant')),
+            ],
+            options={
+                'verbose_name': 'location closure',
+                'verbose_name_plural': 'location closures',
+            },
+        ),
+        migrations.CreateModel(
+            name='CategoryClosure',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('depth', models.PositiveIntegerField(verbose_name='depth')),
+                ('ancestor', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='closure_descendants', to='inventory.category', verbose_name='ancestor')),
+                ('descendant', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='closure_ancestors', to='inventory.category', verbose_name='descendant')),
+            ],
+            options={
+                'verbose_name': 'category closure',
+                'verbose_name_plural': 'category closures',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='locationclosure',
+            index=models.Index(fields=['descendant', 'depth'], name='inventory_locationclosure_desc'),
+        ),
+        migrations.AddConstraint(
+            model_name='locationclosure',
+            constraint=models.UniqueConstraint(fields=('ancestor', 'descendant'), name='inventory_locationclosure_uniq'),
+        ),
+        migrations.AddIndex(
+            model_name='categoryclosure',
+            index=models.Index(fields=['descendant', 'depth'], name='inventory_categoryclosure_desc'),
+        ),
+        migrations.AddConstraint(
+            model_name='categoryclosure',
+            constraint=models.UniqueConstraint(fields=('ancestor', 'descendant'), name='inventory_categoryclosure_uniq'),
+        ),
+        migrations.RunPython(populate_closures, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 3.2.25 on 2026-10-18 20:15
+
+from django.db import migrations
+
+# Versions are now bumped once per statement by `inventory.versions.count_changes` instead of once per row
+VERSIONED_TABLES = ('inventory_item', 'inventory_location', 'inventory_category')
+
+TRIGGER_SQL = """
+    CREATE TRIGGER {table}_version_{operation} AFTER {operation} ON {table} BEGIN
+        UPDATE inventory_tableversion SET version = version + 1, modified = strftime('%Y-%m-%d %H:%M:%f', 'now')
+        WHERE table_name = '{table}';
+    END
+"""
+
+OPERATIONS = ('insert', 'update', 'delete')
+
+
+def drop_version_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for table in VERSIONED_TABLES:
+        for operation in OPERATIONS:
+            schema_editor.execute(f"DROP TRIGGER IF EXISTS {table}_version_{operation}")
+
+
+def create_version_triggers(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for table in VERSIONED_TABLES:
+        for operation in OPERATIONS:
+            schema_editor.execute(TRIGGER_SQL.format(table=table, operation=operation))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0012_tree_closures'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_version_triggers, create_version_triggers),
+    ]
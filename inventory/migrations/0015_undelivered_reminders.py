@@ -0,0 +1,30 @@
+# Generated by Django 3.2.25 on 2026-10-18 21:05
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0014_api_tokens'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UndeliveredReminder',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sink', models.CharField(max_length=200, verbose_name='sink')),
+                ('reminder', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='undelivered', to='inventory.expirationreminder', verbose_name='reminder')),
+            ],
+            options={
+                'verbose_name': 'undelivered reminder',
+                'verbose_name_plural': 'undelivered reminders',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='undeliveredreminder',
+            constraint=models.UniqueConstraint(fields=('sink', 'reminder'), name='inventory_undeliveredreminder_sink_uniq'),
+        ),
+    ]
@@ -1,17 +1,315 @@
+import hashlib
+import secrets
+from collections import defaultdict
+from contextvars import ContextVar
 from functools import cached_property
+from typing import Dict, Optional, Iterable, Tuple
 
 import treenode.models
 from django import urls
-from django.db import models
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import models, transaction, router, IntegrityError
+from django.db.models import Count, F, Max
 from django.utils.html import format_html
 from django.utils.translation import gettext_lazy as _
+from treenode.memory import update_refs, set_ref, get_refs
+from treenode.utils import split_pks
 
+from inventory.tree_cache import tree_snapshot, forget_versions
+from inventory.trees import tree_backend, add_missing_closure, closure_parent, insert_closure, move_closure
 
-class Location(treenode.models.TreeNodeModel):
+# Whether the node being saved changes the tree structure: `save` writes the closure table itself, and the rest of the
+# tree is left alone when the node stays at its place. None outside of `save`
+saving_tree_change: ContextVar[Optional[bool]] = ContextVar("inventory_saving_tree_change", default=None)
+
+
+class InventoryTreeNodeQuerySet(models.QuerySet):
+    def bulk_create(self, objs, *args, **kwargs):
+        """Same as `QuerySet.bulk_create`, filling in the stored paths of the new nodes since they must be unique.
+
+        Parents must already be saved. Call `update_tree` afterwards (or use `bulk_create_nodes`) to refresh the rest
+        of the tree metadata.
+        """
+        objs = list(objs)
+        model = self.model
+        missing = [obj for obj in objs if not getattr(obj, model.path_cache_field)]
+        parent_paths = dict(self.filter(pk__in={obj.tn_parent_id for obj in missing} - {None})
+                            .values_list("pk", model.path_cache_field))
+        for obj in missing:
+            path = getattr(obj, model.path_label_field)
+            if obj.tn_parent_id in parent_paths:
+                path = f"{parent_paths[obj.tn_parent_id]}{model.path_separator}{path}"
+            setattr(obj, model.path_cache_field, path)
+        return super().bulk_create(objs, *args, **kwargs)
+
+
+class InventoryTreeNodeModel(treenode.models.TreeNodeModel):
+    # Field joined along the ancestors chain to build the full path label of a node, and field storing the result
+    path_label_field = None
+    path_cache_field = None
+    path_separator = "/"
+
+    items_count = models.PositiveIntegerField(_("items"), default=0, editable=False)
+    subtree_items_count = models.PositiveIntegerField(_("items in subtree"), default=0, editable=False)
+
+    objects = InventoryTreeNodeQuerySet.as_manager()
+
+    @property
+    def subtree_pks(self) -> Iterable[int]:
+        """Primary keys of this node and all of its descendants, as read by the tree backend."""
+        return tree_backend().subtree(type(self), self)
+
+    @property
+    def objects_count(self) -> int:
+        return self.subtree_items_count
+
+    @property
+    def full_path(self) -> str:
+        """Full path label of this node, as stored by `update_paths`."""
+        # Not set yet on unsaved nodes
+        return getattr(self, self.path_cache_field) or self.build_path()
+
+    def build_path(self) -> str:
+        """Full path label of this node computed from its current parent and label, rather than the stored one."""
+        parent = self.tn_parent
+        path = getattr(self, self.path_label_field)
+        if parent is not None:
+            path = f"{parent.full_path}{self.path_separator}{path}"
+        return path
+
+    @classmethod
+    def normalize_path(cls, path: str) -> str:
+        """Canonical form of a typed or scanned path, without blanks around labels and leading/trailing separators."""
+        path = path.strip().strip(cls.path_separator)
+        return cls.path_separator.join(part.strip() for part in path.split(cls.path_separator))
+
+    @classmethod
+    def get_by_path(cls, path: str) -> "InventoryTreeNodeModel":
+        """Node with the given full path, found with a single query on the stored paths."""
+        return cls.objects.get(**{cls.path_cache_field: cls.normalize_path(path)})
+
+    def tree_state(self) -> tuple:
+        """Fields deciding the place of the node in the tree: its parent, and what its siblings are sorted on."""
+        return self.tn_parent_id, self.tn_priority, getattr(self, self.path_label_field)
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        if not instance.get_deferred_fields() & {"tn_parent_id", "tn_priority", cls.path_label_field}:
+            instance._saved_tree_state = instance.tree_state()
+        return instance
+
+    def save(self, *args, **kwargs):
+        if not getattr(self, self.path_cache_field):
+            # Fixed up by `update_paths` anyway, but stored paths may need to be unique
+            setattr(self, self.path_cache_field, self.build_path())
+
+        cls = type(self)
+        adding = self._state.adding
+        saved_state = None if adding else getattr(self, "_saved_tree_state", None)
+        state = self.tree_state()
+        with transaction.atomic(using=router.db_for_write(cls)):
+            if not adding:
+                saved_parent_pk = saved_state[0] if saved_state else closure_parent(cls, self.pk)
+                if saved_parent_pk != self.tn_parent_id:
+                    # Raises before saving when moving the node below itself
+                    move_closure(cls, self.pk, self.tn_parent_id)
+            token = saving_tree_change.set(saved_state != state)
+            try:
+                super().save(*args, **kwargs)
+            finally:
+                saving_tree_change.reset(token)
+            if adding:
+                insert_closure(cls, {self.pk: self.tn_parent_id})
+        self._saved_tree_state = state
+
+    def delete(self, using=None, keep_parents=False, cascade=True):
+        cls = type(self)
+        with transaction.atomic(using=router.db_for_write(cls)):
+            if not cascade:
+                # treenode moves the children up to the root with an UPDATE. Otherwise their closure rows are deleted
+                # along with them
+                for child_pk in cls.objects.filter(tn_parent_id=self.pk).values_list("pk", flat=True):
+                    move_closure(cls, child_pk, None)
+            return super().delete(using, keep_parents, cascade)
+
+    @classmethod
+    def path_labels(cls, pks: Optional[Iterable[int]] = None, with_ancestors: bool = False) -> Dict[int, str]:
+        """Full path labels of the given nodes (or of all of them), read in bulk from the stored paths.
+
+        With `with_ancestors`, labels of all the ancestors of the nodes are returned as well.
+        """
+        snapshot = tree_snapshot(cls)
+        if snapshot is not None:
+            return snapshot.path_labels(pks, with_ancestors)
+        return tree_backend().path_labels(cls, pks, with_ancestors)
+
+    def get_ancestors(self, cache=True):
+        # treenode's own cache is per process, and not refreshed by changes made in the other ones
+        snapshot = tree_snapshot(type(self)) if cache else None
+        if snapshot is None:
+            return super().get_ancestors(cache=cache)
+        nodes = (snapshot.node(int(pk), self._state.db) for pk in split_pks(self.tn_ancestors_pks))
+        return [node for node in nodes if node is not None]
+
+    @classmethod
+    def update_paths(cls) -> int:
+        """Recompute the stored full paths of all nodes in memory, writing only the ones that changed.
+
+        Returns the number of updated nodes.
+        """
+        nodes = {pk: (parent_pk, label, path) for pk, parent_pk, label, path in
+                 cls.objects.values_list("pk", "tn_parent_id", cls.path_label_field, cls.path_cache_field)}
+
+        paths = {}
+
+        def compute_path(pk):
+            # Walk up to the closest node whose path is already known, then resolve the chain downwards
+            chain = []
+            while pk is not None and pk not in paths and pk not in chain:
+                chain.append(pk)
+                pk = nodes[pk][0] if pk in nodes else None
+            prefix = paths.get(pk)
+            for node_pk in reversed(chain):
+                label = nodes[node_pk][1]
+                paths[node_pk] = prefix = label if prefix is None else f"{prefix}{cls.path_separator}{label}"
+
+        for pk in nodes:
+            compute_path(pk)
+
+        dirty = {pk: path for pk, path in paths.items() if nodes[pk][2] != path}
+        cls.objects.bulk_update([cls(pk=pk, **{cls.path_cache_field: path}) for pk, path in dirty.items()],
+                                fields=[cls.path_cache_field], batch_size=500)
+        update_refs(cls, {str(pk): {cls.path_cache_field: path} for pk, path in dirty.items()})
+        return len(dirty)
+
+    @classmethod
+    def bulk_create_nodes(cls, nodes: Iterable["InventoryTreeNodeModel"], batch_size: int = 500) -> list:
+        """Insert many new nodes in one transaction, refreshing the tree metadata only once at the end.
+
+        Parents must already be saved. Like `QuerySet.bulk_create`, no signals are sent; the returned nodes have their
+        primary key and tree fields set.
+        """
+        nodes = list(nodes)
+        if not nodes:
+            return nodes
+
+        with transaction.atomic(using=router.db_for_write(cls)):
+            last_pk = cls.objects.aggregate(last_pk=Max("pk"))["last_pk"] or 0
+            cls.objects.bulk_create(nodes, batch_size=batch_size)
+
+            if nodes[0].pk is None:
+                # The database could not return the new primary keys, they are however assigned in insertion order
+                rows = list(cls.objects.filter(pk__gt=last_pk).order_by("pk")
+                            .values_list("pk", "tn_parent_id", cls.path_label_field))
+                if [row[1:] for row in rows] != [(n.tn_parent_id, getattr(n, cls.path_label_field)) for n in nodes]:
+                    raise IntegrityError(f"Unable to retrieve primary keys of the new {cls._meta.verbose_name_plural}")
+                for node, (pk, _, _) in zip(nodes, rows):
+                    node.pk = pk
+
+            # Tracked instances get their tree fields updated by treenode. Instances compare equal by primary key, so
+            # a stale one left by a rolled back transaction would keep the new node from being tracked
+            refs = get_refs(cls)
+            for node in nodes:
+                refs.discard(node)
+                set_ref(cls, node)
+                node._saved_tree_state = node.tree_state()
+            insert_closure(cls, {node.pk: node.tn_parent_id for node in nodes})
+            cls.update_tree()
+
+        return nodes
+
+    @classmethod
+    def update_tree(cls):
+        tree_change = saving_tree_change.get()
+        if tree_change is False:
+            # Saved at the same place, e.g. with a new description: paths, tree fields and counters are the same
+            forget_versions()
+            return
+        # Paths are used by treenode to sort siblings, so they need to be up-to-date first
+        cls.update_paths()
+        super().update_tree()
+        if tree_change is None:
+            add_missing_closure(cls)
+        cls.update_items_count()
+        forget_versions()
+
+    @classmethod
+    def apply_items_delta(cls, deltas: Dict[Optional[int], int]):
+        """Add the given number of items to the counters of each node and of its ancestors."""
+        deltas = {pk: delta for pk, delta in deltas.items() if pk is not None and delta}
+        if not deltas:
+            return
+
+        # Nodes that don't exist are left out by the UPDATEs
+        own_deltas = deltas
+        subtree_deltas = defaultdict(int)
+        ancestors = tree_backend().ancestors(cls, deltas)
+        for pk, delta in deltas.items():
+            for node_pk in [pk] + ancestors.get(pk, []):
+                subtree_deltas[node_pk] += delta
+
+        # One UPDATE per distinct delta value, which is usually just one or two
+        for field, node_deltas in (("items_count", own_deltas), ("subtree_items_count", subtree_deltas)):
+            pks_by_delta = defaultdict(list)
+            for pk, delta in node_deltas.items():
+                if delta:
+                    pks_by_delta[delta].append(pk)
+            for delta, pks in pks_by_delta.items():
+                cls.objects.filter(pk__in=pks).update(**{field: F(field) + delta})
+        forget_versions()
+
+    @classmethod
+    def update_items_count(cls, recount: bool = False) -> int:
+        """Recompute the subtree counters from the per-node ones, after the tree structure has changed.
+
+        With `recount`, the per-node counters are first counted again from the items.
+        Returns the number of updated nodes.
+        """
+        nodes = {pk: [parent_pk, items_count, subtree_items_count] for pk, parent_pk, items_count, subtree_items_count in
+                 cls.objects.values_list("pk", "tn_parent_id", "items_count", "subtree_items_count")}
+
+        own_counts = {pk: node[1] for pk, node in nodes.items()}
+        if recount:
+            # noinspection PyUnresolvedReferences
+            field_name = cls.items.field.name
+            # noinspection PyUnresolvedReferences
+            counts = dict(cls.items.field.model.objects
+                          .exclude(**{field_name: None})
+                          .order_by()
+                          .values_list(field_name)
+                          .annotate(Count("pk")))
+            own_counts = {pk: counts.get(pk, 0) for pk in nodes}
+
+        subtree_counts = defaultdict(int)
+        for pk, count in own_counts.items():
+            node_pk = pk
+            while node_pk is not None and count:
+                subtree_counts[node_pk] += count
+                node_pk = nodes[node_pk][0]
+
+        dirty = {pk: {"items_count": own_counts[pk], "subtree_items_count": subtree_counts[pk]}
+                 for pk, (_, items_count, subtree_items_count) in nodes.items()
+                 if (items_count, subtree_items_count) != (own_counts[pk], subtree_counts[pk])}
+        cls.objects.bulk_update([cls(pk=pk, **counts) for pk, counts in dirty.items()],
+                                fields=["items_count", "subtree_items_count"], batch_size=500)
+        update_refs(cls, {str(pk): counts for pk, counts in dirty.items()})
+        return len(dirty)
+
+    class Meta:
+        abstract = True
+
+
+class Location(InventoryTreeNodeModel):
     treenode_display_field = 'locator_link_filter'
+    path_label_field = 'locator'
+    path_cache_field = 'full_locator'
 
     name = models.CharField(_("name"), max_length=200)
     locator = models.CharField(_("locator"), max_length=50)
+    # Unique, so that scanned or typed locator paths resolve to exactly one location
+    full_locator = models.TextField(_("full locator"), blank=True, default="", editable=False, unique=True)
     description = models.TextField(_("description"), blank=True)
 
     @property
@@ -21,27 +319,31 @@ class Location(treenode.models.TreeNodeModel):
             "name": self.name
         }, self.locator)
 
-    @property
-    def objects_count(self) -> int:
-        count = self.items.count()
-        for i in self.descendants:
-            count += i.items.count()
-        return count
+    def clean(self):
+        super().clean()
+        if self.path_separator in self.locator:
+            raise ValidationError({"locator": _("Locators can't contain \"%(separator)s\".") % {
+                "separator": self.path_separator
+            }})
+        path = self.build_path()
+        if Location.objects.filter(full_locator=path).exclude(pk=self.pk).exists():
+            raise ValidationError({"locator": _("Another location is already at \"%(path)s\".") % {"path": path}})
 
     def __str__(self):
-        if self.parent is not None:
-            return f"{str(self.parent)}/{self.locator}"
-        return self.locator
+        return self.full_path
 
     class Meta:
         verbose_name = _("location")
         verbose_name_plural = _("locations")
 
 
-class Category(treenode.models.TreeNodeModel):
+class Category(InventoryTreeNodeModel):
     treenode_display_field = 'name_link_filter'
+    path_label_field = 'name'
+    path_cache_field = 'full_name'
 
     name = models.CharField(_("name"), max_length=200)
+    full_name = models.TextField(_("full name"), blank=True, default="", editable=False)
 
     @property
     def name_link_filter(self):
@@ -52,14 +354,7 @@ class Category(treenode.models.TreeNodeModel):
 
     @property
     def bcrumb_name(self):
-        return "/".join(map(lambda c: c.name if c else "<404>", self.breadcrumbs))
-
-    @property
-    def objects_count(self) -> int:
-        count = self.items.count()
-        for i in self.descendants:
-            count += i.items.count()
-        return count
+        return self.full_path
 
     def __str__(self):
         return self.bcrumb_name
@@ -69,6 +364,106 @@ class Category(treenode.models.TreeNodeModel):
         verbose_name_plural = _("categories")
 
 
+class TreeClosure(models.Model):
+    """Row of a closure table: `ancestor` is `depth` levels above `descendant`. Nodes are their own ancestor at 0."""
+
+    depth = models.PositiveIntegerField(_("depth"))
+
+    class Meta:
+        abstract = True
+
+
+class LocationClosure(TreeClosure):
+    # Subtrees are looked up on the unique constraint, ancestors on the index
+    ancestor = models.ForeignKey(Location, on_delete=models.CASCADE, db_index=False, related_name="closure_descendants",
+                                 verbose_name=_("ancestor"))
+    descendant = models.ForeignKey(Location, on_delete=models.CASCADE, db_index=False,
+                                   related_name="closure_ancestors", verbose_name=_("descendant"))
+
+    class Meta:
+        verbose_name = _("location closure")
+        verbose_name_plural = _("location closures")
+        constraints = [
+            models.UniqueConstraint(fields=["ancestor", "descendant"], name="inventory_locationclosure_uniq"),
+        ]
+        indexes = [
+            models.Index(fields=["descendant", "depth"], name="inventory_locationclosure_desc"),
+        ]
+
+
+class CategoryClosure(TreeClosure):
+    ancestor = models.ForeignKey(Category, on_delete=models.CASCADE, db_index=False, related_name="closure_descendants",
+                                 verbose_name=_("ancestor"))
+    descendant = models.ForeignKey(Category, on_delete=models.CASCADE, db_index=False,
+                                   related_name="closure_ancestors", verbose_name=_("descendant"))
+
+    class Meta:
+        verbose_name = _("category closure")
+        verbose_name_plural = _("category closures")
+        constraints = [
+            models.UniqueConstraint(fields=["ancestor", "descendant"], name="inventory_categoryclosure_uniq"),
+        ]
+        indexes = [
+            models.Index(fields=["descendant", "depth"], name="inventory_categoryclosure_desc"),
+        ]
+
+
+# Set while `ItemQuerySet.delete` runs, which updates the counters itself
+deleting_in_bulk: ContextVar[bool] = ContextVar("inventory_deleting_items_in_bulk", default=False)
+
+
+class ItemQuerySet(models.QuerySet):
+    """Keeps the location and category item counters in sync on bulk operations."""
+
+    counted_fields = ("location", "category")
+
+    def _tree_pks_counts(self, field_name: str) -> Dict[Optional[int], int]:
+        return dict(self.order_by().values_list(field_name).annotate(Count("pk")))
+
+    def update(self, **kwargs):
+        moved_fields = [f for f in self.counted_fields if f in kwargs or f"{f}_id" in kwargs]
+        if not moved_fields:
+            return super().update(**kwargs)
+
+        with transaction.atomic(using=self.db):
+            old_counts = {f: self._tree_pks_counts(f) for f in moved_fields}
+            rows = super().update(**kwargs)
+            for f in moved_fields:
+                new_value = kwargs.get(f, kwargs.get(f"{f}_id"))
+                new_pk = getattr(new_value, "pk", new_value)
+                deltas = defaultdict(int, {pk: -count for pk, count in old_counts[f].items()})
+                deltas[new_pk] += rows
+                self.model._meta.get_field(f).related_model.apply_items_delta(deltas)
+        return rows
+
+    def bulk_create(self, objs, *args, **kwargs):
+        with transaction.atomic(using=self.db):
+            objs = super().bulk_create(objs, *args, **kwargs)
+            for f in self.counted_fields:
+                deltas = defaultdict(int)
+                for obj in objs:
+                    deltas[getattr(obj, f"{f}_id")] += 1
+                self.model._meta.get_field(f).related_model.apply_items_delta(deltas)
+        return objs
+
+    def delete(self):
+        with transaction.atomic(using=self.db):
+            old_counts = {f: self._tree_pks_counts(f) for f in self.counted_fields}
+            # The counters of the items deleted one by one by the collector are updated below, all at once
+            token = deleting_in_bulk.set(True)
+            try:
+                result = super().delete()
+            finally:
+                deleting_in_bulk.reset(token)
+            for f in self.counted_fields:
+                self.model._meta.get_field(f).related_model.apply_items_delta(
+                    {pk: -count for pk, count in old_counts[f].items()})
+        return result
+
+    delete.alters_data = True
+    delete.queryset_only = True
+
+
 class Item(models.Model):
     class Unit(models.TextChoices):
         PIECES = "pieces", "pieces"
@@ -86,6 +481,8 @@ class Item(models.Model):
     category = models.ForeignKey(Category, null=True, blank=True, on_delete=models.SET_NULL, verbose_name=_("category"), related_name='items')
     expiration = models.DateField(_("expiration"), null=True, blank=True, default=None)
 
+    objects = ItemQuerySet.as_manager()
+
     def __str__(self):
         result = self.name
         if self.unit == "pieces" and self.amount != 1:
@@ -99,3 +496,179 @@ class Item(models.Model):
     class Meta:
         verbose_name = _("item")
         verbose_name_plural = _("items")
+        indexes = [
+            # Default changelist ordering, also used to seek keyset pages and to filter by location
+            models.Index(fields=["location", "name"], name="inventory_item_loc_name_idx"),
+            # Expiration ranges and "does not expire", which a partial index on non-NULL dates could not serve
+            models.Index(fields=["expiration"], name="inventory_item_expiration_idx"),
+            models.Index(fields=["amount"], name="inventory_item_amount_idx"),
+        ]
+
+
+class Job(models.Model):
+    class Status(models.TextChoices):
+        PENDING = "pending", _("pending")
+        RUNNING = "running", _("running")
+        DONE = "done", _("done")
+        FAILED = "failed", _("failed")
+
+    action = models.CharField(_("action"), max_length=100)
+    description = models.CharField(_("description"), max_length=200)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, on_delete=models.SET_NULL, verbose_name=_("user"))
+    arguments = models.JSONField(_("arguments"), default=dict)
+    status = models.CharField(_("status"), max_length=10, choices=Status.choices, default=Status.PENDING)
+    total = models.PositiveIntegerField(_("total"), default=0)
+    done = models.PositiveIntegerField(_("done"), default=0)
+    error = models.TextField(_("error"), blank=True)
+    created = models.DateTimeField(_("created"), auto_now_add=True)
+    finished = models.DateTimeField(_("finished"), null=True, blank=True)
+
+    @property
+    def is_finished(self) -> bool:
+        return self.status in (self.Status.DONE, self.Status.FAILED)
+
+    @property
+    def progress(self) -> int:
+        if not self.total:
+            return 100 if self.is_finished else 0
+        return min(100, self.done * 100 // self.total)
+
+    def __str__(self):
+        return self.description
+
+    class Meta:
+        verbose_name = _("job")
+        verbose_name_plural = _("jobs")
+        ordering = ('-created',)
+
+
+class ExpirationReminder(models.Model):
+    """Expiration status of an item as of the last reminders digest, so that only changes are notified."""
+
+    class Status(models.TextChoices):
+        DUE = "due", _("expiring soon")
+        EXPIRED = "expired", _("expired")
+
+    item = models.OneToOneField(Item, on_delete=models.CASCADE, primary_key=True, related_name="reminder",
+                                verbose_name=_("item"))
+    status = models.CharField(_("status"), max_length=10, choices=Status.choices)
+    expiration = models.DateField(_("expiration"))
+    notified = models.DateTimeField(_("notified"), auto_now=True)
+
+    def __str__(self):
+        return f"{self.item} ({self.get_status_display()})"
+
+    class Meta:
+        verbose_name = _("expiration reminder")
+        verbose_name_plural = _("expiration reminders")
+
+
+class UndeliveredReminder(models.Model):
+    """Reminder that a sink failed to deliver, sent again by it on the next digest unless the item changed since."""
+
+    reminder = models.ForeignKey(ExpirationReminder, on_delete=models.CASCADE, related_name="undelivered",
+                                 verbose_name=_("reminder"))
+    # Name of the sink in INVENTORY_REMINDER_SINKS
+    sink = models.CharField(_("sink"), max_length=200)
+
+    def __str__(self):
+        return f"{self.reminder} ({self.sink})"
+
+    class Meta:
+        verbose_name = _("undelivered reminder")
+        verbose_name_plural = _("undelivered reminders")
+        constraints = [
+            models.UniqueConstraint(fields=["sink", "reminder"], name="inventory_undeliveredreminder_sink_uniq"),
+        ]
+
+
+class RequestProfile(models.Model):
+    """Aggregated timings of the requests to one view with one set of filters, written by `PerformanceMiddleware`."""
+
+    view = models.CharField(_("view"), max_length=200)
+    filters = models.CharField(_("filters"), max_length=200, blank=True)
+    requests = models.PositiveIntegerField(_("requests"), default=0)
+    queries = models.PositiveIntegerField(_("queries"), default=0)
+    duplicate_queries = models.PositiveIntegerField(_("duplicate queries"), default=0)
+    total_time = models.FloatField(_("total time"), default=0)
+    db_time = models.FloatField(_("database time"), default=0)
+    max_time = models.FloatField(_("maximum time"), default=0)
+    last_seen = models.DateTimeField(_("last seen"))
+
+    def __str__(self):
+        return f"{self.view} ({self.filters})" if self.filters else self.view
+
+    class Meta:
+        verbose_name = _("request profile")
+        verbose_name_plural = _("performance")
+        constraints = [
+            models.UniqueConstraint(fields=["view", "filters"], name="inventory_requestprofile_view_filters_uniq"),
+        ]
+
+
+class TableVersion(models.Model):
+    """Counter bumped by database triggers on every change to a table, to validate cached API responses."""
+
+    table_name = models.CharField(_("table"), max_length=100, primary_key=True)
+    version = models.PositiveBigIntegerField(_("version"), default=0)
+    modified = models.DateTimeField(_("modified"))
+
+    def __str__(self):
+        return f"{self.table_name} v{self.version}"
+
+    class Meta:
+        verbose_name = _("table version")
+        verbose_name_plural = _("table versions")
+
+
+class IdempotencyKey(models.Model):
+    """Response of a batch API request, returned again when the client retries it with the same key."""
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, verbose_name=_("user"))
+    key = models.CharField(_("key"), max_length=100)
+    # SHA-256 of the request body, so that reusing a key for a different request is detected
+    request_hash = models.CharField(_("request hash"), max_length=64)
+    response = models.JSONField(_("response"), default=dict)
+    created = models.DateTimeField(_("created"), auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return self.key
+
+    class Meta:
+        verbose_name = _("idempotency key")
+        verbose_name_plural = _("idempotency keys")
+        constraints = [
+            models.UniqueConstraint(fields=["user", "key"], name="inventory_idempotencykey_user_key_uniq"),
+        ]
+
+
+class ApiToken(models.Model):
+    """Token authenticating the API requests of a user without a session, i.e. of a scanning station."""
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, verbose_name=_("user"))
+    name = models.CharField(_("name"), max_length=100)
+    # SHA-256 of the token, which is only shown once when created
+    key_hash = models.CharField(_("key hash"), max_length=64, unique=True, editable=False)
+    created = models.DateTimeField(_("created"), auto_now_add=True)
+
+    def __str__(self):
+        return self.name
+
+    @staticmethod
+    def hash_key(key: str) -> str:
+        return hashlib.sha256(key.encode()).hexdigest()
+
+    @classmethod
+    def create_token(cls, user, name: str) -> Tuple["ApiToken", str]:
+        """New token of the user, with its key."""
+        key = secrets.token_urlsafe(32)
+        return cls.objects.create(user=user, name=name, key_hash=cls.hash_key(key)), key
+
+    @classmethod
+    def authenticate(cls, key: str) -> Optional["ApiToken"]:
+        """Token of the key, if any and if its user is active."""
+        return cls.objects.select_related("user").filter(key_hash=cls.hash_key(key), user__is_active=True).first()
+
+    class Meta:
+        verbose_name = _("API token")
+        verbose_name_plural = _("API tokens")
@@ -0,0 +1,221 @@
+import abc
+import datetime
+import json
+import logging
+import urllib.request
+from typing import Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.mail import get_connection, EmailMessage
+from django.db import transaction
+from django.db.models import F, Q, QuerySet
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from django.utils.translation import gettext as _, ngettext
+
+from inventory.models import Item, ExpirationReminder, UndeliveredReminder
+
+logger = logging.getLogger(__name__)
+
+
+def due_items(today: Optional[datetime.date] = None, days: Optional[int] = None) -> QuerySet:
+    """Items expired or expiring in the next `days`, soonest first, read through the expiration index."""
+    today = today or timezone.localdate()
+    days = settings.INVENTORY_EXPIRATION_DUE_DAYS if days is None else days
+    return (Item.objects.filter(expiration__lt=today + datetime.timedelta(days=days))
+            .select_related("location")
+            .order_by("expiration", "pk"))
+
+
+def changed_items(today: Optional[datetime.date] = None) -> QuerySet:
+    """Due items without a reminder, or whose status or expiration changed since their reminder was written.
+
+    Compared in the query, so that only the changes are loaded instead of all the due items and reminders.
+    """
+    today = today or timezone.localdate()
+    unchanged_status = Q(expiration__lt=today, reminder__status=ExpirationReminder.Status.EXPIRED) | \
+        Q(expiration__gte=today, reminder__status=ExpirationReminder.Status.DUE)
+    return due_items(today).exclude(Q(reminder__expiration=F("expiration")) & unchanged_status)
+
+
+def expiration_status(item: Item, today: datetime.date) -> str:
+    return ExpirationReminder.Status.EXPIRED if item.expiration < today else ExpirationReminder.Status.DUE
+
+
+class Digest:
+    """Expiration changes notified to one user in one run."""
+
+    def __init__(self, user: User, entries: List[Tuple[Item, str]]):
+        self.user = user
+        self.entries = entries
+
+    @property
+    def subject(self) -> str:
+        return ngettext("%(count)d item expired or expiring soon", "%(count)d items expired or expiring soon",
+                        len(self.entries)) % {"count": len(self.entries)}
+
+    def lines(self) -> List[str]:
+        return [f"[{ExpirationReminder.Status(status).label}] {item.name} - {item.expiration} - "
+                f"{item.location or _('no location')}"
+                for item, status in self.entries]
+
+    def as_dict(self) -> dict:
+        return {
+            "user": self.user.get_username(),
+            "email": self.user.email,
+            "items": [{"id": item.pk, "name": item.name, "expiration": str(item.expiration), "status": status,
+                       "location": item.location.full_locator if item.location else None}
+                      for item, status in self.entries],
+        }
+
+
+# Sinks, configured with INVENTORY_REMINDER_SINKS
+
+class Sink(abc.ABC):
+    # Set from the NAME of the sink in the settings, identifies the reminders it failed to deliver
+    name: Optional[str] = None
+
+    @property
+    def key(self) -> str:
+        return self.name or f"{type(self).__module__}.{type(self).__qualname__}"
+
+    @abc.abstractmethod
+    def send(self, digests: List[Digest]):
+        """Deliver the digests of one run, raising an exception if that failed."""
+
+
+class EmailSink(Sink):
+    """Send one email per user with an address, over a single connection to the configured SMTP server."""
+
+    def __init__(self, from_email: Optional[str] = None):
+        self.from_email = from_email
+
+    def send(self, digests: List[Digest]):
+        messages = [EmailMessage(d.subject, "\n".join(d.lines()), self.from_email, [d.user.email])
+                    for d in digests if d.user.email]
+        if messages:
+            get_connection().send_messages(messages)
+
+
+class FileSink(Sink):
+    """Append one JSON line per digest to a file."""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def send(self, digests: List[Digest]):
+        with open(self.path, "a", encoding="utf-8") as f:
+            for digest in digests:
+                f.write(json.dumps(digest.as_dict(), ensure_ascii=False) + "\n")
+
+
+class WebhookSink(Sink):
+    """POST all the digests of a run as one JSON document."""
+
+    def __init__(self, url: str, timeout: float = 10):
+        self.url = url
+        self.timeout = timeout
+
+    def send(self, digests: List[Digest]):
+        data = json.dumps({"digests": [d.as_dict() for d in digests]}).encode()
+        request = urllib.request.Request(self.url, data=data, headers={"Content-Type": "application/json"})
+        with urllib.request.urlopen(request, timeout=self.timeout):
+            pass
+
+
+def get_sinks() -> List[Sink]:
+    sinks = []
+    for config in settings.INVENTORY_REMINDER_SINKS:
+        sink = import_string(config["BACKEND"])(**config.get("OPTIONS", {}))
+        sink.name = config.get("NAME", sink.name)
+        sinks.append(sink)
+    return sinks
+
+
+class DigestResult:
+    def __init__(self):
+        self.changes: Dict[str, int] = {status: 0 for status in ExpirationReminder.Status.values}
+        self.cleared = 0
+        self.digests = 0
+        self.retried = 0
+        self.failed_sinks = 0
+
+    def __str__(self):
+        text = (f"{self.changes['expired']} newly expired, {self.changes['due']} expiring soon, "
+                f"{self.cleared} cleared, {self.digests} digests sent")
+        if self.retried:
+            text += f", {self.retried} undelivered reminders sent again"
+        if self.failed_sinks:
+            text += f", {self.failed_sinks} sinks failed"
+        return text
+
+
+def send_expiration_digest(today: Optional[datetime.date] = None, sinks: Optional[List[Sink]] = None,
+                           dry_run: bool = False) -> DigestResult:
+    """Notify the items whose expiration status changed since the last run to the users who can see them.
+
+    Only the changed items are read, see `changed_items`, and reminders of items that are no longer due are cleared.
+    State is committed before sending, so that the database is not locked while waiting for slow sinks: a failing sink
+    is logged and counted in the result, and its reminders are recorded as undelivered so that it gets them again on
+    the next run, unless they changed or were cleared meanwhile.
+    """
+    today = today or timezone.localdate()
+    sinks = get_sinks() if sinks is None else sinks
+    result = DigestResult()
+
+    with transaction.atomic():
+        changed_query = changed_items(today)
+        changed: List[Tuple[Item, str]] = []
+        for item in changed_query:
+            status = expiration_status(item, today)
+            changed.append((item, status))
+            result.changes[status] += 1
+
+        cutoff = today + datetime.timedelta(days=settings.INVENTORY_EXPIRATION_DUE_DAYS)
+        cleared = ExpirationReminder.objects.exclude(item__expiration__lt=cutoff)
+        changed_pks = [item.pk for item, _status in changed]
+        # Replaced by the new reminders of the changed items, or cleared
+        undelivered = list(UndeliveredReminder.objects
+                           .filter(sink__in=[sink.key for sink in sinks])
+                           .exclude(reminder__in=changed_query.values("pk"))
+                           .exclude(reminder__in=cleared)
+                           .select_related("reminder__item__location"))
+        retries: Dict[str, List[UndeliveredReminder]] = {sink.key: [] for sink in sinks}
+        for row in undelivered:
+            retries[row.sink].append(row)
+
+        users = []
+        if changed or undelivered:
+            users = list(User.objects.with_perm("inventory.view_item").filter(is_active=True).order_by("pk"))
+        result.digests = len(users)
+
+        if dry_run:
+            result.cleared = cleared.count()
+            result.retried = len(undelivered)
+            return result
+
+        _total, deleted = cleared.delete()
+        result.cleared = deleted.get(ExpirationReminder._meta.label, 0)
+        ExpirationReminder.objects.filter(pk__in=changed_pks).delete()
+        ExpirationReminder.objects.bulk_create(
+            ExpirationReminder(item=item, status=status, expiration=item.expiration) for item, status in changed)
+
+    for sink in sinks:
+        rows = retries[sink.key]
+        entries = sorted(changed + [(row.reminder.item, row.reminder.status) for row in rows],
+                         key=lambda entry: (entry[0].expiration, entry[0].pk))
+        if not entries or not users:
+            continue
+        try:
+            sink.send([Digest(user, entries) for user in users])
+        except Exception:
+            logger.exception("Sending expiration digests with %s failed", sink.key)
+            result.failed_sinks += 1
+            UndeliveredReminder.objects.bulk_create(
+                (UndeliveredReminder(reminder_id=pk, sink=sink.key) for pk in changed_pks), ignore_conflicts=True)
+        else:
+            result.retried += len(rows)
+            UndeliveredReminder.objects.filter(pk__in=[row.pk for row in rows]).delete()
+
+    return result
@@ -0,0 +1,42 @@
+from typing import Dict
+
+from django.db import connections
+from django.db.models import QuerySet
+from django.db.models.expressions import RawSQL
+
+FTS_TABLE = "inventory_item_fts"
+
+# Relative weights of the name, description, location and category columns in the ranking
+FTS_WEIGHTS = (10.0, 1.0, 2.0, 2.0)
+
+_fts_available: Dict[str, bool] = {}
+
+
+def fts_available(using: str) -> bool:
+    """Whether the full-text index was created by the migrations on this database."""
+    if using not in _fts_available:
+        connection = connections[using]
+        _fts_available[using] = connection.vendor == "sqlite" and FTS_TABLE in connection.introspection.table_names()
+    return _fts_available[using]
+
+
+def fts_query(search_term: str) -> str:
+    """FTS5 query matching rows containing words starting with each of the words of the search term.
+
+    Words are quoted, so that user input can't be interpreted as FTS5 query syntax.
+    """
+    words = ['"{}"'.format(word.replace('"', '""')) for word in search_term.split()]
+    return " ".join(f"{word}*" for word in words)
+
+
+def search_items(queryset: QuerySet, search_term: str) -> QuerySet:
+    """Items of the queryset matching the search term, annotated with their `search_rank` (lower is better)."""
+    query = fts_query(search_term)
+    weights = ", ".join(map(str, FTS_WEIGHTS))
+    table = queryset.model._meta.db_table
+    return queryset.filter(
+        pk__in=RawSQL(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [query])
+    ).annotate(search_rank=RawSQL(
+        f"SELECT bm25({FTS_TABLE}, {weights}) FROM {FTS_TABLE} "
+        f"WHERE {FTS_TABLE} MATCH %s AND {FTS_TABLE}.rowid = {table}.id", [query]
+    ))
@@ -0,0 +1,89 @@
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.signals import request_started, request_finished
+from django.db.backends.signals import connection_created
+from django.db.models.signals import pre_save, post_save, post_delete, post_migrate
+from django.dispatch import receiver
+
+from inventory import tree_cache
+from inventory.middleware import record_queries
+from inventory.models import Item, Location, Category, deleting_in_bulk
+from inventory.versions import count_changes, forget_availability
+
+
+# Item counters
+
+@receiver(pre_save, sender=Item, dispatch_uid="inventory_item_pre_save")
+def remember_item_tree_nodes(sender, instance: Item, raw=False, **kwargs):
+    if raw or instance.pk is None:
+        instance._counted_pks = None
+        return
+    instance._counted_pks = sender.objects.filter(pk=instance.pk).values_list("location_id", "category_id").first()
+
+
+@receiver(post_save, sender=Item, dispatch_uid="inventory_item_post_save")
+def update_counters_on_item_save(sender, instance: Item, raw=False, **kwargs):
+    if raw:
+        return
+    old_location_pk, old_category_pk = getattr(instance, "_counted_pks", None) or (None, None)
+    for model, old_pk, new_pk in ((Location, old_location_pk, instance.location_id),
+                                  (Category, old_category_pk, instance.category_id)):
+        if old_pk != new_pk:
+            deltas = defaultdict(int)
+            deltas[old_pk] -= 1
+            deltas[new_pk] += 1
+            model.apply_items_delta(deltas)
+
+
+@receiver(post_delete, sender=Item, dispatch_uid="inventory_item_post_delete")
+def update_counters_on_item_delete(sender, instance: Item, **kwargs):
+    if deleting_in_bulk.get():
+        return
+    Location.apply_items_delta({instance.location_id: -1})
+    Category.apply_items_delta({instance.category_id: -1})
+
+
+# SQLite tuning
+
+@receiver(connection_created, dispatch_uid="inventory_sqlite_pragmas")
+def apply_sqlite_pragmas(sender, connection, **kwargs):
+    if connection.vendor != "sqlite":
+        return
+    with connection.cursor() as cursor:
+        for name, value in settings.INVENTORY_SQLITE_PRAGMAS.items():
+            cursor.execute(f"PRAGMA {name} = {value}")
+
+
+# Performance monitoring
+
+@receiver(connection_created, dispatch_uid="inventory_record_queries")
+def install_query_recorder(sender, connection, **kwargs):
+    # Connections are per thread, and requests served under ASGI run their queries in several threads
+    if record_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, record_queries)
+
+
+# Table versions
+
+@receiver(connection_created, dispatch_uid="inventory_count_changes")
+def install_change_counter(sender, connection, **kwargs):
+    if connection.vendor == "sqlite" and count_changes not in connection.execute_wrappers:
+        connection.execute_wrappers.append(count_changes)
+
+
+@receiver(post_migrate, dispatch_uid="inventory_versions_migrated")
+def check_versions_again(sender, **kwargs):
+    forget_availability()
+
+
+# Tree snapshots
+
+@receiver(request_started, dispatch_uid="inventory_tree_cache_start")
+def start_tree_cache_request(sender, **kwargs):
+    tree_cache.start_request()
+
+
+@receiver(request_finished, dispatch_uid="inventory_tree_cache_end")
+def end_tree_cache_request(sender, **kwargs):
+    tree_cache.end_request()
@@ -1,3 +1,1856 @@
-from django.test import TestCase
+import asyncio
+import csv
+import datetime
+import io
+import json
+import os
+import random
+import re
+import tempfile
+import threading
+from importlib import import_module
+from unittest import mock
 
-# Create your tests here.
+from django.apps import apps as django_apps
+from django.contrib.admin.helpers import ACTION_CHECKBOX_NAME
+from django.contrib.admin.models import LogEntry, ADDITION
+from django.contrib.auth.models import User, Permission
+from django.core import mail
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command, CommandError
+from django.core.exceptions import ValidationError
+from django.conf import settings
+from django.db import connection, transaction, IntegrityError, OperationalError
+from django.middleware.csrf import _get_new_csrf_token
+from django.db.backends.sqlite3.base import DatabaseWrapper as SQLiteDatabaseWrapper
+from django.db.models import F
+from asgiref.sync import async_to_sync
+from django.test import (TestCase, TransactionTestCase, LiveServerTestCase, Client, RequestFactory,
+                         AsyncRequestFactory, override_settings)
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from . import api, tree_cache
+from .admin import admin_site
+from .audit import LogEntryBatch
+from .benchmark import (compare_reports, default_cases, default_comparisons, item_filter_lookups, item_import_comparison,
+                        legacy_import_items, legacy_item_filter_lookups, load_test, run_benchmarks, run_comparisons)
+from .export import EXPORT_FIELDS
+from .generator import generate_inventory
+from .importer import import_items
+from .jobs import run_job
+from .list_filters import ItemsByLocation, ItemsByCategory, ExpirationFieldListFilter
+from .middleware import QueryRecorder
+from .models import (Location, Category, Item, Job, ExpirationReminder, RequestProfile, LocationClosure, TableVersion,
+                     ApiToken, UndeliveredReminder)
+from .reminders import Sink, WebhookSink, changed_items, send_expiration_digest
+from .trees import ClosureTableBackend, TreenodeBackend, closure_model, move_closure, rebuild_closure
+
+
+def build_location_tree(size: int) -> Location:
+    """Create a root location with `size` nested sections below it, updating the tree metadata only once."""
+    root = Location.objects.create(name="Root", locator="R")
+    shelves = Location.bulk_create_nodes(
+        Location(tn_parent=root, name=f"Shelf {i}", locator=f"S{i}") for i in range(size // 10 or 1))
+    Location.bulk_create_nodes(
+        Location(tn_parent=shelves[i % len(shelves)], name=f"Drawer {i}", locator=f"D{i}")
+        for i in range(size - len(shelves)))
+    root.refresh_from_db()
+    return root
+
+
+def build_category_tree(size: int) -> Category:
+    root = Category.objects.create(name="Root")
+    Category.objects.bulk_create(Category(tn_parent=root, name=f"Category {i}") for i in range(size))
+    Category.update_tree()
+    root.refresh_from_db()
+    return root
+
+
+class SubtreeListFilterTests(TestCase):
+    sizes = (50, 200, 800)
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.user = User.objects.create_superuser("admin", "admin@example.com", "admin")
+        self.model_admin = admin_site._registry[Item]
+
+    def filter_items(self, filter_class, value):
+        request = self.factory.get("/", {filter_class.parameter_name: str(value)})
+        request.user = self.user
+        list_filter = filter_class(request, {filter_class.parameter_name: str(value)}, Item, self.model_admin)
+        with CaptureQueriesContext(connection) as ctx:
+            pks = list(list_filter.queryset(request, Item.objects.all()).values_list("pk", flat=True))
+        return pks, ctx.captured_queries
+
+    def assert_constant_queries_and_linear_sql(self, results):
+        query_counts = {len(queries) for _, queries in results.values()}
+        self.assertEqual(len(query_counts), 1, f"Query count depends on tree size: {query_counts}")
+
+        # The SQL grows with the number of primary keys in the IN clause, so the size per node must stay
+        # roughly constant instead of growing with an OR chain
+        per_node = [len(queries[-1]["sql"]) / size for size, (_, queries) in results.items()]
+        self.assertLess(max(per_node[1:]), per_node[0] * 1.5)
+
+    def test_items_by_location(self):
+        results = {}
+        for size in self.sizes:
+            Item.objects.all().delete()
+            Location.delete_tree()
+            root = build_location_tree(size)
+            Item.objects.bulk_create(Item(name=f"Item {i}", location_id=pk) for i, pk in enumerate(root.subtree_pks))
+            Item.objects.create(name="Elsewhere", location=Location.objects.create(name="Other", locator="O"))
+
+            pks, queries = self.filter_items(ItemsByLocation, root.pk)
+            self.assertEqual(len(pks), size + 1)
+            results[size] = (pks, queries)
+
+        self.assert_constant_queries_and_linear_sql(results)
+
+    def test_items_by_category(self):
+        results = {}
+        for size in self.sizes:
+            Item.objects.all().delete()
+            Category.delete_tree()
+            root = build_category_tree(size)
+            Item.objects.bulk_create(Item(name=f"Item {i}", category_id=pk) for i, pk in enumerate(root.subtree_pks))
+            Item.objects.create(name="Uncategorized")
+
+            pks, queries = self.filter_items(ItemsByCategory, root.pk)
+            self.assertEqual(len(pks), size + 1)
+            results[size] = (pks, queries)
+
+        self.assert_constant_queries_and_linear_sql(results)
+
+
+class ObjectsCountChangeListTests(TestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.user = User.objects.create_superuser("admin", "admin@example.com", "admin")
+
+    @staticmethod
+    def build_chains(model, rows: int, depth: int):
+        """Create `rows` root nodes, each with a chain of `depth` nested nodes holding one item per level."""
+        field_name = model.items.field.name
+        for row in range(rows):
+            parent = None
+            for level in range(depth):
+                node = model(tn_parent=parent, name=f"Node {row}.{level}")
+                if model is Location:
+                    node.locator = f"L{row}.{level}"
+                model.objects.bulk_create([node])
+                parent = model.objects.latest("pk")
+                Item.objects.create(name=f"Item {row}.{level}", **{field_name: parent})
+        model.update_tree()
+
+    def changelist_queries(self, model) -> int:
+        model_admin = admin_site._registry[model]
+        request = self.factory.get("/")
+        request.user = self.user
+
+        # Sidebar filters are not part of the page rows and are covered separately
+        with mock.patch.object(model_admin, "list_filter", ()), CaptureQueriesContext(connection) as ctx:
+            cl = model_admin.get_changelist_instance(request)
+            for obj in cl.result_list:
+                model_admin.name_link_to_items(obj)
+        return len(ctx.captured_queries)
+
+    def check_constant_queries(self, model):
+        query_counts = {}
+        for rows, depth in ((2, 2), (10, 4), (25, 8)):
+            Item.objects.all().delete()
+            model.delete_tree()
+            self.build_chains(model, rows, depth)
+            query_counts[(rows, depth)] = self.changelist_queries(model)
+
+            roots = model.objects.filter(tn_parent=None)
+            self.assertEqual({root.objects_count for root in roots}, {depth})
+
+        self.assertEqual(len(set(query_counts.values())), 1, query_counts)
+
+    def test_location_changelist(self):
+        self.check_constant_queries(Location)
+
+    def test_category_changelist(self):
+        self.check_constant_queries(Category)
+
+    def test_objects_count_is_stored(self):
+        self.build_chains(Location, 1, 3)
+        root = Location.objects.get(tn_parent=None)
+        with self.assertNumQueries(0):
+            self.assertEqual(root.objects_count, 3)
+
+
+class ItemsCountersTests(TestCase):
+    def setUp(self):
+        self.rng = random.Random(1234)
+        build_location_tree(40)
+        build_category_tree(10)
+        Category.objects.bulk_create(Category(tn_parent=c, name=f"Sub {c.name}") for c in Category.objects.all())
+        Category.update_tree()
+        self.locations = list(Location.objects.values_list("pk", flat=True))
+        self.categories = list(Category.objects.values_list("pk", flat=True)) + [None]
+        Item.objects.bulk_create(
+            Item(name=f"Item {i}", location_id=self.rng.choice(self.locations),
+                 category_id=self.rng.choice(self.categories))
+            for i in range(200))
+
+    def assert_counters_match(self):
+        for model in (Location, Category):
+            field_name = model.items.field.name
+            for node in model.objects.all():
+                self.assertEqual(node.items_count, Item.objects.filter(**{field_name: node}).count(), node.pk)
+                self.assertEqual(node.subtree_items_count,
+                                 Item.objects.filter(**{f"{field_name}__in": node.subtree_pks}).count(), node.pk)
+
+    def test_bulk_create(self):
+        self.assert_counters_match()
+
+    def test_random_moves(self):
+        for _ in range(30):
+            item = Item.objects.get(pk=self.rng.choice(Item.objects.values_list("pk", flat=True)))
+            item.location_id = self.rng.choice(self.locations)
+            item.category_id = self.rng.choice(self.categories)
+            item.save()
+        self.assert_counters_match()
+
+        for _ in range(10):
+            pks = self.rng.sample(list(Item.objects.values_list("pk", flat=True)), 20)
+            Item.objects.filter(pk__in=pks).update(location=Location.objects.get(pk=self.rng.choice(self.locations)))
+            Item.objects.filter(pk__in=pks).update(category_id=self.rng.choice(self.categories))
+        self.assert_counters_match()
+
+        Item.objects.filter(pk__in=self.rng.sample(list(Item.objects.values_list("pk", flat=True)), 20)).delete()
+        self.assert_counters_match()
+
+    def test_bulk_delete(self):
+        # One UPDATE per distinct delta instead of several queries per deleted item
+        pks = Item.objects.order_by("pk").values_list("pk", flat=True)[:100]
+        with CaptureQueriesContext(connection) as ctx:
+            Item.objects.filter(pk__in=list(pks)).delete()
+        self.assertLess(len(ctx.captured_queries), 60)
+        self.assert_counters_match()
+
+        Item.objects.first().delete()
+        self.assert_counters_match()
+
+    def test_tree_changes(self):
+        location = Location.objects.filter(tn_parent__isnull=False).exclude(tn_children=None).first()
+        location.tn_parent = None
+        location.save()
+        self.assert_counters_match()
+
+        Location.objects.filter(tn_parent=None).exclude(pk=location.pk).first().delete()
+        self.assert_counters_match()
+
+    def test_recount_command(self):
+        Location.objects.update(items_count=0, subtree_items_count=7)
+        Category.objects.update(items_count=3, subtree_items_count=0)
+        call_command("recount_inventory", stdout=io.StringIO())
+        self.assert_counters_match()
+
+
+class ListFilterLookupsTests(TestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.user = User.objects.create_superuser("admin", "admin@example.com", "admin")
+        self.model_admin = admin_site._registry[Item]
+        self.rng = random.Random(1234)
+        build_location_tree(30)
+        build_category_tree(5)
+        Category.objects.bulk_create(Category(tn_parent=c, name=f"Sub {c.name}") for c in Category.objects.all())
+        Category.update_tree()
+
+    def lookups(self, filter_class, params=None):
+        request = self.factory.get("/", params or {})
+        request.user = self.user
+        with CaptureQueriesContext(connection) as ctx:
+            lookups = list(filter_class(request, dict(params or {}), Item, self.model_admin).lookup_choices)
+        return lookups, len(ctx.captured_queries)
+
+    def add_items(self, count):
+        locations = list(Location.objects.values_list("pk", flat=True))
+        categories = list(Category.objects.filter(tn_children_count=0).values_list("pk", flat=True))
+        Item.objects.bulk_create(
+            Item(name=f"Item {i}", location_id=self.rng.choice(locations), category_id=self.rng.choice(categories))
+            for i in range(count))
+
+    def test_items_by_location(self):
+        query_counts = set()
+        for count in (20, 200, 2000):
+            self.add_items(count)
+            lookups, queries = self.lookups(ItemsByLocation)
+            query_counts.add(queries)
+
+        used = Location.objects.filter(pk__in=Item.objects.values("location"))
+        self.assertEqual(lookups, sorted(((loc.pk, str(loc)) for loc in used), key=lambda l: l[1]))
+        self.assertEqual(len(query_counts), 1)
+        self.assertLessEqual(query_counts.pop(), 3)
+
+        selected = Location.objects.create(tn_parent=used.first(), name="Empty", locator="E")
+        lookups, _ = self.lookups(ItemsByLocation, {"location": str(selected.pk)})
+        self.assertEqual(lookups[0], (selected.pk, str(selected)))
+
+    def test_items_by_category(self):
+        query_counts = set()
+        for count in (20, 200, 2000):
+            self.add_items(count)
+            lookups, queries = self.lookups(ItemsByCategory)
+            query_counts.add(queries)
+
+        used = {c for c in Category.objects.filter(pk__in=Item.objects.values("category"))}
+        used |= {a for c in used for a in c.ancestors}
+        self.assertEqual(lookups, sorted(((c.pk, c.bcrumb_name) for c in used), key=lambda l: l[1]))
+        self.assertEqual(query_counts, {3})
+
+
+class StoredPathsTests(TestCase):
+    def setUp(self):
+        self.root = Location.objects.create(name="Living room", locator="LR")
+        self.cabinet = Location.objects.create(tn_parent=self.root, name="Cabinet", locator="CAB")
+        self.drawer = Location.objects.create(tn_parent=self.cabinet, name="Drawer", locator="D3")
+        self.other = Location.objects.create(name="Kitchen", locator="K")
+
+    def assert_paths(self, expected):
+        self.assertEqual(dict(Location.objects.values_list("locator", "full_locator")), expected)
+
+    def test_create(self):
+        self.assert_paths({"LR": "LR", "CAB": "LR/CAB", "D3": "LR/CAB/D3", "K": "K"})
+
+    def test_str_does_not_query(self):
+        drawer = Location.objects.get(pk=self.drawer.pk)
+        with self.assertNumQueries(0):
+            self.assertEqual(str(drawer), "LR/CAB/D3")
+
+    def test_rename(self):
+        self.root.locator = "BR"
+        self.root.save()
+        self.assert_paths({"BR": "BR", "CAB": "BR/CAB", "D3": "BR/CAB/D3", "K": "K"})
+        # Instances held in memory are updated as well
+        self.assertEqual(str(self.drawer), "BR/CAB/D3")
+
+    def test_reparent(self):
+        self.cabinet.tn_parent = self.other
+        self.cabinet.save()
+        self.assert_paths({"LR": "LR", "CAB": "K/CAB", "D3": "K/CAB/D3", "K": "K"})
+
+        self.cabinet.set_parent(None)
+        self.assert_paths({"LR": "LR", "CAB": "CAB", "D3": "CAB/D3", "K": "K"})
+
+    def test_get_by_path(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(Location.get_by_path(" /LR / CAB/D3 "), self.drawer)
+        with self.assertRaises(Location.DoesNotExist):
+            Location.get_by_path("LR/D3")
+
+    def test_unique_full_locator(self):
+        with self.assertRaises(ValidationError):
+            Location(tn_parent=self.root, name="Other cabinet", locator="CAB").full_clean()
+        with self.assertRaises(ValidationError):
+            Location(name="Slashed", locator="A/B").full_clean()
+        Location(tn_parent=self.other, name="Cabinet", locator="CAB").full_clean()
+
+        # Moving next to a location with the same locator is rejected as well
+        self.cabinet.tn_parent = None
+        self.cabinet.locator = "K"
+        with self.assertRaises(ValidationError):
+            self.cabinet.full_clean()
+
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Location.objects.create(tn_parent=self.root, name="Other cabinet", locator="CAB")
+
+    def test_rename_duplicate_locations(self):
+        # Duplicates left by versions without the unique constraint, stored under made up paths
+        def create(parent, locator):
+            Location.objects.bulk_create([Location(tn_parent=parent, name=locator, locator=locator,
+                                                   full_locator=f"tmp{Location.objects.count()}")])
+            return Location.objects.latest("pk")
+
+        long_locator = "X" * Location._meta.get_field("locator").max_length
+        other_root = create(None, "LR")
+        create(other_root, "CAB")
+        other_cabinet = create(self.root, "CAB")
+        nested = create(other_cabinet, "D3")
+        long = create(self.other, long_locator)
+        long_duplicate = create(self.other, long_locator)
+
+        migration = import_module("inventory.migrations.0005_unique_full_locator")
+        migration.rename_duplicate_locations(django_apps, None)
+
+        paths = list(Location.objects.values_list("full_locator", flat=True))
+        self.assertEqual(len(paths), len(set(paths)))
+        self.assertEqual(Location.objects.get(pk=other_root.pk).locator, f"LR-{other_root.pk}")
+        self.assertEqual(Location.objects.get(pk=nested.pk).full_locator, f"LR/CAB-{other_cabinet.pk}/D3")
+        self.assertEqual(Location.objects.get(pk=long.pk).locator, long_locator)
+        suffix = f"-{long_duplicate.pk}"
+        self.assertEqual(Location.objects.get(pk=long_duplicate.pk).locator,
+                         long_locator[:len(long_locator) - len(suffix)] + suffix)
+
+    def test_bulk_create(self):
+        # Stored paths are filled in, so that they don't collide with the unique constraint
+        Location.objects.bulk_create([Location(tn_parent=self.root, name="Shelf", locator="SH"),
+                                      Location(tn_parent=self.cabinet, name="Shelf", locator="SH")])
+        Location.update_tree()
+        self.assertEqual(set(Location.objects.filter(locator="SH").values_list("full_locator", flat=True)),
+                         {"LR/SH", "LR/CAB/SH"})
+
+    def test_category_bcrumb_name(self):
+        food = Category.objects.create(name="Food")
+        pasta = Category.objects.create(tn_parent=food, name="Pasta")
+        self.assertEqual(Category.objects.get(pk=pasta.pk).bcrumb_name, "Food/Pasta")
+        food.name = "Groceries"
+        food.save()
+        self.assertEqual(Category.objects.get(pk=pasta.pk).bcrumb_name, "Groceries/Pasta")
+
+
+# The manifest storage needs collectstatic, which is not run for tests
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+class ItemChangeListTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_superuser("admin", "admin@example.com", "admin")
+        self.client.force_login(self.user)
+
+    @staticmethod
+    def build_items(rows: int, depth: int):
+        location = category = None
+        for level in range(depth):
+            location = Location.objects.create(tn_parent=location, name=f"Level {level}", locator=f"L{level}")
+            category = Category.objects.create(tn_parent=category, name=f"Level {level}")
+        Item.objects.bulk_create(Item(name=f"Item {i}", location=location, category=category) for i in range(rows))
+
+    def changelist_queries(self) -> int:
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get("/inventory/item/")
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries)
+
+    def test_query_count(self):
+        self.build_items(5, 2)
+        small_page_queries = self.changelist_queries()
+
+        Item.objects.all().delete()
+        Location.delete_tree()
+        Category.delete_tree()
+        self.build_items(100, 8)
+        # Session, user, count, page rows and the sidebar filters, regardless of rows and nesting
+        self.assertEqual(small_page_queries, 10)
+        with self.assertNumQueries(small_page_queries):
+            response = self.client.get("/inventory/item/")
+        self.assertContains(response, 'title="Explore &quot;Level 7&quot;">L0/L1/L2/L3/L4/L5/L6/L7</a>', count=100)
+
+    def test_query_count_without_select_related(self):
+        self.build_items(100, 8)
+        with mock.patch.object(admin_site._registry[Item], "list_select_related", False):
+            self.assertGreater(self.changelist_queries(), 100)
+
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+class ItemQueryPlanTests(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser("admin", "admin@example.com", "admin"))
+        self.location = build_location_tree(50)
+        self.category = build_category_tree(10)
+        today = datetime.date.today()
+        Item.objects.bulk_create(
+            Item(name=f"Item {i}", amount=i % 7, location_id=self.location.pk + i % 50,
+                 category_id=self.category.pk + i % 10 if i % 3 else None,
+                 expiration=today + datetime.timedelta(days=i % 90 - 30) if i % 4 else None)
+            for i in range(2000))
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+
+    @staticmethod
+    def full_scans(sql, params):
+        """Tables read without any index by the query."""
+        with connection.cursor() as cursor:
+            cursor.execute("EXPLAIN QUERY PLAN " + sql, params)
+            details = [row[-1] for row in cursor.fetchall()]
+        # SQLite before 3.36 says "SCAN TABLE inventory_item AS U0" where newer versions say "SCAN U0"
+        return [detail for detail in details
+                if re.fullmatch(r"SCAN (TABLE )?(inventory_item( AS U\d+)?|U\d+)", detail)]
+
+    def test_changelist_filters_use_indexes(self):
+        drawer = Location.objects.get(locator="D13")
+        params = [{}, {"location": self.location.pk}, {"location": drawer.pk}, {"category": self.category.pk},
+                  {"amount": 3}, {"location": drawer.pk, "amount": 3}]
+        for link in ExpirationFieldListFilter(
+                RequestFactory().get("/"), {}, Item, admin_site._registry[Item]).links[1:]:
+            params.append(link[1])
+            params.append({"location": drawer.pk, **link[1]})
+
+        for query_params in params:
+            with self.subTest(**query_params), CaptureQueriesContext(connection) as ctx:
+                response = self.client.get("/inventory/item/", query_params)
+                self.assertEqual(response.status_code, 200)
+                self.assertNotIn("e=1", response.get("Location", ""))
+                for query in ctx.captured_queries:
+                    if '"inventory_item"' in query["sql"]:
+                        self.assertEqual(self.full_scans(query["sql"], ()), [], query["sql"])
+
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+class KeysetPaginationTests(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser("admin", "admin@example.com", "admin"))
+        locations = [None] + [Location.objects.create(name=f"Box {i}", locator=f"B{i}") for i in range(3)]
+        # Repeated names, so that pages also break between rows with the same location and name
+        Item.objects.bulk_create(Item(name=f"Item {i % 40}", location=locations[i % 4]) for i in range(250))
+        self.expected = list(Item.objects.order_by(F("location").asc(nulls_first=True), "name", "pk")
+                             .values_list("pk", flat=True))
+
+    def get(self, url="/inventory/item/", **params):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return response.context["cl"]
+
+    def test_walk_pages(self):
+        cl = self.get()
+        self.assertTrue(cl.keyset_pagination)
+        self.assertIsNone(cl.previous_url)
+        pages = [[item.pk for item in cl.result_list]]
+        while cl.next_url:
+            with CaptureQueriesContext(connection) as ctx:
+                cl = self.get("/inventory/item/" + cl.next_url)
+            self.assertFalse(any("OFFSET" in query["sql"] for query in ctx.captured_queries))
+            pages.append([item.pk for item in cl.result_list])
+        self.assertEqual([len(page) for page in pages], [100, 100, 50])
+        self.assertEqual(sum(pages, []), self.expected)
+
+        # And back again
+        cl = self.get("/inventory/item/" + cl.previous_url)
+        self.assertEqual([item.pk for item in cl.result_list], pages[1])
+        cl = self.get("/inventory/item/" + cl.previous_url)
+        self.assertEqual([item.pk for item in cl.result_list], pages[0])
+        self.assertIsNone(cl.previous_url)
+
+    def test_filtered(self):
+        box = Location.objects.get(locator="B1")
+        cl = self.get(location=box.pk)
+        self.assertIsNone(cl.next_url)
+        self.assertEqual({item.location_id for item in cl.result_list}, {box.pk})
+        self.assertEqual(cl.result_count, 62)
+
+    def test_count_limit(self):
+        with mock.patch.object(admin_site._registry[Item], "count_limit", 100):
+            response = self.client.get("/inventory/item/")
+        self.assertContains(response, "More than 100 items")
+        self.assertNotContains(response, 'class="showall"')
+
+    def test_fallback_to_page_numbers(self):
+        cl = self.get(o="1")
+        self.assertFalse(cl.keyset_pagination)
+        self.assertEqual(cl.result_count, 250)
+
+    def test_invalid_cursor(self):
+        response = self.client.get("/inventory/item/", {"cursor": "nope"})
+        self.assertRedirects(response, "/inventory/item/?e=1")
+
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage',
+                   INVENTORY_ASYNC_ACTION_THRESHOLD=10, INVENTORY_JOB_CHUNK_SIZE=4)
+class BatchActionsTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_superuser("admin", "admin@example.com", "admin")
+        self.client.force_login(self.user)
+        self.source = Location.objects.create(name="Source", locator="S")
+        self.target = Location.objects.create(name="Target", locator="T")
+        self.category = Category.objects.create(name="Food")
+
+    def post_action(self, action, count, **data):
+        Item.objects.bulk_create(Item(name=f"Item {i}", location=self.source) for i in range(count))
+        return self.client.post("/inventory/item/", {
+            "action": action, "post": "yes", ACTION_CHECKBOX_NAME: list(Item.objects.values_list("pk", flat=True)),
+            **data
+        })
+
+    def test_small_move_runs_inline(self):
+        response = self.post_action("move_to_other_location", 5, new_location=self.target.pk)
+        self.assertEqual(response.status_code, 302)
+        self.assertFalse(Job.objects.exists())
+        self.assertEqual(Item.objects.filter(location=self.target).count(), 5)
+        self.assertEqual(LogEntry.objects.count(), 5)
+
+    def test_large_move_runs_in_background(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.post_action("move_to_other_location", 15, new_location=self.target.pk)
+        job = Job.objects.get()
+        self.assertRedirects(response, f"/inventory/job/{job.pk}/change/")
+        self.assertEqual((job.status, job.total), (Job.Status.PENDING, 15))
+        self.assertEqual(len(callbacks), 1)
+        self.assertFalse(Item.objects.filter(location=self.target).exists())
+
+        run_job(job.pk)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.done, job.progress), (Job.Status.DONE, 15, 100))
+        self.assertEqual(Item.objects.filter(location=self.target).count(), 15)
+        self.assertEqual(LogEntry.objects.count(), 15)
+        self.assertEqual(Location.objects.get(pk=self.target.pk).objects_count, 15)
+
+        response = self.client.get(f"/inventory/job/{job.pk}/change/")
+        self.assertContains(response, '<progress value="15" max="15"')
+        self.assertNotContains(response, 'http-equiv="refresh"')
+
+    def test_large_category_change(self):
+        with self.captureOnCommitCallbacks():
+            self.post_action("change_category", 12, new_category=self.category.pk)
+        run_job(Job.objects.get().pk)
+        self.assertEqual(Item.objects.filter(category=self.category).count(), 12)
+
+    def test_failed_job(self):
+        with self.captureOnCommitCallbacks():
+            self.post_action("move_to_other_location", 12, new_location=self.target.pk)
+        job = Job.objects.get()
+        self.target.delete()
+        with self.assertLogs("inventory.jobs", "ERROR"):
+            run_job(job.pk)
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.Status.FAILED)
+        self.assertIn("DoesNotExist", job.error)
+
+    def test_job_page_of_its_user(self):
+        clerk = User.objects.create_user("clerk", is_staff=True)
+        clerk.user_permissions.add(*Permission.objects.filter(codename__in=["view_item", "change_item"]))
+        self.client.force_login(clerk)
+        with self.captureOnCommitCallbacks():
+            response = self.post_action("move_to_other_location", 12, new_location=self.target.pk)
+        job = Job.objects.get()
+        self.assertRedirects(response, f"/inventory/job/{job.pk}/change/")
+        self.assertContains(self.client.get(response.url), '<progress value="0" max="12"')
+
+        # Only their own jobs
+        self.assertEqual(self.client.get("/inventory/job/").status_code, 403)
+        other = Job.objects.create(action="move_to_other_location", description="Other", user=self.user)
+        self.assertEqual(self.client.get(f"/inventory/job/{other.pk}/change/").status_code, 403)
+
+    def test_fail_interrupted_jobs(self):
+        jobs = {status: Job.objects.create(action="move_to_other_location", description=status, status=status)
+                for status in Job.Status.values}
+        out = io.StringIO()
+        call_command("fail_interrupted_jobs", stdout=out)
+        self.assertEqual(out.getvalue().strip(), "Marked 2 interrupted jobs as failed")
+
+        statuses = {status: Job.objects.get(pk=job.pk) for status, job in jobs.items()}
+        self.assertEqual([job.status for job in statuses.values()], ["failed", "failed", "done", "failed"])
+        self.assertEqual(statuses["running"].error, "Interrupted by a server restart")
+        self.assertIsNotNone(statuses["pending"].finished)
+        self.assertEqual(statuses["failed"].error, "")
+
+
+class LogEntryBatchTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_superuser("admin", "admin@example.com", "admin")
+        self.location = Location.objects.create(name="Shelf", locator="SH")
+
+    def test_same_entries_as_model_admin(self):
+        item = Item.objects.create(name="Screws", location=self.location)
+        request = RequestFactory().post("/")
+        request.user = self.user
+        admin_site._registry[Item].log_change(request, item, str(item))
+        with LogEntryBatch(self.user.pk) as log:
+            log.log_change(item, str(item))
+
+        fields = ("user", "content_type", "object_id", "object_repr", "action_flag", "change_message")
+        expected, batched = LogEntry.objects.order_by("pk").values_list(*fields)
+        self.assertEqual(batched, expected)
+
+    def test_bulk_writes(self):
+        Item.objects.bulk_create(Item(name=f"Item {i}", location=self.location) for i in range(250))
+        items = list(Item.objects.all())
+        with self.assertNumQueries(3), LogEntryBatch(self.user.pk, batch_size=100) as log:
+            for item in items:
+                log.log_change(item, str(item))
+        self.assertEqual(LogEntry.objects.count(), 250)
+
+    def test_discarded_on_error(self):
+        with self.assertRaises(ValueError), LogEntryBatch(self.user.pk) as log:
+            log.log_addition(self.location, str(self.location))
+            raise ValueError
+        self.assertFalse(LogEntry.objects.exists())
+
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+class BulkCreateNodesTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_superuser("admin", "admin@example.com", "admin")
+        self.client.force_login(self.user)
+        self.cabinet = Location.objects.create(name="Cabinet", locator="CAB")
+
+    def test_bulk_create_nodes(self):
+        shelves = Location.bulk_create_nodes(
+            Location(tn_parent=self.cabinet, name=f"Shelf {i}", locator=f"SH{i}") for i in range(3))
+        self.assertEqual([str(s) for s in shelves], ["CAB/SH0", "CAB/SH1", "CAB/SH2"])
+        self.assertEqual([s.tn_level for s in shelves], [2, 2, 2])
+
+        boxes = Location.bulk_create_nodes(Location(tn_parent=s, name="Box", locator="B") for s in shelves)
+        self.assertEqual({b.tn_ancestors_pks for b in boxes}, {f"{self.cabinet.pk},{s.pk}" for s in shelves})
+        self.cabinet.refresh_from_db()
+        self.assertEqual(self.cabinet.tn_descendants_count, 6)
+
+    def test_create_sections(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.post("/inventory/location/", {
+                "action": "create_sections", "post": "yes", ACTION_CHECKBOX_NAME: [self.cabinet.pk],
+                "rows": "50", "columns": "26", "locator_prefix": "SH.", "name_prefix": "Shelf",
+            })
+        self.assertEqual(response.status_code, 302)
+        # A handful of batched INSERTs and UPDATEs instead of a full tree update per section
+        self.assertLess(len(ctx.captured_queries), 150)
+
+        self.cabinet.refresh_from_db()
+        self.assertEqual(self.cabinet.tn_children_count, 1300)
+        self.assertEqual(Location.objects.get(locator="SH.50Z").full_locator, "CAB/SH.50Z")
+        self.assertEqual(LogEntry.objects.filter(action_flag=ADDITION).count(), 1300)
+
+        # Running it again only adds the missing sections
+        self.client.post("/inventory/location/", {
+            "action": "create_sections", "post": "yes", ACTION_CHECKBOX_NAME: [self.cabinet.pk],
+            "rows": "51", "columns": "26", "locator_prefix": "SH.", "name_prefix": "Shelf",
+        })
+        self.assertEqual(Location.objects.filter(tn_parent=self.cabinet).count(), 1326)
+
+
+class TreeBackendTests(TestCase):
+    def setUp(self):
+        self.rng = random.Random(42)
+        self.treenode = TreenodeBackend()
+        self.closure = ClosureTableBackend()
+
+    def closure_rows(self, model):
+        return set(closure_model(model).objects.values_list("ancestor_id", "descendant_id", "depth"))
+
+    def assert_equivalent(self, model):
+        nodes = list(model.objects.all())
+        pks = [node.pk for node in nodes]
+        for node in nodes:
+            for include_self in (True, False):
+                self.assertEqual(sorted(self.closure.subtree(model, node, include_self)),
+                                 sorted(self.treenode.subtree(model, node, include_self)), node.pk)
+        self.assertEqual(self.closure.ancestors(model, pks), self.treenode.ancestors(model, pks))
+        some = self.rng.sample(pks, min(len(pks), 5))
+        for with_ancestors in (True, False):
+            self.assertEqual(self.closure.path_labels(model, some, with_ancestors),
+                             self.treenode.path_labels(model, some, with_ancestors))
+        # Depths are the differences of levels
+        levels = dict(model.objects.values_list("pk", "tn_level"))
+        self.assertTrue(all(levels[descendant] - levels[ancestor] == depth
+                            for ancestor, descendant, depth in self.closure_rows(model)))
+
+    def test_random_changes(self):
+        Location.objects.create(name="Root", locator="R")
+        for i in range(60):
+            pks = list(Location.objects.values_list("pk", flat=True))
+            operation = self.rng.choice(["create", "bulk", "move", "set_parent", "delete"])
+            if operation == "create":
+                Location.objects.create(tn_parent_id=self.rng.choice(pks), name=f"Node {i}", locator=f"N{i}")
+            elif operation == "bulk":
+                Location.bulk_create_nodes(Location(tn_parent_id=self.rng.choice(pks), name=f"Node {i}.{j}",
+                                                    locator=f"N{i}.{j}") for j in range(4))
+            elif operation in ("move", "set_parent"):
+                node = Location.objects.get(pk=self.rng.choice(pks))
+                parent = Location.objects.get(pk=self.rng.choice(pks)) if self.rng.random() < .9 else None
+                if operation == "set_parent" and parent != node:
+                    # treenode moves the new parent up first when it's below the node
+                    node.set_parent(parent)
+                elif parent is None or parent.pk not in node.subtree_pks:
+                    node.tn_parent = parent
+                    node.save()
+            elif len(pks) > 1:
+                Location.objects.get(pk=self.rng.choice(pks)).delete(cascade=self.rng.random() < .5)
+            self.assert_equivalent(Location)
+
+    def test_nodes_created_without_save(self):
+        # Like with `QuerySet.bulk_create` then `update_tree`, as treenode documents
+        root = build_category_tree(30)
+        self.assertEqual(closure_model(Category).objects.count(), 31 + 30)
+        self.assert_equivalent(Category)
+        self.assertEqual(sorted(self.closure.subtree(Category, root)), sorted(self.treenode.subtree(Category, root)))
+
+    def test_writes(self):
+        root = build_location_tree(40)
+        drawer = Location.objects.filter(tn_level=3).first()
+        # Nodes staying at their place leave the rest of the tree alone
+        drawer.description = "Screws"
+        with CaptureQueriesContext(connection) as ctx:
+            drawer.save()
+        self.assertEqual(len([q for q in ctx.captured_queries if not q["sql"].startswith(("SAVEPOINT", "RELEASE"))]), 1)
+
+        # New nodes read the closure rows of their parent once, and add one row per ancestor
+        with CaptureQueriesContext(connection) as ctx:
+            Location.objects.create(tn_parent=drawer, name="Box", locator="BOX")
+        closure_queries = [q["sql"] for q in ctx.captured_queries if "inventory_locationclosure" in q["sql"]]
+        self.assertEqual(len(closure_queries), 2, closure_queries)
+        box = Location.objects.get(locator="BOX")
+        self.assertEqual(LocationClosure.objects.filter(descendant=box).count(), box.tn_level)
+
+        box.tn_parent = root
+        box.save()
+        self.assertEqual(self.closure.ancestors(Location, [box.pk]), {box.pk: [root.pk]})
+        self.assert_equivalent(Location)
+
+    def test_rebuild(self):
+        build_location_tree(40)
+        rows = self.closure_rows(Location)
+        self.assertEqual(rebuild_closure(Location), len(rows))
+        self.assertEqual(self.closure_rows(Location), rows)
+
+        LocationClosure.objects.all().delete()
+        call_command("recount_inventory", stdout=io.StringIO())
+        self.assertEqual(self.closure_rows(Location), rows)
+
+    def test_move_below_itself(self):
+        root = build_location_tree(20)
+        with self.assertRaises(ValueError):
+            move_closure(Location, root.pk, Location.objects.filter(tn_level=3).first().pk)
+
+    def test_subtree_is_a_subquery(self):
+        root = build_location_tree(200)
+        Item.objects.bulk_create(Item(name=f"Item {i}", location_id=pk) for i, pk in enumerate(root.subtree_pks))
+        with override_settings(INVENTORY_TREE_BACKEND="inventory.trees.ClosureTableBackend"):
+            root = Location.objects.get(pk=root.pk)
+            with CaptureQueriesContext(connection) as ctx:
+                self.assertEqual(Item.objects.filter(location__in=root.subtree_pks).count(), 201)
+        self.assertEqual(len(ctx.captured_queries), 1)
+        self.assertIn("inventory_locationclosure", ctx.captured_queries[0]["sql"])
+
+    @override_settings(INVENTORY_TREE_BACKEND="inventory.trees.ClosureTableBackend")
+    def test_item_counters(self):
+        root = build_location_tree(30)
+        drawer = Location.objects.filter(tn_level=3).first()
+        Item.objects.create(name="Screwdriver", location=drawer)
+        Item.objects.bulk_create(Item(name=f"Screw {i}", location=drawer) for i in range(3))
+        root.refresh_from_db()
+        self.assertEqual((root.items_count, root.subtree_items_count), (0, 4))
+        self.assertEqual(Location.objects.get(pk=drawer.tn_parent_id).subtree_items_count, 4)
+
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+class ExportTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_superuser("admin", "admin@example.com", "admin")
+        self.client.force_login(self.user)
+        cabinet = Location.objects.create(name="Cabinet", locator="CAB")
+        drawer = Location.objects.create(tn_parent=cabinet, name="Drawer", locator="D3")
+        food = Category.objects.create(name="Food")
+        pasta = Category.objects.create(tn_parent=food, name="Pasta")
+        Item.objects.create(name="Spaghetti", location=drawer, category=pasta, expiration=datetime.date(2030, 1, 2))
+        Item.objects.create(name="Screws, small", location=cabinet, amount=30, description="M3")
+
+    @staticmethod
+    def content(response) -> str:
+        return b"".join(response.streaming_content).decode()
+
+    def test_export_view_csv(self):
+        response = self.client.get("/inventory/item/export/", {"_format": "csv"})
+        self.assertEqual(response["Content-Type"], "text/csv")
+        rows = list(csv.reader(io.StringIO(self.content(response))))
+        self.assertEqual(rows[0], list(EXPORT_FIELDS))
+        self.assertEqual(sorted(row[1:] for row in rows[1:]), [
+            ["Screws, small", "M3", "30", "pieces", "CAB", "", ""],
+            ["Spaghetti", "", "1", "pieces", "CAB/D3", "Food/Pasta", "2030-01-02"],
+        ])
+
+    def test_export_view_uses_changelist_filters(self):
+        drawer = Location.objects.get(locator="D3")
+        response = self.client.get("/inventory/item/export/", {"_format": "ndjson", "location": drawer.pk})
+        rows = [json.loads(line) for line in self.content(response).splitlines()]
+        self.assertEqual([row["name"] for row in rows], ["Spaghetti"])
+        self.assertEqual(rows[0]["expiration"], "2030-01-02")
+
+        response = self.client.get("/inventory/item/export/", {"_format": "ndjson", "q": "screws"})
+        self.assertEqual([json.loads(line)["name"] for line in self.content(response).splitlines()],
+                         ["Screws, small"])
+
+    def test_export_view_queries(self):
+        drawer = Location.objects.get(locator="D3")
+        self.client.get("/inventory/item/")  # Session and user queries
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get("/inventory/item/export/", {"location": drawer.pk})
+            self.content(response)
+        # Neither the rows are counted nor the choices of the filters looked up
+        sql = [q["sql"] for q in queries.captured_queries]
+        self.assertFalse([s for s in sql if "COUNT(" in s or "DISTINCT" in s], sql)
+
+    def test_export_action(self):
+        item = Item.objects.get(name="Spaghetti")
+        response = self.client.post("/inventory/item/", {"action": "export_ndjson", ACTION_CHECKBOX_NAME: [item.pk]})
+        self.assertEqual([json.loads(line)["id"] for line in self.content(response).splitlines()], [item.pk])
+
+    def test_export_command(self):
+        out = io.StringIO()
+        call_command("export_inventory", "--format", "ndjson", "--filter", "q=spaghetti", stdout=out)
+        self.assertEqual([json.loads(line)["location"] for line in out.getvalue().splitlines()], ["CAB/D3"])
+
+    def test_changelist_links(self):
+        response = self.client.get("/inventory/item/", {"q": "screws"})
+        self.assertContains(response, "/inventory/item/export/?q=screws&amp;_format=csv")
+
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+class ImportTests(TestCase):
+    CSV = (
+        "id,name,description,amount,unit,location,category,expiration\n"
+        "1,Spaghetti,,3,pieces,LR/CAB/D3,Food/Pasta,2030-01-02\n"
+        "2,Screws,M3,30,pieces,LR / CAB,,\n"
+        "3,,,,,LR,,\n"
+        "4,Penne,,many,pieces,LR/CAB/D3,Food/Pasta,\n"
+        "5,Rice,,1,kilograms,KITCHEN,Food,not a date\n"
+    )
+
+    def setUp(self):
+        self.living_room = Location.objects.create(name="Living room", locator="LR")
+
+    def test_import_csv(self):
+        result = import_items(io.StringIO(self.CSV), "csv", batch_size=1)
+        self.assertEqual((result.rows, result.created_items), (5, 2))
+        self.assertEqual([line for line, _ in result.errors], [4, 5, 6])
+        self.assertEqual((result.created_locations, result.created_categories), (2, 2))
+
+        spaghetti = Item.objects.get(name="Spaghetti")
+        self.assertEqual(spaghetti.location.full_locator, "LR/CAB/D3")
+        self.assertEqual(spaghetti.category.full_name, "Food/Pasta")
+        self.assertEqual(spaghetti.expiration, datetime.date(2030, 1, 2))
+        self.assertEqual(Item.objects.get(name="Screws").location, spaghetti.location.tn_parent)
+
+        self.living_room.refresh_from_db()
+        self.assertEqual(self.living_room.subtree_items_count, 2)
+        self.assertEqual(Category.objects.get(full_name="Food").subtree_items_count, 1)
+
+    def test_import_ndjson(self):
+        lines = [
+            json.dumps({"name": "Spaghetti", "location": "LR/CAB", "category": "Food", "amount": 2}),
+            "",
+            "not json",
+            json.dumps({"name": "Penne", "location": "LR/CAB", "unit": "boxes"}),
+        ]
+        result = import_items(io.StringIO("\n".join(lines)), "ndjson")
+        self.assertEqual(result.created_items, 1)
+        self.assertEqual([line for line, _ in result.errors], [3, 4])
+        self.assertEqual(Item.objects.get().location.full_locator, "LR/CAB")
+
+    def test_import_round_trips_export(self):
+        import_items(io.StringIO(self.CSV), "csv")
+        out = io.StringIO()
+        call_command("export_inventory", "--format", "csv", stdout=out)
+        Item.objects.all().delete()
+
+        result = import_items(io.StringIO(out.getvalue()), "csv")
+        self.assertEqual((result.created_items, result.created_locations, result.errors), (2, 0, []))
+
+    def test_dry_run(self):
+        result = import_items(io.StringIO(self.CSV), "csv", dry_run=True)
+        self.assertEqual(result.created_items, 2)
+        self.assertFalse(Item.objects.exists())
+        self.assertEqual(Location.objects.count(), 1)
+
+    def test_batched_queries(self):
+        rows = "".join(f"{i},Item {i},,1,pieces,LR/S{i % 10},,\n" for i in range(1000))
+        with CaptureQueriesContext(connection) as ctx:
+            result = import_items(io.StringIO(self.CSV.splitlines(True)[0] + rows), "csv", batch_size=500)
+        self.assertEqual(result.created_items, 1000)
+        self.assertLess(len(ctx.captured_queries), 50)
+
+    def test_import_command(self):
+        out, err = io.StringIO(), io.StringIO()
+        with mock.patch("sys.stdin", io.TextIOWrapper(io.BytesIO(self.CSV.encode()))):
+            call_command("import_inventory", "-", "--format", "csv", "--dry-run", stdout=out, stderr=err)
+        self.assertIn("Would import 2 of 5 items", out.getvalue())
+        self.assertIn("Line 4: Missing name", err.getvalue())
+
+    def test_import_view(self):
+        self.client.force_login(User.objects.create_superuser("admin", "admin@example.com", "admin"))
+        response = self.client.post("/inventory/item/import/", {
+            "file": SimpleUploadedFile("items.csv", self.CSV.encode()), "format": "",
+        })
+        self.assertContains(response, "Missing name")
+        self.assertEqual(Item.objects.count(), 2)
+
+        response = self.client.get("/inventory/item/")
+        self.assertContains(response, "/inventory/item/import/")
+
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+class LocationJumpTests(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser("admin", "admin@example.com", "admin"))
+        cabinet = Location.objects.create(name="Cabinet", locator="CAB")
+        self.drawer = Location.objects.create(tn_parent=cabinet, name="Drawer", locator="D3")
+
+    def test_jump_to_location(self):
+        response = self.client.get("/inventory/location/jump/", {"locator": "CAB/D3"})
+        self.assertRedirects(response, f"/inventory/location/{self.drawer.pk}/change/")
+
+        response = self.client.get("/inventory/location/jump/", {"locator": "CAB/D3", "to": "items"})
+        self.assertRedirects(response, f"/inventory/item/?location={self.drawer.pk}")
+
+    def test_jump_not_found(self):
+        response = self.client.get("/inventory/location/jump/", {"locator": "CAB/D4"}, follow=True)
+        self.assertContains(response, "No location at &quot;CAB/D4&quot;")
+        self.assertContains(response, 'id="jump-locator"')
+
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+class ItemSearchTests(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser("admin", "admin@example.com", "admin"))
+        self.cabinet = Location.objects.create(name="Cabinet", locator="CAB")
+        drawer = Location.objects.create(tn_parent=self.cabinet, name="Drawer", locator="D3")
+        tools = Category.objects.create(name="Tools")
+        self.screwdriver = Item.objects.create(name="Screwdriver", location=drawer, category=tools)
+        self.screws = Item.objects.create(name="Screws M3", location=self.cabinet, description="For the screwdriver")
+        self.tape = Item.objects.create(name="Duct tape", description="Grey, 50m")
+
+    def search(self, term):
+        response = self.client.get("/inventory/item/", {"q": term})
+        self.assertEqual(response.status_code, 200)
+        return list(response.context["cl"].result_list)
+
+    def test_search_fields(self):
+        self.assertEqual(self.search("grey"), [self.tape])
+        self.assertEqual(self.search("tools"), [self.screwdriver])
+        self.assertEqual(self.search("cab d3"), [self.screwdriver])
+        self.assertEqual(self.search('m3 "'), [self.screws])
+
+    def test_ranking(self):
+        # Matches in the name come before the ones in the description
+        self.assertEqual(self.search("screwdriver"), [self.screwdriver, self.screws])
+        response = self.client.get("/inventory/item/", {"q": "screwdriver", "o": "-1"})
+        self.assertEqual(len(response.context["cl"].result_list), 2)
+
+    def test_index_follows_changes(self):
+        self.cabinet.locator = "CUP"
+        self.cabinet.save()
+        self.assertEqual(self.search("cup/d3"), [self.screwdriver])
+
+        Item.objects.filter(pk=self.tape.pk).update(location=self.cabinet)
+        self.assertEqual(self.search("duct cup"), [self.tape])
+
+        self.screws.delete()
+        self.assertEqual(self.search("screw"), [self.screwdriver])
+
+    def test_fallback_without_index(self):
+        with mock.patch("inventory.admin.fts_available", return_value=False):
+            self.assertEqual(self.search("grey"), [])
+            self.assertEqual(self.search("screws"), [self.screws])
+
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+class AutocompleteTests(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser("admin", "admin@example.com", "admin"))
+        self.root = build_location_tree(300)
+        build_category_tree(300)
+        self.item = Item.objects.create(name="Screwdriver", location=self.root)
+
+    def autocomplete(self, field_name, term, page=1):
+        response = self.client.get("/autocomplete/", {
+            "app_label": "inventory", "model_name": "item", "field_name": field_name, "term": term, "page": page,
+        })
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_search_by_path(self):
+        data = self.autocomplete("location", "R/S")
+        self.assertTrue(data["pagination"]["more"])
+        self.assertEqual(len(data["results"]), 20)
+        self.assertTrue(all(r["text"].startswith("R/S") for r in data["results"]))
+
+        drawer = Location.objects.get(locator="D133")
+        self.assertEqual(self.autocomplete("location", "R/S13/D133")["results"], [
+            {"id": str(drawer.pk), "text": "R/S13/D133"}])
+
+    def test_action_pages_do_not_render_all_choices(self):
+        for action, field in (("move_to_other_location", "new_location"), ("change_category", "new_category")):
+            with CaptureQueriesContext(connection) as ctx:
+                response = self.client.post("/inventory/item/", {
+                    "action": action, ACTION_CHECKBOX_NAME: [self.item.pk],
+                })
+            self.assertContains(response, f'name="{field}"')
+            self.assertContains(response, "admin-autocomplete")
+            self.assertNotContains(response, "R/S13/D13")
+            self.assertLess(len(ctx.captured_queries), 15)
+
+    def test_item_change_form(self):
+        response = self.client.get(f"/inventory/item/{self.item.pk}/change/")
+        self.assertContains(response, 'data-field-name="location"')
+        self.assertContains(response, 'data-field-name="category"')
+        self.assertContains(response, '<option value="%d" selected>R</option>' % self.root.pk, html=True)
+        self.assertNotContains(response, "R/S13/D13")
+
+
+class RecordingSink(Sink):
+    def __init__(self):
+        self.runs = []
+
+    def send(self, digests):
+        self.runs.append(digests)
+
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+class ExpirationDigestTests(TestCase):
+    def setUp(self):
+        self.today = datetime.date(2030, 1, 10)
+        self.admin = User.objects.create_superuser("admin", "admin@example.com", "admin")
+        self.viewer = User.objects.create_user("viewer")
+        self.viewer.user_permissions.add(Permission.objects.get(codename="view_item"))
+        User.objects.create_user("other", "other@example.com")
+        drawer = Location.objects.create(name="Drawer", locator="D")
+        self.milk = Item.objects.create(name="Milk", location=drawer, expiration=datetime.date(2030, 1, 8))
+        self.eggs = Item.objects.create(name="Eggs", expiration=datetime.date(2030, 1, 12))
+        Item.objects.create(name="Rice", expiration=datetime.date(2031, 1, 1))
+        Item.objects.create(name="Salt")
+        self.sink = RecordingSink()
+
+    def digest(self, days=0, **kwargs):
+        return send_expiration_digest(self.today + datetime.timedelta(days=days), [self.sink], **kwargs)
+
+    def notified(self):
+        return [[(digest.user.username, [(item.name, status) for item, status in digest.entries])
+                 for digest in digests] for digests in self.sink.runs]
+
+    def test_incremental_digests(self):
+        result = self.digest()
+        self.assertEqual((result.changes, result.digests), ({"due": 1, "expired": 1}, 2))
+        entries = [("Milk", "expired"), ("Eggs", "due")]
+        self.assertEqual(self.notified(), [[("admin", entries), ("viewer", entries)]])
+
+        # Nothing changed
+        self.assertEqual(self.digest().digests, 0)
+        self.assertEqual(len(self.sink.runs), 1)
+
+        # Eggs expire, milk is thrown away and rice is not due yet
+        self.milk.delete()
+        self.assertEqual(str(self.digest(days=3)), "1 newly expired, 0 expiring soon, 0 cleared, 2 digests sent")
+        self.assertEqual(self.notified()[1][0], ("admin", [("Eggs", "expired")]))
+
+        # A new date is notified again, removing it clears the reminder
+        Item.objects.filter(pk=self.eggs.pk).update(expiration=datetime.date(2030, 1, 15))
+        self.assertEqual(self.digest(days=3).changes, {"due": 1, "expired": 0})
+        self.assertEqual(self.notified()[-1][0], ("admin", [("Eggs", "due")]))
+        Item.objects.filter(pk=self.eggs.pk).update(expiration=None)
+        self.assertEqual(self.digest(days=3).cleared, 1)
+        self.assertFalse(ExpirationReminder.objects.exists())
+
+    def test_dry_run(self):
+        self.assertEqual(self.digest(dry_run=True).digests, 2)
+        self.assertEqual(self.sink.runs, [])
+        self.assertFalse(ExpirationReminder.objects.exists())
+
+    def test_failing_sink(self):
+        # State is saved before sending: the other sinks still get the digests, and nothing is sent twice to them
+        webhook = WebhookSink("http://localhost/hook")
+        with mock.patch("urllib.request.urlopen", side_effect=OSError), self.assertLogs("inventory.reminders", "ERROR"):
+            result = send_expiration_digest(self.today, [webhook, self.sink])
+        self.assertEqual((result.digests, result.failed_sinks), (2, 1))
+        self.assertTrue(str(result).endswith("2 digests sent, 1 sinks failed"))
+        self.assertEqual(len(self.sink.runs), 1)
+        self.assertEqual(self.digest().digests, 0)
+
+        # The failed sink gets its reminders on the next run, but not those of items changed meanwhile
+        Item.objects.filter(pk=self.eggs.pk).update(expiration=datetime.date(2030, 1, 14))
+        with mock.patch("urllib.request.urlopen") as urlopen:
+            result = send_expiration_digest(self.today, [webhook, self.sink])
+        self.assertEqual((result.changes["due"], result.retried, result.failed_sinks), (1, 1, 0))
+        items = json.loads(urlopen.call_args[0][0].data)["digests"][0]["items"]
+        self.assertEqual([(item["name"], item["expiration"]) for item in items],
+                         [("Milk", "2030-01-08"), ("Eggs", "2030-01-14")])
+        self.assertEqual(self.notified()[-1][0], ("admin", [("Eggs", "due")]))
+        self.assertFalse(UndeliveredReminder.objects.exists())
+
+    def test_undelivered_reminders_of_cleared_items(self):
+        with override_settings(INVENTORY_REMINDER_SINKS=[
+            {"NAME": "hook", "BACKEND": "inventory.reminders.WebhookSink", "OPTIONS": {"url": "http://localhost/hook"}},
+        ]), mock.patch("urllib.request.urlopen", side_effect=OSError), self.assertLogs("inventory.reminders"):
+            send_expiration_digest(self.today)
+        self.assertEqual(sorted(UndeliveredReminder.objects.values_list("sink", "reminder")),
+                         [("hook", self.milk.pk), ("hook", self.eggs.pk)])
+        self.milk.delete()
+        Item.objects.filter(pk=self.eggs.pk).update(expiration=None)
+        self.assertEqual(self.digest().cleared, 1)
+        self.assertFalse(UndeliveredReminder.objects.exists())
+
+    def test_only_changes_are_read(self):
+        Item.objects.bulk_create(Item(name=f"Old {i}", expiration=datetime.date(2020, 1, 1)) for i in range(50))
+        self.digest()
+        self.assertEqual(list(changed_items(self.today + datetime.timedelta(days=3))), [self.eggs])
+        with CaptureQueriesContext(connection) as ctx:
+            result = self.digest(days=3)
+        self.assertEqual(result.changes, {"due": 0, "expired": 1})
+        self.assertEqual(self.notified()[-1][0], ("admin", [("Eggs", "expired")]))
+        # Reminders are only read for the changed and cleared items
+        sql = [q["sql"] for q in ctx.captured_queries]
+        self.assertFalse([s for s in sql if 'FROM "inventory_expirationreminder"' in s and "WHERE" not in s], sql)
+
+    def test_sinks_implement_send(self):
+        with self.assertRaises(TypeError):
+            Sink()
+
+    def test_email_and_file_sinks(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, "reminders.ndjson")
+        with override_settings(INVENTORY_REMINDER_SINKS=[
+            {"BACKEND": "inventory.reminders.EmailSink", "OPTIONS": {"from_email": "inventory@example.com"}},
+            {"BACKEND": "inventory.reminders.FileSink", "OPTIONS": {"path": path}},
+        ]), mock.patch("django.utils.timezone.localdate", return_value=self.today):
+            out = io.StringIO()
+            call_command("expiration_digest", stdout=out)
+        self.assertIn("2 digests sent", out.getvalue())
+
+        # The viewer has no email address
+        self.assertEqual([m.to for m in mail.outbox], [["admin@example.com"]])
+        self.assertEqual(mail.outbox[0].subject, "2 items expired or expiring soon")
+        self.assertIn("[expired] Milk - 2030-01-08 - D", mail.outbox[0].body)
+        with open(path) as f:
+            digests = [json.loads(line) for line in f]
+        self.assertEqual([d["user"] for d in digests], ["admin", "viewer"])
+        self.assertEqual(digests[0]["items"][0], {
+            "id": self.milk.pk, "name": "Milk", "expiration": "2030-01-08", "status": "expired", "location": "D"})
+
+    def test_webhook_sink(self):
+        with mock.patch("urllib.request.urlopen") as urlopen:
+            send_expiration_digest(self.today, [WebhookSink("http://localhost/hook")])
+        request = urlopen.call_args[0][0]
+        self.assertEqual(request.full_url, "http://localhost/hook")
+        self.assertEqual([d["user"] for d in json.loads(request.data)["digests"]], ["admin", "viewer"])
+
+    def test_dashboard(self):
+        self.client.force_login(self.admin)
+        with mock.patch("django.utils.timezone.localdate", return_value=self.today):
+            response = self.client.get("/")
+        self.assertContains(response, "2 items expired or expiring soon")
+        self.assertContains(response, "?expiration__lt=2030-01-17")
+        self.assertContains(response, f'<a href="/inventory/item/{self.eggs.pk}/change/">Eggs</a>', html=True)
+
+
+class SQLitePragmasTests(TestCase):
+    # Small cache, so that moving many items spills changes to the database file before the commit
+    pragmas = {"journal_mode": "wal", "synchronous": "normal", "busy_timeout": 0, "cache_size": 10}
+
+    def test_pragmas_applied(self):
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA busy_timeout")
+            self.assertEqual(cursor.fetchone()[0], settings.INVENTORY_SQLITE_PRAGMAS["busy_timeout"])
+
+    @staticmethod
+    def open_database(path):
+        db = SQLiteDatabaseWrapper({**connection.settings_dict, "NAME": path}, alias="stress")
+        db.ensure_connection()
+        return db
+
+    def read_during_move(self, pragmas, items=10000):
+        """Count the items in a location while another connection is moving all of them out of it."""
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, "db.sqlite3")
+
+        with override_settings(INVENTORY_SQLITE_PRAGMAS=pragmas):
+            db = self.open_database(path)
+            with db.cursor() as cursor:
+                cursor.execute("CREATE TABLE inventory_item "
+                               "(id INTEGER PRIMARY KEY, name VARCHAR(200), location_id INTEGER)")
+                cursor.execute("CREATE INDEX inventory_item_location_id ON inventory_item (location_id)")
+                cursor.executemany("INSERT INTO inventory_item (name, location_id) VALUES (%s, 1)",
+                                   [(f"Item {i}",) for i in range(items)])
+
+            moved, read_done = threading.Event(), threading.Event()
+
+            def move():
+                writer = self.open_database(path)
+                writer.set_autocommit(False)
+                with writer.cursor() as cursor:
+                    for start in range(1, items + 1, 500):
+                        cursor.execute("UPDATE inventory_item SET location_id = 2 WHERE id BETWEEN %s AND %s",
+                                       [start, start + 499])
+                moved.set()
+                read_done.wait(10)
+                writer.commit()
+                writer.close()
+
+            thread = threading.Thread(target=move)
+            thread.start()
+            try:
+                moved.wait(10)
+                with db.cursor() as cursor:
+                    cursor.execute("SELECT COUNT(*) FROM inventory_item WHERE location_id = 1")
+                    return cursor.fetchone()[0]
+            finally:
+                read_done.set()
+                thread.join()
+                db.close()
+
+    def test_readers_not_blocked_by_move(self):
+        self.assertEqual(self.read_during_move(self.pragmas), 10000)
+
+    def test_readers_blocked_without_wal(self):
+        with self.assertRaisesMessage(OperationalError, "database is locked"):
+            self.read_during_move({**self.pragmas, "journal_mode": "delete"})
+
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage',
+                   INVENTORY_PERFORMANCE_FLUSH_INTERVAL=0)
+class PerformanceMiddlewareTests(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser("admin", "admin@example.com", "admin"))
+        self.async_client.force_login(User.objects.get(username="admin"))
+        Item.objects.create(name="Screwdriver", location=Location.objects.create(name="Root", locator="R"))
+
+    @override_settings(INVENTORY_PERFORMANCE_FLUSH_INTERVAL=3600)
+    def test_server_timing_header(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get("/inventory/item/")
+        self.assertEqual(response.status_code, 200)
+        timing = response["Server-Timing"]
+        self.assertRegex(timing, r'^db;dur=[\d.]+;desc="\d+ queries, \d+ duplicate", app;dur=[\d.]+, total;dur=[\d.]+$')
+        queries = int(re.search(r'"(\d+) queries', timing).group(1))
+        self.assertEqual(queries, len(ctx.captured_queries))
+        self.assertFalse(RequestProfile.objects.exists())
+
+    def test_profiles_by_view_and_filters(self):
+        for params in ({}, {"p": 1}, {"location": 1, "o": "1"}, {"location": 1, "q": "screw", "utm_source": "x"}):
+            self.client.get("/inventory/item/", params)
+
+        profiles = {(p.view, p.filters): p for p in RequestProfile.objects.all()}
+        self.assertEqual(profiles[("admin:inventory_item_changelist", "")].requests, 2)
+        self.assertEqual(profiles[("admin:inventory_item_changelist", "location")].requests, 1)
+        profile = profiles[("admin:inventory_item_changelist", "location,q")]
+        self.assertEqual(profile.requests, 1)
+        self.assertGreater(profile.queries, 0)
+        self.assertGreater(profile.total_time, profile.db_time)
+        self.assertGreaterEqual(profile.max_time, profile.total_time)
+
+    def test_only_staff_and_known_filters(self):
+        self.client.get("/inventory/item/", {"amount": 2, "expiration__lt": "2030-01-01", "made_up": 1})
+        self.client.logout()
+        self.client.get("/inventory/item/", {"anonymous": 1})
+        self.client.force_login(User.objects.create_user("user"))
+        self.client.get("/api/items/", {"other": 1})
+        self.assertEqual(list(RequestProfile.objects.values_list("view", "filters")),
+                         [("admin:inventory_item_changelist", "amount,expiration__lt")])
+
+    @override_settings(INVENTORY_PERFORMANCE_MAX_PROFILES=2)
+    def test_max_profiles(self):
+        for name in ("amount", "location", "expiration__isnull"):
+            self.client.get("/inventory/item/", {name: 1})
+        # Known ones are still counted
+        self.assertEqual(sorted(RequestProfile.objects.values_list("filters", flat=True)), ["amount", "location"])
+        self.client.get("/inventory/item/", {"amount": 2})
+        self.assertEqual(RequestProfile.objects.get(filters="amount").requests, 2)
+
+    def test_duplicate_queries(self):
+        recorder = QueryRecorder()
+        with connection.execute_wrapper(recorder):
+            for pk in (1, 2, 1):
+                list(Item.objects.filter(pk=pk))
+        self.assertEqual((recorder.count, recorder.duplicates), (3, 1))
+
+    def test_performance_page(self):
+        self.client.get("/inventory/item/", {"location": 1})
+        response = self.client.get("/inventory/requestprofile/")
+        self.assertContains(response, "admin:inventory_item_changelist")
+        self.assertContains(response, " ms")
+        self.assertEqual(self.client.get("/inventory/requestprofile/add/").status_code, 403)
+
+    @override_settings(INVENTORY_PERFORMANCE_MONITOR=False)
+    def test_disabled(self):
+        response = self.client.get("/inventory/item/")
+        self.assertNotIn("Server-Timing", response)
+        self.assertFalse(RequestProfile.objects.exists())
+
+    @override_settings(INVENTORY_PERFORMANCE_FLUSH_INTERVAL=3600)
+    async def test_asgi(self):
+        # The middleware runs async, the queries of the view in the thread for sync code
+        response = await self.async_client.get("/inventory/item/")
+        self.assertEqual(response.status_code, 200)
+        self.assertRegex(response["Server-Timing"], r'^db;dur=[\d.]+;desc="[1-9]\d* queries')
+
+
+@override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+class BenchmarkTests(TestCase):
+    def generate(self, seed=0):
+        for _created in generate_inventory(200, location_depth=2, location_fanout=3, category_depth=2,
+                                           category_fanout=2, seed=seed, batch_size=64):
+            pass
+        return list(Item.objects.order_by("pk").values_list("name", "amount", "location__full_locator",
+                                                            "category__full_name", "expiration"))
+
+    def test_generate_inventory(self):
+        items = self.generate()
+        self.assertEqual(len(items), 200)
+        self.assertEqual(Location.objects.count(), 3 + 9)
+        self.assertEqual(Category.objects.count(), 2 + 4)
+        self.assertEqual(Location.objects.get(full_locator="A0").subtree_items_count,
+                         sum(1 for item in items if item[2].startswith("A0/")))
+
+        with transaction.atomic():
+            Item.objects.all().delete()
+            Location.objects.all().delete()
+            Category.objects.all().delete()
+            self.assertEqual(self.generate(), items)
+            transaction.set_rollback(True)
+
+    def test_generate_command_needs_empty_database(self):
+        Location.objects.create(name="Root", locator="R")
+        with self.assertRaises(CommandError):
+            call_command("generate_inventory", items=10, stdout=io.StringIO())
+
+    def test_run_benchmarks(self):
+        self.generate()
+        locations = Location.objects.count()
+        report = run_benchmarks(default_cases(action_size=10), repeat=1, warmup=0)
+
+        self.assertEqual(report["dataset"], {"items": 200, "locations": locations, "categories": 6})
+        self.assertIn("item_changelist_location", {result["name"] for result in report["results"]})
+        for result in report["results"]:
+            self.assertIn(result["status"], (200, 302), result["name"])
+            self.assertGreater(result["queries"], 0)
+        # Actions were rolled back
+        self.assertEqual(Location.objects.count(), locations)
+        self.assertFalse(User.objects.filter(username="benchmark").exists())
+        json.dumps(report)
+
+        slower = {**report, "results": [{**report["results"][0], "median_ms": report["results"][0]["median_ms"] * 2}]}
+        self.assertTrue(compare_reports(report, slower)[0]["regression"])
+        self.assertFalse(compare_reports(slower, report)[0]["regression"])
+
+    def test_run_comparisons(self):
+        self.generate()
+        # Both implementations of a comparison do the same thing, the legacy one repeated locations once per item
+        self.assertEqual([sorted(choices) for choices in item_filter_lookups()],
+                         [sorted(set(choices)) for choices in legacy_item_filter_lookups()])
+
+        data = item_import_comparison(30).prepare(None)
+        imported = []
+        for implementation in (import_items, legacy_import_items):
+            with transaction.atomic():
+                implementation(io.StringIO(data), "csv")
+                imported.append(list(Item.objects.order_by("pk").values_list(
+                    "name", "amount", "location__full_locator", "category__full_name")))
+                transaction.set_rollback(True)
+        self.assertEqual(imported[0], imported[1])
+
+        locations = list(Item.objects.order_by("pk").values_list("location", flat=True))
+        counters = list(Location.objects.order_by("pk").values_list("items_count", "subtree_items_count"))
+        results = run_comparisons(default_comparisons(move_size=100, import_rows=50))
+        self.assertEqual([result["name"] for result in results],
+                         ["item_filter_lookups", "item_move_100", "item_import_50", "tree_changelists_cold"])
+        # Tree snapshots are not used inside the transaction of the test
+        for result in results[:-1]:
+            self.assertLess(result["current_queries"], result["legacy_queries"], result["name"])
+        # Moves were undone
+        self.assertEqual(list(Item.objects.order_by("pk").values_list("location", flat=True)), locations)
+        self.assertEqual(list(Location.objects.order_by("pk").values_list("items_count", "subtree_items_count")),
+                         counters)
+        self.assertFalse(LogEntry.objects.exists())
+        # Imports were rolled back
+        self.assertEqual(Item.objects.count(), 200)
+        self.assertFalse(User.objects.filter(username="benchmark").exists())
+
+
+class TableVersionsTests(TestCase):
+    def setUp(self):
+        location = Location.objects.create(name="Drawer", locator="D")
+        Item.objects.bulk_create(Item(name=f"Item {i}", location=location) for i in range(300))
+
+    @staticmethod
+    def version():
+        return TableVersion.objects.get(table_name="inventory_item").version
+
+    def test_bumped_once_per_statement(self):
+        version = self.version()
+        self.assertEqual(Item.objects.update(amount=F("amount") + 1), 300)
+        self.assertEqual(self.version(), version + 1)
+        with connection.cursor() as cursor:
+            cursor.execute("UPDATE inventory_item SET amount = 2 WHERE amount > %s", [0])
+            self.assertEqual(cursor.rowcount, 300)
+        self.assertEqual(self.version(), version + 2)
+
+        # Other tables and reads don't count
+        list(Item.objects.all())
+        Location.objects.update(description="Changed")
+        self.assertEqual(self.version(), version + 2)
+
+
+class ApiTests(TestCase):
+    def setUp(self):
+        self.client.force_login(User.objects.create_superuser("admin", "admin@example.com", "admin"))
+        self.root = build_location_tree(30)
+        self.shelf = Location.objects.get(full_locator="R/S0")
+        self.category = Category.objects.create(name="Tools")
+        Item.objects.bulk_create(
+            Item(name=f"Item {i}", location=self.shelf, category=self.category if i % 2 else None)
+            for i in range(25))
+        self.items = list(Item.objects.order_by("pk"))
+
+    def get(self, url, status=200, **params):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, status, response.content)
+        return response.json()
+
+    def test_item_pages(self):
+        seen = []
+        url, params = "/api/items/", {"limit": 10, "fields": "id,name,location_path"}
+        while url:
+            data = self.get(url, **params)
+            seen += data["results"]
+            url, params = data["next"], {}
+        self.assertEqual(seen, [{"id": item.pk, "name": item.name, "location_path": "R/S0"} for item in self.items])
+
+        data = self.get("/api/items/", category=self.category.pk, limit=5)
+        self.assertEqual(len(data["results"]), 5)
+        self.assertEqual(data["results"][0]["category_path"], "Tools")
+        self.assertIsNone(data["previous"])
+        data = self.get(data["next"])
+        self.assertEqual(self.get(data["previous"])["results"][0]["id"], self.items[1].pk)
+
+    def test_item_detail(self):
+        item = self.items[1]
+        self.assertEqual(self.get(f"/api/items/{item.pk}/"), {
+            "id": item.pk, "name": "Item 1", "description": "", "amount": 1, "unit": "pieces",
+            "location": self.shelf.pk, "location_path": "R/S0", "category": self.category.pk,
+            "category_path": "Tools", "expiration": None,
+        })
+        self.get("/api/items/0/", status=404)
+        self.assertIn("colour", self.get("/api/items/", status=400, fields="name,colour")["error"])
+        self.get("/api/items/", status=400, cursor="garbage")
+
+    def test_location_subtree(self):
+        data = self.get(f"/api/locations/{self.root.pk}/", subtree=1, fields="full_locator,level,items_count")
+        self.assertEqual(data["full_locator"], "R")
+        self.assertEqual([child["full_locator"] for child in data["children"]], ["R/S0", "R/S1", "R/S2"])
+        self.assertEqual(data["children"][0]["items_count"], 25)
+        drawers = data["children"][0]["children"]
+        self.assertEqual({d["level"] for d in drawers}, {3})
+        self.assertEqual(len(drawers) + sum(len(c["children"]) for c in data["children"][1:]), 27)
+
+        children = self.get("/api/locations/", parent=self.root.pk, fields="full_locator")["results"]
+        self.assertEqual(children, [{"full_locator": f"R/S{i}"} for i in range(3)])
+        self.assertEqual(len(self.get("/api/locations/", descendants=self.shelf.pk)["results"]), 10)
+        self.assertEqual(self.get("/api/categories/", parent="")["results"][0]["full_name"], "Tools")
+
+    def test_conditional_get(self):
+        response = self.client.get("/api/items/")
+        etag, last_modified = response["ETag"], response["Last-Modified"]
+
+        # Session, user and table versions
+        with self.assertNumQueries(3):
+            response = self.client.get("/api/items/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(self.client.get("/api/items/", HTTP_IF_MODIFIED_SINCE=last_modified).status_code, 304)
+
+        changes = [
+            lambda: Item.objects.filter(pk=self.items[0].pk).update(amount=F("amount") + 1),
+            lambda: Location.objects.filter(pk=self.shelf.pk).update(name="Renamed"),
+            lambda: Category.objects.create(name="Other"),
+            lambda: self.items[1].delete(),
+        ]
+        for change in changes:
+            change()
+            response = self.client.get("/api/items/", HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+            self.assertNotEqual(response["ETag"], etag)
+            etag = response["ETag"]
+
+        # Locations don't depend on items
+        response = self.client.get("/api/locations/")
+        Item.objects.filter(pk=self.items[2].pk).update(name="Renamed")
+        self.assertEqual(self.client.get("/api/locations/", HTTP_IF_NONE_MATCH=response["ETag"]).status_code, 304)
+
+    def test_permissions(self):
+        self.client.logout()
+        self.get("/api/items/", status=401)
+        user = User.objects.create_user("viewer")
+        self.client.force_login(user)
+        self.get("/api/items/", status=403)
+        user.user_permissions.add(Permission.objects.get(codename="view_item"))
+        self.get("/api/items/")
+        self.get("/api/locations/", status=403)
+        self.assertEqual(self.client.post("/api/items/").status_code, 405)
+
+
+class BatchApiTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_superuser("admin", "admin@example.com", "admin")
+        self.client.force_login(self.user)
+        self.shelf = Location.objects.create(name="Shelf", locator="S")
+        self.box = Location.objects.create(name="Box", locator="B", tn_parent=self.shelf)
+        self.bin = Location.objects.create(name="Bin", locator="BIN")
+        Item.objects.bulk_create(Item(name=f"Item {i}", amount=10, location=self.box) for i in range(300))
+        self.items = list(Item.objects.order_by("pk"))
+
+    def post(self, operations, status=200, key=None):
+        headers = {"HTTP_IDEMPOTENCY_KEY": key} if key else {}
+        response = self.client.post("/api/items/batch/", json.dumps({"operations": operations}),
+                                    content_type="application/json", **headers)
+        self.assertEqual(response.status_code, status, response.content)
+        return response
+
+    def test_apply(self):
+        data = self.post([
+            {"op": "adjust", "item": self.items[0].pk, "delta": -3},
+            {"op": "adjust", "item": self.items[0].pk, "delta": 1},
+            {"op": "adjust", "item": self.items[1].pk, "delta": 5},
+            {"op": "move", "item": self.items[1].pk, "location": self.bin.pk},
+            {"op": "move", "item": self.items[2].pk, "location": None},
+            {"op": "create", "name": "Screws", "amount": 100, "location": self.bin.pk, "expiration": "2030-01-01"},
+        ]).json()
+
+        self.assertEqual(data["adjusted"], 2)
+        self.assertEqual(data["moved"], 2)
+        screws = Item.objects.get(pk=data["created"][0])
+        self.assertEqual((screws.name, screws.amount, screws.location), ("Screws", 100, self.bin))
+        self.assertEqual(screws.expiration, datetime.date(2030, 1, 1))
+        self.assertEqual(Item.objects.get(pk=self.items[0].pk).amount, 8)
+        moved = Item.objects.get(pk=self.items[1].pk)
+        self.assertEqual((moved.amount, moved.location), (15, self.bin))
+        self.assertIsNone(Item.objects.get(pk=self.items[2].pk).location)
+
+        self.bin.refresh_from_db()
+        self.shelf.refresh_from_db()
+        self.assertEqual(self.bin.items_count, 2)
+        self.assertEqual(self.shelf.subtree_items_count, 298)
+        self.assertEqual(LogEntry.objects.filter(action_flag=ADDITION).count(), 1)
+        self.assertEqual(LogEntry.objects.exclude(action_flag=ADDITION).count(), 3)
+
+    def test_grouped_updates(self):
+        operations = [{"op": "adjust", "item": item.pk, "delta": 1 if i % 2 else -1}
+                      for i, item in enumerate(self.items)]
+        with CaptureQueriesContext(connection) as ctx:
+            self.post(operations)
+        updates = [q["sql"] for q in ctx.captured_queries if q["sql"].startswith('UPDATE "inventory_item"')]
+        self.assertEqual(len(updates), 2)
+        self.assertLess(len(ctx.captured_queries), 20)
+        self.assertEqual(sorted(Item.objects.values_list("amount", flat=True).distinct()), [9, 11])
+
+    def test_history_without_category_queries(self):
+        Category.objects.bulk_create(Category(name=f"Category {i}") for i in range(3))
+        categories = list(Category.objects.order_by("pk"))
+        Item.objects.filter(pk__in=[item.pk for item in self.items[:50]]).update(category=categories[0])
+        operations = [{"op": "create", "name": f"New {i}", "category": categories[i % 3].pk} for i in range(50)]
+        operations += [{"op": "adjust", "item": item.pk, "delta": 1} for item in self.items[:50]]
+        with CaptureQueriesContext(connection) as ctx:
+            self.post(operations)
+        self.assertLess(len(ctx.captured_queries), 30)
+        self.assertEqual(LogEntry.objects.filter(object_repr="Category 1: New 1").count(), 1)
+        self.assertEqual(LogEntry.objects.filter(object_repr="Category 0: Item 0 (x11)").count(), 1)
+
+    def test_invalid_batch_is_not_applied(self):
+        data = self.post([
+            {"op": "adjust", "item": self.items[0].pk, "delta": 1},
+            {"op": "adjust", "item": self.items[0].pk, "delta": "many"},
+            {"op": "move", "item": 0, "location": self.bin.pk},
+            {"op": "create", "amount": 3},
+            {"op": "explode"},
+        ], status=400).json()
+        self.assertEqual(set(data["operations"]), {"1", "2", "3", "4"})
+        self.assertIn("No item", data["operations"]["2"])
+        self.assertEqual(Item.objects.get(pk=self.items[0].pk).amount, 10)
+        self.post(list(range(501)), status=400)
+
+    def test_unused_keys_are_ignored(self):
+        self.post([
+            {"op": "adjust", "item": self.items[0].pk, "delta": 1, "location": [1], "category": 0},
+            {"op": "move", "item": self.items[1].pk, "location": self.bin.pk, "category": {"id": 1}},
+        ])
+        self.assertEqual(Item.objects.get(pk=self.items[0].pk).amount, 11)
+
+    def test_idempotency_key(self):
+        operations = [{"op": "adjust", "item": self.items[0].pk, "delta": -1}]
+        first = self.post(operations, key="retry-1")
+        second = self.post(operations, key="retry-1")
+        self.assertEqual(second.json(), first.json())
+        self.assertEqual(second["Idempotent-Replayed"], "true")
+        self.assertEqual(Item.objects.get(pk=self.items[0].pk).amount, 9)
+
+        self.post(operations, key="retry-2")
+        self.assertEqual(Item.objects.get(pk=self.items[0].pk).amount, 8)
+        self.post([{"op": "adjust", "item": self.items[0].pk, "delta": -5}], key="retry-1", status=422)
+
+        # Failed requests can be retried with the same key
+        self.post([{"op": "move", "item": 0, "location": None}], key="retry-3", status=400)
+        self.post(operations, key="retry-3")
+        self.assertEqual(Item.objects.get(pk=self.items[0].pk).amount, 7)
+
+    def test_permissions(self):
+        user = User.objects.create_user("viewer")
+        user.user_permissions.add(Permission.objects.get(codename="change_item"))
+        self.client.force_login(user)
+        self.post([{"op": "adjust", "item": self.items[0].pk, "delta": 1}])
+        self.post([{"op": "create", "name": "Screws"}], status=403)
+        self.client.logout()
+        self.post([], status=401)
+        self.assertEqual(self.client.get("/api/items/batch/").status_code, 405)
+
+    def test_token_authentication(self):
+        client = Client(enforce_csrf_checks=True)
+        token, key = ApiToken.create_token(self.user, "Station 1")
+        body = json.dumps({"operations": [{"op": "adjust", "item": self.items[0].pk, "delta": 1}]})
+
+        response = client.post("/api/items/batch/", body, content_type="application/json",
+                               HTTP_AUTHORIZATION=f"Bearer {key}")
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(client.get("/api/items/", HTTP_AUTHORIZATION=f"Bearer {key}").status_code, 200)
+        for header in (f"Bearer {key}x", f"Basic {key}", "Bearer"):
+            response = client.post("/api/items/batch/", body, content_type="application/json",
+                                   HTTP_AUTHORIZATION=header)
+            self.assertEqual(response.status_code, 401)
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(client.get("/api/items/", HTTP_AUTHORIZATION=f"Bearer {key}").status_code, 401)
+
+    def test_session_csrf_check(self):
+        client = Client(enforce_csrf_checks=True)
+        client.force_login(self.user)
+        body = json.dumps({"operations": [{"op": "adjust", "item": self.items[0].pk, "delta": 1}]})
+        response = client.post("/api/items/batch/", body, content_type="application/json")
+        self.assertEqual(response.status_code, 403)
+        self.assertIn("CSRF", response.json()["error"])
+
+        csrf_token = _get_new_csrf_token()
+        client.cookies[settings.CSRF_COOKIE_NAME] = csrf_token
+        response = client.post("/api/items/batch/", body, content_type="application/json",
+                               HTTP_X_CSRFTOKEN=csrf_token)
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(Item.objects.get(pk=self.items[0].pk).amount, 11)
+
+    def test_create_token_command(self):
+        out = io.StringIO()
+        call_command("create_api_token", "admin", "--name", "Station 2", stdout=out)
+        token = ApiToken.authenticate(out.getvalue().strip())
+        self.assertEqual((token.name, token.user), ("Station 2", self.user))
+        with self.assertRaises(CommandError):
+            call_command("create_api_token", "nobody")
+
+
+@override_settings(WHITENOISE_USE_FINDERS=True, WHITENOISE_AUTOREFRESH=True,
+                   STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+class AsgiTests(TransactionTestCase):
+    def setUp(self):
+        self.user = User.objects.create_superuser("admin", "admin@example.com", "admin")
+        location = Location.objects.create(name="Root", locator="R")
+        Item.objects.bulk_create(Item(name=f"Item {i}", location=location) for i in range(5))
+
+    def test_static_files(self):
+        sync_response = self.client.get("/static/admin/css/base.css")
+        async_response = async_to_sync(self.async_client.get)("/static/admin/css/base.css")
+        self.assertEqual((sync_response.status_code, async_response.status_code), (200, 200))
+        self.assertEqual(b"".join(async_response.streaming_content), b"".join(sync_response.streaming_content))
+
+    @override_settings(INVENTORY_ASYNC_VIEWS=True)
+    def test_api_view_in_worker_thread(self):
+        view = api.api_view(Item)(api.item_list.__wrapped__)
+        self.assertTrue(asyncio.iscoroutinefunction(view))
+        threads = []
+
+        def list_items(request):
+            threads.append(threading.get_ident())
+            return api.item_list.__wrapped__(request)
+
+        for factory in (RequestFactory(), AsyncRequestFactory()):
+            request = factory.get("/api/items/", {"fields": "name"})
+            request.user = self.user
+            response = async_to_sync(api.api_view(Item)(list_items))(request)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual([item["name"] for item in json.loads(response.content)["results"]],
+                             [f"Item {i}" for i in range(5)])
+        # Under ASGI the view runs in a worker thread of its own, with its own connection
+        self.assertEqual(threads[0], threading.get_ident())
+        self.assertNotEqual(threads[1], threading.get_ident())
+
+
+class TreeCacheTests(TransactionTestCase):
+    # Snapshots are only used outside transactions, like in the admin changelists
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        cache_settings = self.settings(INVENTORY_TREE_CACHE="trees", CACHES={
+            "default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"},
+            "trees": {"BACKEND": "django.core.cache.backends.filebased.FileBasedCache", "LOCATION": directory.name},
+        })
+        cache_settings.enable()
+        self.addCleanup(cache_settings.disable)
+        # Flushed by the previous transactional tests
+        for table in ("inventory_location", "inventory_category"):
+            TableVersion.objects.get_or_create(table_name=table, defaults={"modified": timezone.now()})
+
+        self.root = build_location_tree(30)
+        self.drawer = Location.objects.filter(tn_level=3).first()
+        self.labels = dict(Location.objects.values_list("pk", "full_locator"))
+        self.start_process()
+
+    def start_process(self):
+        """Forget the snapshots loaded so far, like a server process starting cold."""
+        tree_cache._snapshots.clear()
+
+    def start_request(self):
+        tree_cache.start_request()
+        self.addCleanup(tree_cache.end_request)
+
+    def test_cold_start(self):
+        self.assertEqual(Location.path_labels(), self.labels)
+        self.start_process()
+        self.start_request()
+        # Only the versions are read from the database, once
+        with self.assertNumQueries(1):
+            self.assertEqual(Location.path_labels(), self.labels)
+            self.assertEqual(Location.path_labels([self.drawer.pk], with_ancestors=True),
+                             {pk: self.labels[pk] for pk in (self.root.pk, self.drawer.tn_parent_id, self.drawer.pk)})
+            self.assertEqual(Location.path_labels([self.drawer.pk, 0]), {self.drawer.pk: self.labels[self.drawer.pk]})
+
+    def test_changes_made_by_other_processes(self):
+        self.assertEqual(Location.path_labels(), self.labels)
+        # Without calling `update_tree`, only the table versions know about it
+        Location.objects.filter(pk=self.drawer.pk).update(full_locator="Elsewhere")
+        self.assertEqual(Location.path_labels([self.drawer.pk]), {self.drawer.pk: "Elsewhere"})
+
+        # Versions are checked again on the next request
+        self.start_request()
+        Location.path_labels()
+        Location.objects.filter(pk=self.drawer.pk).update(full_locator="Somewhere else")
+        self.assertEqual(Location.path_labels([self.drawer.pk]), {self.drawer.pk: "Elsewhere"})
+        self.start_request()
+        self.assertEqual(Location.path_labels([self.drawer.pk]), {self.drawer.pk: "Somewhere else"})
+
+    def test_own_changes(self):
+        self.start_request()
+        self.assertEqual([node.pk for node in self.drawer.get_ancestors()], [self.root.pk, self.drawer.tn_parent_id])
+        with self.assertNumQueries(0):
+            ancestors = self.drawer.get_ancestors()
+        self.assertEqual([node.full_locator for node in ancestors], [self.labels[node.pk] for node in ancestors])
+
+        self.drawer.tn_parent = self.root
+        self.drawer.save()
+        self.drawer.refresh_from_db()
+        self.assertEqual([node.pk for node in self.drawer.get_ancestors()], [self.root.pk])
+        self.assertEqual(Location.path_labels([self.drawer.pk]), {self.drawer.pk: f"R/{self.drawer.locator}"})
+
+    def test_transactions(self):
+        with transaction.atomic():
+            self.assertIsNone(tree_cache.tree_snapshot(Location))
+            Location.objects.filter(pk=self.drawer.pk).update(full_locator="Elsewhere")
+            self.assertEqual(Location.path_labels([self.drawer.pk]), {self.drawer.pk: "Elsewhere"})
+            transaction.set_rollback(True)
+        self.assertEqual(Location.path_labels([self.drawer.pk]), {self.drawer.pk: self.labels[self.drawer.pk]})
+
+    def test_previous_snapshot_is_replaced(self):
+        cache = tree_cache.tree_cache()
+        first_key = tree_cache.tree_snapshot(Location).key
+        Location.objects.filter(pk=self.drawer.pk).update(full_locator="Elsewhere")
+        second_key = tree_cache.tree_snapshot(Location).key
+        self.assertNotEqual(first_key, second_key)
+        self.assertIsNone(cache.get(first_key))
+        self.assertEqual(cache.get(second_key).path_labels([self.drawer.pk]), {self.drawer.pk: "Elsewhere"})
+
+    @override_settings(INVENTORY_TREE_CACHE=None)
+    def test_disabled(self):
+        self.assertIsNone(tree_cache.tree_snapshot(Location))
+        self.assertEqual(Location.path_labels(), self.labels)
+
+
+class LoadTestTests(LiveServerTestCase):
+    def test_load_test(self):
+        result = load_test(f"{self.live_server_url}/api/items/", concurrency=4, requests=10)
+        self.assertEqual(result["statuses"], {"401": 10})
+        self.assertEqual(result["errors"], {})
+        self.assertLessEqual(result["min_ms"], result["p50_ms"])
+        self.assertLessEqual(result["p50_ms"], result["p99_ms"])
+        self.assertLessEqual(result["p99_ms"], result["max_ms"])
@@ -0,0 +1,127 @@
+"""Snapshots of the location and category trees, shared by all the server processes through a Django cache.
+
+treenode caches whole trees in each process, and only the process making a change refreshes its own copy. Snapshots
+are instead stored under keys made of the table versions (see `inventory.versions`), which any write bumps: every
+process picks up a change at its next version check, done once per request, and a process starting cold loads a tree
+with one cache read instead of a full-table query.
+"""
+import datetime
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple, Type
+
+from django.conf import settings
+from django.core.cache import caches, BaseCache
+from django.db import connections, models, router
+from treenode.utils import split_pks
+
+from inventory.versions import version_rows
+
+# Last snapshot loaded by this process, per model
+_snapshots: Dict[Type[models.Model], "TreeSnapshot"] = {}
+# Table versions read during the current request of each thread, per database
+_request = threading.local()
+
+
+class TreeSnapshot:
+    """Values of all the fields of all the nodes of a tree, as one picklable object."""
+
+    def __init__(self, model: Type[models.Model], key: str, rows: Iterable[tuple]):
+        self.model = model
+        self.key = key
+        self.attnames = [field.attname for field in model._meta.concrete_fields]
+        pk_index = self.attnames.index(model._meta.pk.attname)
+        self.rows: Dict[int, tuple] = {row[pk_index]: row for row in rows}
+
+    def node(self, pk: int, using: Optional[str] = None) -> Optional[models.Model]:
+        """New instance of a node, as loaded from the database, or None if it was not in the tree."""
+        row = self.rows.get(pk)
+        if row is None:
+            return None
+        return self.model.from_db(using or router.db_for_read(self.model), self.attnames, row)
+
+    def ancestors_pks(self, pk: int) -> List[int]:
+        row = self.rows.get(pk)
+        if row is None:
+            return []
+        return [int(ancestor_pk) for ancestor_pk in split_pks(row[self.attnames.index("tn_ancestors_pks")])]
+
+    def path_labels(self, pks: Optional[Iterable[int]] = None, with_ancestors: bool = False) -> Dict[int, str]:
+        """Same as `InventoryTreeNodeModel.path_labels`, without queries."""
+        path_index = self.attnames.index(self.model.path_cache_field)
+        if pks is None:
+            return {pk: row[path_index] for pk, row in self.rows.items()}
+
+        pks = {pk for pk in pks if pk in self.rows}
+        if with_ancestors:
+            pks.update(ancestor_pk for pk in list(pks) for ancestor_pk in self.ancestors_pks(pk))
+        return {pk: self.rows[pk][path_index] for pk in pks if pk in self.rows}
+
+
+def tree_cache() -> Optional[BaseCache]:
+    """The cache set in `INVENTORY_TREE_CACHE`, if any."""
+    alias = settings.INVENTORY_TREE_CACHE
+    return caches[alias] if alias else None
+
+
+def start_request():
+    """Read the table versions at most once until `end_request`, instead of on every access to a snapshot."""
+    _request.versions = {}
+
+
+def end_request():
+    _request.versions = None
+
+
+def forget_snapshots():
+    """Forget the snapshots loaded by this process, like a process starting cold."""
+    _snapshots.clear()
+
+
+def forget_versions():
+    """Read the table versions again on the next access, after changes made by this thread."""
+    if getattr(_request, "versions", None):
+        _request.versions = {}
+
+
+def _versions(using: str) -> Optional[Dict[str, Tuple[int, datetime.datetime]]]:
+    versions = getattr(_request, "versions", None)
+    if versions is None:
+        return version_rows(using=using)
+    if using not in versions:
+        versions[using] = version_rows(using=using)
+    return versions[using]
+
+
+def tree_snapshot(model: Type[models.Model]) -> Optional[TreeSnapshot]:
+    """Snapshot of the current tree of a model, or None if it must be read from the database.
+
+    That's the case without a tree cache, on databases where changes are not counted, and inside transactions: a
+    snapshot built there could hold changes that are never committed, and would be published to all the processes.
+    """
+    cache = tree_cache()
+    using = router.db_for_read(model)
+    if cache is None or connections[using].in_atomic_block:
+        return None
+    versions = _versions(using)
+    table = model._meta.db_table
+    if not versions or table not in versions:
+        return None
+
+    # The modification time tells apart databases restored or recreated with the same version counters
+    version, modified = versions[table]
+    key = f"inventory_tree:{table}:{version}:{modified.timestamp()}"
+    snapshot = _snapshots.get(model)
+    if snapshot is None or snapshot.key != key:
+        snapshot = cache.get(key)
+        if snapshot is None:
+            # Read after the version, so it can only be newer than the one in the key
+            rows = model.objects.using(using).values_list(*[f.attname for f in model._meta.concrete_fields])
+            snapshot = TreeSnapshot(model, key, rows)
+            # Whole trees are large, only the latest one is kept
+            latest_key = f"inventory_tree:{table}:latest"
+            previous_key = cache.get(latest_key)
+            cache.set_many({key: snapshot, latest_key: key})
+            if previous_key is not None and previous_key != key:
+                cache.delete(previous_key)
+        _snapshots[model] = snapshot
+    return snapshot
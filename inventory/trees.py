@@ -0,0 +1,199 @@
+"""How the structure of the location and category trees is read and stored, besides treenode's own fields.
+
+treenode denormalizes the ancestors and descendants of every node into comma-separated primary keys, rewritten on
+every change. Closure tables hold one row per node and ancestor instead: new nodes add O(depth) rows, moves rewrite
+only the rows of the moved subtree. They are written by the `save` and `delete` of the nodes and by
+`bulk_create_nodes` whichever backend is used, so that `INVENTORY_TREE_BACKEND` can be switched at any time. treenode
+still recomputes its own fields on every change of the tree structure, since the admin and the API order nodes by them.
+"""
+from collections import defaultdict
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple, Type, Union
+
+from django.conf import settings
+from django.db import models
+from django.utils.module_loading import import_string
+from treenode.utils import split_pks
+
+# A node instance, or a `values()` row of it
+Node = Union[models.Model, Dict[str, Any]]
+
+BATCH_SIZE = 500
+
+
+def _value(node: Node, field: str) -> Any:
+    return node[field] if isinstance(node, dict) else getattr(node, field)
+
+
+def closure_model(model: Type[models.Model]) -> Type[models.Model]:
+    return model._meta.get_field("closure_ancestors").related_model
+
+
+def closure_rows(parents: Dict[int, Optional[int]]) -> Iterator[Tuple[int, int, int]]:
+    """(ancestor, descendant, depth) rows of the tree where each node has the given parent."""
+    for pk in parents:
+        ancestor_pk, depth = pk, 0
+        while ancestor_pk is not None and depth <= len(parents):
+            yield ancestor_pk, pk, depth
+            ancestor_pk, depth = parents.get(ancestor_pk), depth + 1
+
+
+def insert_closure(model: Type[models.Model], parents: Dict[int, Optional[int]]):
+    """Add rows for new nodes, given with their parent, to the closure table: the rows of the parents are read."""
+    closure = closure_model(model)
+    parent_pks = list(set(parents.values()) - {None})
+    ancestors = defaultdict(list)
+    for i in range(0, len(parent_pks), BATCH_SIZE):
+        for ancestor_pk, descendant_pk, depth in (closure.objects.filter(descendant_id__in=parent_pks[i:i + BATCH_SIZE])
+                                                  .values_list("ancestor_id", "descendant_id", "depth")):
+            ancestors[descendant_pk].append((ancestor_pk, depth))
+
+    rows = []
+    for pk, parent_pk in parents.items():
+        rows.append(closure(ancestor_id=pk, descendant_id=pk, depth=0))
+        rows += [closure(ancestor_id=ancestor_pk, descendant_id=pk, depth=depth + 1)
+                 for ancestor_pk, depth in ancestors.get(parent_pk, ())]
+    closure.objects.bulk_create(rows, batch_size=BATCH_SIZE)
+
+
+def move_closure(model: Type[models.Model], pk: int, parent_pk: Optional[int]):
+    """Move the subtree of a node under a new parent in the closure table.
+
+    The rows linking the subtree to the old ancestors of the node are replaced by rows linking it to the new ones.
+    """
+    closure = closure_model(model)
+    subtree = list(closure.objects.filter(ancestor_id=pk).values_list("descendant_id", "depth"))
+    if parent_pk in {descendant_pk for descendant_pk, _depth in subtree}:
+        raise ValueError(f"Can't move {model._meta.verbose_name} {pk} below itself")
+
+    subtree_pks = closure.objects.filter(ancestor_id=pk).values("descendant_id")
+    closure.objects.filter(descendant_id__in=subtree_pks).exclude(ancestor_id__in=subtree_pks).delete()
+    if parent_pk is None:
+        return
+    new_ancestors = list(closure.objects.filter(descendant_id=parent_pk).values_list("ancestor_id", "depth"))
+    closure.objects.bulk_create(
+        (closure(ancestor_id=ancestor_pk, descendant_id=descendant_pk, depth=ancestor_depth + depth + 1)
+         for ancestor_pk, ancestor_depth in new_ancestors for descendant_pk, depth in subtree),
+        batch_size=BATCH_SIZE)
+
+
+def closure_parent(model: Type[models.Model], pk: int) -> Optional[int]:
+    """Parent of a node according to the closure table."""
+    return closure_model(model).objects.filter(descendant_id=pk, depth=1).values_list("ancestor_id", flat=True).first()
+
+
+def add_missing_closure(model: Type[models.Model]) -> int:
+    """Add the rows of the nodes missing from the closure table, i.e. inserted with `QuerySet.bulk_create`.
+
+    Found with one anti-join on the index of the descendants, and added from the top of the tree down so that the
+    ancestors of every node are there when it is added. Returns the number of added nodes.
+    """
+    rows = model.objects.filter(closure_ancestors=None).values_list("pk", "tn_parent_id", "tn_level")
+    new = defaultdict(dict)
+    for pk, parent_pk, level in rows:
+        new[level][pk] = parent_pk
+    for level in sorted(new):
+        insert_closure(model, new[level])
+    return sum(map(len, new.values()))
+
+
+def rebuild_closure(model: Type[models.Model]) -> int:
+    """Rebuild the closure table from the parent of each node, returning the number of rows."""
+    closure = closure_model(model)
+    closure.objects.all().delete()
+    rows = closure_rows(dict(model.objects.values_list("pk", "tn_parent_id")))
+    closure.objects.bulk_create((closure(ancestor_id=ancestor_pk, descendant_id=descendant_pk, depth=depth)
+                                 for ancestor_pk, descendant_pk, depth in rows), batch_size=BATCH_SIZE)
+    return closure.objects.count()
+
+
+class TreeBackend:
+    """Reads the subtrees and ancestors of the nodes of a tree model."""
+
+    # Fields of a node read by `subtree`, besides its primary key
+    node_fields: Tuple[str, ...] = ()
+
+    def subtree(self, model: Type[models.Model], node: Node, include_self: bool = True) -> Iterable[int]:
+        """Primary keys of the descendants of a node, usable in `__in` lookups."""
+        raise NotImplementedError
+
+    def ancestors(self, model: Type[models.Model], pks: Iterable[int]) -> Dict[int, List[int]]:
+        """Ancestors of each of the given nodes that exist, from the root down to the parent."""
+        raise NotImplementedError
+
+    def path_labels(self, model: Type[models.Model], pks: Optional[Iterable[int]],
+                    with_ancestors: bool) -> Dict[int, str]:
+        """Stored full path labels of the given nodes, or of all of them, and optionally of their ancestors."""
+        raise NotImplementedError
+
+
+class TreenodeBackend(TreeBackend):
+    """Parses the primary keys denormalized by treenode on every node: no extra query, but the descendants of a
+    node near the root are a long text read and split whole."""
+
+    node_fields = ("tn_descendants_pks",)
+
+    def subtree(self, model, node, include_self=True):
+        pks = [int(pk) for pk in split_pks(_value(node, "tn_descendants_pks"))]
+        return [_value(node, "pk")] + pks if include_self else pks
+
+    def ancestors(self, model, pks):
+        return {pk: [int(ancestor_pk) for ancestor_pk in split_pks(ancestors_pks)] for pk, ancestors_pks in
+                model.objects.filter(pk__in=set(pks)).values_list("pk", "tn_ancestors_pks")}
+
+    def path_labels(self, model, pks, with_ancestors):
+        fields = ("pk", "tn_ancestors_pks", model.path_cache_field)
+        if pks is None:
+            rows = model.objects.values_list(*fields)
+        else:
+            rows = model.objects.filter(pk__in=set(pks)).values_list(*fields)
+
+        labels = {}
+        ancestors_pks = set()
+        for pk, node_ancestors_pks, path in rows:
+            labels[pk] = path
+            ancestors_pks.update(map(int, split_pks(node_ancestors_pks)))
+
+        missing = ancestors_pks - labels.keys()
+        if with_ancestors and missing:
+            labels.update(model.objects.filter(pk__in=missing).values_list("pk", model.path_cache_field))
+        return labels
+
+
+class ClosureTableBackend(TreeBackend):
+    """Reads the closure tables, through their indexes: subtrees are subqueries on the ancestor, ancestors a range of
+    rows on the descendant."""
+
+    def subtree(self, model, node, include_self=True):
+        rows = closure_model(model).objects.filter(ancestor_id=_value(node, "pk"))
+        if not include_self:
+            rows = rows.filter(depth__gt=0)
+        return rows.values_list("descendant_id", flat=True)
+
+    def ancestors(self, model, pks):
+        ancestors = {}
+        for pk, ancestor_pk in (closure_model(model).objects.filter(descendant_id__in=set(pks))
+                                .order_by("descendant_id", "-depth").values_list("descendant_id", "ancestor_id")):
+            node_ancestors = ancestors.setdefault(pk, [])
+            if ancestor_pk != pk:
+                node_ancestors.append(ancestor_pk)
+        return ancestors
+
+    def path_labels(self, model, pks, with_ancestors):
+        if pks is None:
+            return dict(model.objects.values_list("pk", model.path_cache_field))
+        if not with_ancestors:
+            return dict(model.objects.filter(pk__in=set(pks)).values_list("pk", model.path_cache_field))
+        # The nodes are their own ancestors at depth 0
+        return dict(closure_model(model).objects.filter(descendant_id__in=set(pks)).order_by()
+                    .values_list("ancestor_id", f"ancestor__{model.path_cache_field}").distinct())
+
+
+_backends: Dict[str, TreeBackend] = {}
+
+
+def tree_backend() -> TreeBackend:
+    """The backend set in `INVENTORY_TREE_BACKEND`."""
+    path = settings.INVENTORY_TREE_BACKEND
+    if path not in _backends:
+        _backends[path] = import_string(path)()
+    return _backends[path]
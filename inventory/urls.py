@@ -0,0 +1,15 @@
+from django.urls import path
+
+from inventory import api
+
+app_name = 'api'
+
+urlpatterns = [
+    path('items/', api.item_list, name='item_list'),
+    path('items/batch/', api.item_batch, name='item_batch'),
+    path('items/<int:pk>/', api.item_detail, name='item_detail'),
+    path('locations/', api.location_list, name='location_list'),
+    path('locations/<int:pk>/', api.location_detail, name='location_detail'),
+    path('categories/', api.category_list, name='category_list'),
+    path('categories/<int:pk>/', api.category_detail, name='category_detail'),
+]
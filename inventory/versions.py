@@ -0,0 +1,85 @@
+import datetime
+import re
+from typing import Dict, Optional, Sequence, Tuple, Type
+
+from django.apps import apps
+from django.db import connections, models
+
+# Tables whose changes are counted, by `count_changes`. Only on SQLite, the API doesn't send validators otherwise
+VERSIONED_TABLES = {"inventory_item", "inventory_location", "inventory_category"}
+
+_written_table = re.compile(r'\s*(?:INSERT\s+INTO|UPDATE|DELETE\s+FROM)\s+"?(\w+)"?', re.IGNORECASE)
+
+_versions_available: Dict[str, bool] = {}
+
+
+def versions_available(using: str) -> bool:
+    """Whether the migrations created the table counting changes on this database."""
+    return _versions_available_on(connections[using])
+
+
+def _versions_available_on(connection) -> bool:
+    using = connection.alias
+    if using not in _versions_available:
+        available = False
+        if connection.vendor == "sqlite":
+            # Raw cursor, since `count_changes` calls this while executing queries
+            connection.ensure_connection()
+            cursor = connection.connection.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'inventory_tableversion'")
+            available = cursor.fetchone() is not None
+        _versions_available[using] = available
+    return _versions_available[using]
+
+
+def forget_availability():
+    """Check again whether changes are counted, after migrations."""
+    _versions_available.clear()
+
+
+def count_changes(execute, sql, params, many, context):
+    """Database execute wrapper bumping the version of a counted table once per statement changing it.
+
+    Per row triggers would write the version as many times as there are rows in bulk inserts and updates. The new
+    version is written in the same transaction as the change; changes made outside of Django are not counted.
+    """
+    result = execute(sql, params, many, context)
+    match = _written_table.match(sql)
+    if match and match.group(1) in VERSIONED_TABLES:
+        connection = context["connection"]
+        if _versions_available_on(connection):
+            # Not through the cursor of the statement, which holds its row count
+            connection.connection.execute(
+                "UPDATE inventory_tableversion SET version = version + 1, "
+                "modified = strftime('%Y-%m-%d %H:%M:%f', 'now') WHERE table_name = ?", [match.group(1)])
+    return result
+
+
+def version_rows(tables: Optional[Sequence[str]] = None,
+                 using: str = "default") -> Optional[Dict[str, Tuple[int, datetime.datetime]]]:
+    """Version and last modification time of the given tables, or of all the counted ones, from a single query.
+
+    Returns None when changes are not counted on this database.
+    """
+    if not versions_available(using):
+        return None
+    # Looked up lazily: the models read the tree versions through `inventory.tree_cache`
+    versions = apps.get_model("inventory", "TableVersion").objects.using(using)
+    if tables is not None:
+        versions = versions.filter(table_name__in=tables)
+    return dict((name, (version, modified)) for name, version, modified in
+                versions.values_list("table_name", "version", "modified"))
+
+
+def table_versions(model_classes: Sequence[Type[models.Model]],
+                   using: str = "default") -> Optional[Tuple[str, datetime.datetime]]:
+    """Validator string and last modification time of the tables of the given models, from a single indexed query.
+
+    Returns None when changes are not counted on this database.
+    """
+    tables = [model._meta.db_table for model in model_classes]
+    rows = version_rows(tables, using)
+    if rows is None or len(rows) != len(tables):
+        return None
+    validator = "-".join(str(rows[table][0]) for table in tables)
+    return validator, max(modified for _version, modified in rows.values())